@@ -0,0 +1,60 @@
+"""Compare loading the dashboard through four endpoints against GET /api/dashboard/.
+
+Usage: python -m benchmarks.bench_dashboard [--sizes 1000 10000] [--repeat 50]
+
+Each iteration starts with an empty analytics cache, so this measures the
+cost of computing the payloads rather than serving them from cache.
+"""
+import argparse
+import json
+
+from benchmarks.common import auth_client, measure, seed_expenses, setup_django, test_database
+
+
+def run(sizes, repeat):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+
+    results = []
+    for size in sizes:
+        user = User.objects.create_user(username=f'bench{size}', password='benchpassword')
+        seed_expenses(user, size)
+        client = auth_client(user)
+
+        def separate_requests():
+            # What the React dashboard issues today
+            for url in ['/api/expense-summary/', '/api/spending-trends/month/',
+                        '/api/category-breakdown/month/', '/api/expenses/?ordering=-date']:
+                assert client.get(url).status_code == 200
+
+        def separate_aggregates():
+            # The same minus the full expense list, to isolate the aggregate queries
+            for url in ['/api/expense-summary/', '/api/spending-trends/month/',
+                        '/api/category-breakdown/month/', '/api/expenses/?ordering=-date&page_size=5']:
+                assert client.get(url).status_code == 200
+
+        def combined_request():
+            assert client.get('/api/dashboard/').status_code == 200
+
+        results.append({
+            'expenses': size,
+            'before_four_requests': measure(separate_requests, repeat, before_each=cache.clear),
+            'before_aggregates_and_first_page': measure(separate_aggregates, repeat, before_each=cache.clear),
+            'after_dashboard': measure(combined_request, repeat, before_each=cache.clear),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
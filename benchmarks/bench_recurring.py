@@ -0,0 +1,122 @@
+"""Catching up recurring expense rules with tracker.recurring.materialize against one write per occurrence.
+
+Usage: python -m benchmarks.bench_recurring [--rules 100000] [--users 1000] [--days 90]
+
+``--rules`` rules (monthly, weekly, fortnightly and daily) are spread over
+``--users`` users and anchored within the last ``--days`` days with nothing
+materialized yet, as after a scheduler outage. ``catch_up`` is one
+materialize pass over all of them, ``rerun`` a second pass that finds
+nothing due. ``per_occurrence`` creates the same occurrences for the first
+``--baseline-rules`` rules one expense per transaction, the way
+``ExpenseList.post`` would; compare ``expenses_per_second``.
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks.common import measure, setup_django, test_database
+
+INTERVALS = [('monthly', 1), ('weekly', 1), ('weekly', 2), ('daily', 1)]
+
+
+def seed(rules, users, days, rng):
+    from django.contrib.auth.models import User
+    from tracker.models import RecurringExpense
+
+    owners = User.objects.bulk_create(User(username=f'recurring-{n}') for n in range(users))
+    today = date.today()
+    batch = []
+    for n in range(rules):
+        interval, every = rng.choice(INTERVALS)
+        anchor = today - timedelta(days=rng.randrange(days))
+        batch.append(RecurringExpense(
+            user=owners[n % users], category=rng.choice(['Bills', 'Entertainment', 'Other']),
+            amount=Decimal(rng.randrange(100, 200000)).scaleb(-2), interval=interval, every=every,
+            anchor_date=anchor, next_date=anchor,
+        ))
+    RecurringExpense.objects.bulk_create(batch, batch_size=2000)
+
+
+def per_occurrence(rules, today):
+    """One transaction per expense, each updating the rollups and the rule like a single API write would."""
+    from django.db import transaction
+    from tracker.changes import stamp
+    from tracker.models import Expense, RecurringExpense
+    from tracker.recurring import advance
+    from tracker.rollups import record_changes
+
+    created = 0
+    for rule in RecurringExpense.objects.filter(id__in=rules).order_by('id'):
+        for day in advance(rule, today):
+            with transaction.atomic():
+                expense = Expense(
+                    user_id=rule.user_id, category=rule.category, amount=rule.amount,
+                    date=day, description=rule.description,
+                )
+                stamp(rule.user_id, [expense])
+                expense.save()
+                record_changes(added=[expense])
+            created += 1
+        rule.save(update_fields=['occurrences', 'next_date'])
+    return created
+
+
+def run(rules, users, days, baseline_rules, repeat):
+    from django.db import connection
+    from tracker.models import Expense, RecurringExpense
+    from tracker.recurring import materialize
+
+    seed(rules, users, days, random.Random(0))
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    today = date.today()
+
+    # The baseline takes the first rules; materialize then catches up the rest
+    baseline_ids = list(RecurringExpense.objects.order_by('id').values_list('id', flat=True)[:baseline_rules])
+    start = time.perf_counter()
+    baseline_created = per_occurrence(baseline_ids, today)
+    baseline_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    due, created = materialize(today)
+    catch_up_seconds = time.perf_counter() - start
+    assert Expense.objects.count() == baseline_created + created
+
+    return {
+        'rules': rules,
+        'users': users,
+        'catch_up': {
+            'rules': due,
+            'expenses': created,
+            'seconds': round(catch_up_seconds, 3),
+            'expenses_per_second': round(created / catch_up_seconds),
+        },
+        'rerun': measure(lambda: materialize(today), repeat, warmup=1),
+        'per_occurrence': {
+            'rules': len(baseline_ids),
+            'expenses': baseline_created,
+            'seconds': round(baseline_seconds, 3),
+            'expenses_per_second': round(baseline_created / baseline_seconds),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rules', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--baseline-rules', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        print(json.dumps(run(args.rules, args.users, args.days, args.baseline_rules, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
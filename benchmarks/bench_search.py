@@ -0,0 +1,91 @@
+"""Latency of /api/expenses/search/ with the FTS5 index and with the icontains fallback.
+
+Usage: python -m benchmarks.bench_search [--rows 1000000] [--users 100] [--repeat 30]
+
+``--rows`` expenses are spread over ``--users`` users. Descriptions are the
+synthetic ones plus two merchant-like words from a skewed vocabulary, so
+queries range from very common words to rare ones. Each query runs through
+the full view stack for one user; ``fallback`` is the same request with the
+FTS5 index disabled.
+"""
+import argparse
+import json
+import random
+from unittest import mock
+
+from benchmarks.common import auth_client, measure, setup_django, test_database
+
+QUERIES = {
+    'common-word': {'q': 'coffee'},
+    'rare-word': {'q': 'merchant1777'},
+    'prefix': {'q': 'groc*'},
+    'two-words': {'q': 'lunch merch*'},
+    # Prefixes longer than the indexed ones (6) merge every expansion's postings
+    'long-prefix-many-terms': {'q': 'merchant3*'},
+    'word-and-category': {'q': 'merchant2', 'category': 'Food'},
+    'word-and-date-range': {'q': 'fuel', 'start_date': '2025-01-01', 'end_date': '2025-03-31'},
+}
+VOCABULARY = 5000
+
+
+def seed(rows, users, rng):
+    from django.contrib.auth.models import User
+    from tracker.models import Expense
+    from tracker.synthetic import synthetic_expenses
+
+    owners = [User.objects.create_user(username=f'search-{n}', password='benchpassword') for n in range(users)]
+    per_user = rows // users
+    batch = []
+    for owner in owners:
+        for expense in synthetic_expenses(owner, per_user, rng):
+            # Zipf-ish merchant words: a few are everywhere, most are rare
+            words = (f'merchant{int(VOCABULARY ** rng.random())}' for _ in range(2))
+            expense.description = ' '.join([expense.description, *words]).strip()
+            batch.append(expense)
+            if len(batch) == 5000:
+                Expense.objects.bulk_create(batch)
+                batch = []
+    Expense.objects.bulk_create(batch)
+    return owners
+
+
+def run(rows, users, repeat, fallback_repeat):
+    from django.db import connection
+
+    rng = random.Random(0)
+    owners = seed(rows, users, rng)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    client = auth_client(owners[0])
+
+    results = {}
+    for name, params in QUERIES.items():
+        def call():
+            response = client.get('/api/expenses/search/', params)
+            assert response.status_code == 200, response.status_code
+            return response
+
+        hits = len(call().data['results'])
+        fts = measure(call, repeat)
+        with mock.patch('tracker.search.fts_available', return_value=False):
+            fallback = measure(call, fallback_repeat, warmup=1)
+        results[name] = {'params': params, 'hits_on_page': hits, 'fts': fts, 'fallback': fallback}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--fallback-repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        results = run(args.rows, args.users, args.repeat, args.fallback_repeat)
+    print(json.dumps({'rows': args.rows, 'users': args.users, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
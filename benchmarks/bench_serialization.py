@@ -0,0 +1,60 @@
+"""Rows/sec of the expense list serialization paths.
+
+Usage: python -m benchmarks.bench_serialization [--sizes 10000 50000] [--repeat 5]
+
+``model_serializer`` is the original path: model instances through
+ExpenseSerializer(many=True) and DRF's JSONRenderer. ``row_serializer`` reads
+``values_list`` tuples through ExpenseRowSerializer and FastJSONRenderer
+(orjson when installed). Both include the query, and their outputs are
+checked to be identical before timing.
+"""
+import argparse
+import json
+
+from benchmarks.common import measure, seed_expenses, setup_django, test_database
+
+
+def run(sizes, repeat):
+    from django.contrib.auth.models import User
+    from rest_framework.renderers import JSONRenderer
+
+    from tracker.models import Expense
+    from tracker.renderers import FastJSONRenderer, orjson
+    from tracker.serializers import ExpenseRowSerializer, ExpenseSerializer
+
+    rows_serializer = ExpenseRowSerializer()
+    results = []
+    for size in sizes:
+        user = User.objects.create_user(username=f'bench{size}', password='benchpassword')
+        seed_expenses(user, size)
+        expenses = Expense.objects.filter(user=user).order_by('id')
+
+        def model_serializer():
+            return JSONRenderer().render(ExpenseSerializer(expenses, many=True).data)
+
+        def row_serializer():
+            return FastJSONRenderer().render(rows_serializer.serialize(expenses))
+
+        assert model_serializer() == row_serializer()
+        result = {'expenses': size, 'orjson': orjson is not None}
+        for name, fn in [('model_serializer', model_serializer), ('row_serializer', row_serializer)]:
+            stats = measure(fn, repeat, warmup=1)
+            stats['rows_per_sec'] = round(size / (stats['mean_ms'] / 1000))
+            result[name] = stats
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Mixed read/write throughput on SQLite with the default and production database profiles.
+
+Usage: python -m benchmarks.bench_sqlite_concurrency [--processes 8] [--duration 10] [--write-ratio 0.2]
+
+A scratch database is seeded once and copied for each profile. Worker
+processes (one connection each, like WSGI workers) then issue a mix of
+expense list pages, summaries, dashboards and expense creations through the
+full middleware stack for ``--duration`` seconds.
+
+- ``before``: Django's defaults (rollback journal, a new connection per
+  request, deferred transactions) and no lock retry.
+- ``after``: TRACKER_DB_PROFILE=production plus the lock retry in
+  ExpenseList.post.
+
+Reported per profile: reads and writes per second, latency percentiles and
+failed requests (e.g. 500/503 from "database is locked").
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import summarize
+
+READ_PATHS = ['/api/expenses/?ordering=-date&page_size=50', '/api/expense-summary/', '/api/dashboard/']
+
+PROFILES = {
+    'before': {'TRACKER_DB_PROFILE': 'default', 'TRACKER_LOAD_LOCK_ATTEMPTS': '1'},
+    'after': {'TRACKER_DB_PROFILE': 'production'},
+}
+
+
+def worker(database, env, tokens, duration, write_ratio, seed, results):
+    os.environ.update({'DJANGO_SETTINGS_MODULE': 'benchmarks.load_settings', 'TRACKER_LOAD_DATABASE': database, **env})
+    import logging
+
+    import django
+    django.setup()
+    from rest_framework.test import APIClient
+
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)  # Expected lock failures
+    rng = random.Random(seed)
+    client = APIClient()
+    client.raise_request_exception = False
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {rng.choice(tokens)}')
+
+    latencies = {'read': [], 'write': []}
+    failures = {'read': 0, 'write': 0}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        kind = 'write' if rng.random() < write_ratio else 'read'
+        start = time.perf_counter()
+        if kind == 'write':
+            response = client.post('/api/expenses/', {
+                'category': rng.choice(['Food', 'Transport', 'Bills']),
+                'amount': f'{rng.randint(1, 9999) / 100:.2f}',
+                'date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            })
+        else:
+            response = client.get(rng.choice(READ_PATHS))
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            failures[kind] += 1
+        else:
+            latencies[kind].append(elapsed)
+    results.put((latencies, failures))
+
+
+def run_profile(database, env, tokens, processes, duration, write_ratio):
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=worker, args=(str(database), env, tokens, duration, write_ratio, seed, results))
+        for seed in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    collected = [results.get() for _ in workers]
+    for process in workers:
+        process.join()
+
+    report = {}
+    for kind in ('read', 'write'):
+        samples = [s for latencies, _ in collected for s in latencies[kind]]
+        failed = sum(failures[kind] for _, failures in collected)
+        report[kind] = {
+            'ok_per_sec': round(len(samples) / duration, 1),
+            'failed': failed,
+            **(summarize(samples) if samples else {'n': 0}),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=4)
+    args = parser.parse_args()
+
+    from benchmarks.load_asgi import prepare_database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = Path(tmp) / 'seeded.sqlite3'
+        tokens = prepare_database(seeded, args.expenses, args.users)
+        from django.db import connections
+        connections.close_all()
+
+        results = {}
+        for name, env in PROFILES.items():
+            database = Path(tmp) / f'{name}.sqlite3'
+            shutil.copy(seeded, database)
+            results[name] = run_profile(database, env, tokens, args.processes, args.duration, args.write_ratio)
+
+    print(json.dumps({
+        'processes': args.processes,
+        'duration': args.duration,
+        'write_ratio': args.write_ratio,
+        'expenses': args.expenses,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
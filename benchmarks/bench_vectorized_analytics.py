@@ -0,0 +1,140 @@
+"""The NumPy analytics in tracker.vectorized against the same numbers from per-bucket ORM queries.
+
+Usage: python -m benchmarks.bench_vectorized_analytics [--sizes 10000 100000] [--repeat 10]
+
+For each size one user gets that many synthetic expenses over three years.
+``vectorized`` is one query per statistic plus NumPy, as the /api/analytics/
+endpoints do (daily rollup rows for sums, expenses for percentiles).
+``per_bucket_orm`` asks the database for every bucket separately: one
+aggregate per month for year-over-year and the forecast history, one per
+day for a 30-day rolling average over 90 days, and count plus offset
+lookups per category for percentiles. Results are checked to agree before
+timing.
+"""
+import argparse
+import json
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks.common import measure, seed_expenses, setup_django, test_database
+
+WINDOW = 30
+ROLLING_DAYS = 90
+
+
+def orm_year_over_year(user, year):
+    from django.db.models import Sum
+    from tracker.models import Expense
+
+    def month_total(y, m):
+        total = Expense.objects.filter(user=user, date__year=y, date__month=m).aggregate(total=Sum('amount'))['total']
+        return total or Decimal('0.00')
+
+    return [(month_total(year, m), month_total(year - 1, m)) for m in range(1, 13)]
+
+
+def orm_rolling(user, start, end):
+    from django.db.models import Sum
+    from tracker.models import Expense
+
+    days = []
+    day = start
+    while day <= end:
+        total = Expense.objects.filter(
+            user=user, date__gt=day - timedelta(days=WINDOW), date__lte=day,
+        ).aggregate(total=Sum('amount'))['total'] or Decimal('0')
+        days.append((total / WINDOW).quantize(Decimal('0.01')))
+        day += timedelta(days=1)
+    return days
+
+
+def orm_percentiles(user, percentiles):
+    from tracker.models import Expense
+
+    results = {}
+    for category in Expense.objects.filter(user=user).values_list('category', flat=True).distinct().order_by():
+        expenses = Expense.objects.filter(user=user, category=category).order_by('amount')
+        n = expenses.count()
+        values = []
+        for p in percentiles:
+            position = p / 100 * (n - 1)
+            lower = int(position)
+            low = expenses.values_list('amount', flat=True)[lower]
+            high = expenses.values_list('amount', flat=True)[min(lower + 1, n - 1)]
+            values.append((low + (high - low) * Decimal(str(position - lower))).quantize(Decimal('0.01')))
+        results[category] = values
+    return results
+
+
+def orm_forecast_history(user, today, months):
+    from django.db.models import Sum
+    from tracker.models import Expense
+
+    totals = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+        total = Expense.objects.filter(user=user, date__year=year, date__month=month).aggregate(total=Sum('amount'))
+        totals.append(total['total'] or Decimal('0'))
+    return totals[::-1]
+
+
+def run(sizes, repeat):
+    from django.contrib.auth.models import User
+    from tracker import vectorized
+
+    today = date.today()
+    end = today
+    start = end - timedelta(days=ROLLING_DAYS - 1)
+    history_start = date(today.year - 3, today.month, 1)
+    results = []
+    for size in sizes:
+        user = User.objects.create_user(username=f'vector-{size}', password='benchpassword')
+        seed_expenses(user, size)
+
+        def vectorized_all():
+            arrays = vectorized.ExpenseArrays.load_daily(user.id, date(today.year - 1, 1, 1), date(today.year, 12, 31))
+            yoy = vectorized.year_over_year(arrays, today.year, today)
+            arrays = vectorized.ExpenseArrays.load_daily(user.id, start - timedelta(days=WINDOW - 1), end)
+            rolling = vectorized.rolling_averages(arrays, start, end, WINDOW)
+            percentiles = vectorized.category_percentiles(vectorized.ExpenseArrays.load(user.id))
+            arrays = vectorized.ExpenseArrays.load_daily(user.id, history_start, today)
+            return yoy, rolling, percentiles, vectorized.forecast(arrays, 3, today)
+
+        def orm_all():
+            return (
+                orm_year_over_year(user, today.year),
+                orm_rolling(user, start, end),
+                orm_percentiles(user, vectorized.PERCENTILES),
+                orm_forecast_history(user, today, vectorized.FORECAST_HISTORY_MONTHS),
+            )
+
+        yoy, rolling, percentiles, _ = vectorized_all()
+        orm_yoy, orm_rolling_days, orm_pcts, _ = orm_all()
+        assert [(m['total'], m['previous_total']) for m in yoy['months']] == orm_yoy[:len(yoy['months'])]
+        assert [day['average'] for day in rolling] == orm_rolling_days
+        assert {row['category']: [row[f'p{p}'] for p in vectorized.PERCENTILES] for row in percentiles} == orm_pcts
+
+        results.append({
+            'size': size,
+            'vectorized': measure(vectorized_all, repeat),
+            'per_bucket_orm': measure(orm_all, repeat, warmup=1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    with test_database():
+        print(json.dumps(run(args.sizes, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+Benchmarks run against a throwaway test database, never ``db.sqlite3``.
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    """Create and migrate a fresh test database for the duration of the block."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Latency stats in milliseconds for a list of durations in seconds."""
+    ms = [s * 1000 for s in samples]
+    return {
+        'n': len(ms),
+        'mean_ms': round(statistics.fmean(ms), 3),
+        'p50_ms': round(percentile(ms, 50), 3),
+        'p95_ms': round(percentile(ms, 95), 3),
+        'p99_ms': round(percentile(ms, 99), 3),
+    }
+
+
+def measure(fn, repeat=50, warmup=3, before_each=None):
+    """Call ``fn`` repeatedly and return latency stats."""
+    for _ in range(warmup):
+        if before_each:
+            before_each()
+        fn()
+    samples = []
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def seed_expenses(user, count, seed=0, years=3):
+    """Insert ``count`` synthetic expenses for ``user`` and rebuild their rollups."""
+    from tracker.models import Expense
+    from tracker.rollups import rebuild_rollups
+    from tracker.synthetic import synthetic_expenses
+
+    Expense.objects.bulk_create(synthetic_expenses(user, count, random.Random(seed), years), batch_size=2000)
+    rebuild_rollups(user=user)
+
+
+def auth_client(user):
+    """A test client that authenticates with a real JWT, like the React app does."""
+    from rest_framework.test import APIClient
+    from tracker.authentication import TrackerAccessToken
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {TrackerAccessToken.for_user(user)}')
+    return client
@@ -0,0 +1,218 @@
+"""Load test: async views under uvicorn (ASGI) against the sync views under gunicorn (WSGI).
+
+Usage: python -m benchmarks.load_asgi [--workers 2] [--concurrency 32] [--duration 10] [--expenses 20000]
+
+Both servers run the same number of worker processes against the same
+seeded SQLite file; gunicorn uses sync workers, uvicorn one event loop per
+worker. Each keeps ``--concurrency`` keep-alive connections busy with a mix
+of the read endpoints for ``--duration`` seconds, then throughput (requests
+per second), latency percentiles and error counts are reported as JSON.
+Requires uvicorn and gunicorn, which aren't project dependencies.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import ROOT, seed_expenses, summarize
+
+ENDPOINTS = [
+    'expense-summary/',
+    'spending-trends/month/',
+    'category-breakdown/month/',
+    'dashboard/',
+    'expenses/?ordering=-date&page_size=50',
+]
+
+def uvicorn_arguments(port, workers):
+    return [
+        'expense_tracker.asgi:application', '--port', str(port), '--workers', str(workers),
+        '--no-access-log', '--log-level', 'warning',
+    ]
+
+
+SERVERS = {
+    # name: (module to run, URL prefix, command line after the module)
+    'wsgi': ('gunicorn', '/api/', lambda port, workers: [
+        'expense_tracker.wsgi:application', '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        '--worker-class', 'sync', '--log-level', 'warning',
+    ]),
+    'asgi': ('uvicorn', '/api/async/', lambda port, workers: uvicorn_arguments(port, workers)),
+    # The sync views under uvicorn, to separate the server's cost from the async views'
+    'asgi-sync-views': ('uvicorn', '/api/', lambda port, workers: uvicorn_arguments(port, workers)),
+}
+
+
+def prepare_database(path, expenses, users):
+    """Migrate and seed a scratch database, returning one access token per user."""
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.load_settings'
+    os.environ['TRACKER_LOAD_DATABASE'] = str(path)
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from tracker.authentication import TrackerAccessToken
+
+    call_command('migrate', verbosity=0)
+    tokens = []
+    for index in range(users):
+        user = User.objects.create_user(username=f'load-{index}', password='loadpassword')
+        seed_expenses(user, expenses // users, seed=index)
+        tokens.append(str(TrackerAccessToken.for_user(user)))
+    return tokens
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server didn't start listening on port {port}")
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response and return (status code, whether the server keeps the connection)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    headers = {}
+    while (line := await reader.readline()) not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding') == 'chunked':
+        while size := int((await reader.readline()).split(b';')[0], 16):
+            await reader.readexactly(size + 2)
+        await reader.readline()
+    else:
+        await reader.readexactly(int(headers.get('content-length', 0)))
+    return int(status_line.split()[1]), headers.get('connection', '').lower() != 'close'
+
+
+async def connection_loop(port, requests, deadline, latencies, statuses):
+    """Issue requests back to back, reconnecting whenever the server closes.
+
+    gunicorn's sync workers close after every response, so for WSGI the
+    reconnect is part of each request's latency, as it would be in production.
+    """
+    writer = None
+    try:
+        for request in requests:
+            if time.monotonic() >= deadline:
+                break
+            start = time.perf_counter()
+            if writer is None:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if not keep_alive:
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def drive(port, prefix, tokens, concurrency, duration, seed):
+    rng = random.Random(seed)
+    deadline = time.monotonic() + duration
+    latencies, statuses = [], {}
+
+    def requests():
+        while True:
+            path = prefix + rng.choice(ENDPOINTS)
+            yield (
+                f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                f'Authorization: Bearer {rng.choice(tokens)}\r\n\r\n'
+            ).encode()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        connection_loop(port, requests(), deadline, latencies, statuses) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'statuses': {str(code): n for code, n in sorted(statuses.items())},
+        **summarize(latencies),
+    }
+
+
+def run_server(name, database, tokens, workers, concurrency, duration, warmup):
+    module, prefix, arguments = SERVERS[name]
+    if importlib.util.find_spec(module) is None:
+        return {'error': f"{module} is not installed"}
+
+    port = free_port()
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.load_settings',
+        'TRACKER_LOAD_DATABASE': str(database),
+        'PYTHONPATH': os.pathsep.join(filter(None, [str(ROOT), os.environ.get('PYTHONPATH')])),
+    }
+    process = subprocess.Popen([sys.executable, '-m', module, *arguments(port, workers)], cwd=ROOT, env=env)
+    try:
+        wait_for_port(port, process)
+        asyncio.run(drive(port, prefix, tokens, concurrency, warmup, seed=1))
+        return asyncio.run(drive(port, prefix, tokens, concurrency, duration, seed=0))
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help="Worker processes for each server.")
+    parser.add_argument('--concurrency', type=int, default=32, help="Concurrent keep-alive connections.")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of measured load per server.")
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--expenses', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=['wsgi', 'asgi'])
+    parser.add_argument('--cache', action='store_true', help="Keep the analytics cache on.")
+    args = parser.parse_args()
+
+    if args.cache:
+        os.environ['TRACKER_LOAD_CACHE'] = '1'
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / 'load.sqlite3'
+        tokens = prepare_database(database, args.expenses, args.users)
+        results = {
+            name: run_server(name, database, tokens, args.workers, args.concurrency, args.duration, args.warmup)
+            for name in args.servers
+        }
+
+    print(json.dumps({
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'expenses': args.expenses,
+        'cache': args.cache,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Load test: read latency before and during a login storm.
+
+Usage: python -m benchmarks.load_login_storm [--readers 8] [--stormers 32] [--duration 10]
+
+One threaded server (``manage.py runserver``, so every request shares a
+process the way gthread or ASGI workers do) serves a seeded SQLite file.
+``--readers`` threads fetch the read endpoints back to back for
+``--duration`` seconds with no other load, then again while ``--stormers``
+threads post logins to /api/token/ as fast as they're answered.
+
+- ``before``: passwords hashed on the request threads, no rate limits.
+- ``pool``: the bounded hashing pool (tracker/hashing.py), no rate limits.
+- ``pool+limits``: the pool and the per-IP and per-username token buckets,
+  as configured in settings.
+
+Reported per profile: read latency percentiles and failed reads in each
+phase, and the status codes the logins got (429 is a refused login,
+``reset`` a connection the server dropped). Output is JSON.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+from benchmarks.common import ROOT, summarize
+from benchmarks.load_asgi import ENDPOINTS, free_port, prepare_database, wait_for_port
+
+PROFILES = {
+    'before': {'TRACKER_LOAD_HASH_WORKERS': '0', 'TRACKER_LOAD_AUTH_RATES': 'off'},
+    'pool': {'TRACKER_LOAD_AUTH_RATES': 'off'},
+    'pool+limits': {},
+}
+
+
+def request(connection, method, path, **kwargs):
+    """Issue one request and return its status, or 'reset' if the server dropped the connection."""
+    try:
+        connection.request(method, path, **kwargs)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    except OSError:
+        # runserver's listen backlog is short; reconnect on the next request
+        connection.close()
+        return 'reset'
+
+
+def reader(port, token, deadline, latencies, errors, seed):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Authorization': f'Bearer {token}'}
+    index = seed
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        status = request(connection, 'GET', '/api/' + ENDPOINTS[index % len(ENDPOINTS)], headers=headers)
+        index += 1
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(status)
+
+
+def stormer(port, username, deadline, statuses, lock):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    body = urlencode({'username': username, 'password': 'loadpassword'})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    while time.monotonic() < deadline:
+        status = request(connection, 'POST', '/api/token/', body=body, headers=headers)
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+def phase(port, tokens, readers, stormers, duration):
+    deadline = time.monotonic() + duration
+    latencies, errors, statuses, lock = [], [], {}, threading.Lock()
+    threads = [
+        threading.Thread(target=reader, args=(port, tokens[n % len(tokens)], deadline, latencies, errors, n))
+        for n in range(readers)
+    ] + [
+        threading.Thread(target=stormer, args=(port, f'load-{n % len(tokens)}', deadline, statuses, lock))
+        for n in range(stormers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result = {'reads': summarize(latencies), 'failed_reads': len(errors)}
+    if stormers:
+        result['logins'] = {str(code): n for code, n in sorted(statuses.items(), key=str)}
+    return result
+
+
+def run_profile(database, env, tokens, readers, stormers, duration):
+    port = free_port()
+    env = {
+        **os.environ, **env,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.load_settings',
+        'TRACKER_LOAD_DATABASE': str(database),
+    }
+    process = subprocess.Popen(
+        [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, process)
+        phase(port, tokens, readers, 0, 1)  # Warm up
+        return {
+            'quiet': phase(port, tokens, readers, 0, duration),
+            'storm': phase(port, tokens, readers, stormers, duration),
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8, help="Threads issuing read requests.")
+    parser.add_argument('--stormers', type=int, default=32, help="Threads posting logins during the storm.")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds of each phase.")
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=4)
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Path(tmp) / 'load.sqlite3'
+        tokens = prepare_database(database, args.expenses, args.users)
+        from django.db import connections
+        connections.close_all()
+        results = {
+            name: run_profile(database, PROFILES[name], tokens, args.readers, args.stormers, args.duration)
+            for name in args.profiles
+        }
+
+    print(json.dumps({
+        'readers': args.readers,
+        'stormers': args.stormers,
+        'duration': args.duration,
+        'cpus': os.cpu_count(),
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
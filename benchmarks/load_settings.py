@@ -0,0 +1,28 @@
+"""Project settings pointed at a scratch database, for load tests that start real servers.
+
+TRACKER_LOAD_DATABASE names the SQLite file; TRACKER_DB_PROFILE still picks
+the database profile. The analytics cache is off unless TRACKER_LOAD_CACHE=1,
+so requests measure the queries themselves.
+"""
+import os
+
+from expense_tracker.settings import *  # noqa: F401,F403
+from expense_tracker.settings import DATABASES
+
+DEBUG = False
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver']
+
+DATABASES = {'default': {**DATABASES['default'], 'NAME': os.environ['TRACKER_LOAD_DATABASE']}}
+
+if os.environ.get('TRACKER_LOAD_CACHE') != '1':
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+# Lets a benchmark turn the "database is locked" retry off (1 attempt) for a baseline
+if 'TRACKER_LOAD_LOCK_ATTEMPTS' in os.environ:
+    TRACKER_DB_LOCK_ATTEMPTS = int(os.environ['TRACKER_LOAD_LOCK_ATTEMPTS'])
+
+# Lets the login storm benchmark hash on request threads (0) and turn the rate limits off
+if 'TRACKER_LOAD_HASH_WORKERS' in os.environ:
+    TRACKER_HASH_WORKERS = int(os.environ['TRACKER_LOAD_HASH_WORKERS'])
+if os.environ.get('TRACKER_LOAD_AUTH_RATES') == 'off':
+    TRACKER_AUTH_RATES = {}
@@ -0,0 +1,255 @@
+"""Benchmark every URL in tracker/urls.py at several data sizes.
+
+Usage: python -m benchmarks.run [--sizes 1000 10000] [--repeat 30] [--output results.json]
+       python -m benchmarks.run --compare baseline.json [--threshold 0.2]
+
+For each size a fresh user gets that many synthetic expenses, alongside a few
+background users so indexes see realistic selectivity. Every endpoint is
+driven through the Django test client with real JWT auth and an empty
+analytics cache, and reported as p50/p95/p99 latency, SQL queries per
+request and the process's peak RSS. The output is JSON so two runs can be
+compared; --compare exits non-zero when an endpoint's p50 regressed.
+"""
+import argparse
+import json
+import platform
+import resource
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from itertools import count
+from typing import Callable
+
+from benchmarks.common import auth_client, measure, seed_expenses, setup_django, test_database
+
+
+@dataclass
+class Context:
+    client: object
+    user: object
+    password: str
+    refresh_token: str
+    admin_client: object = None
+    budget_id: int = None
+    report_id: int = None
+    expense_ids: list = field(default_factory=list)
+    rule_ids: list = field(default_factory=list)
+    counter: count = field(default_factory=count)
+
+
+@dataclass
+class Scenario:
+    url_name: str
+    label: str
+    call: Callable
+    repeat: int = None  # Override for slow endpoints such as password hashing
+    clear_cache: bool = True
+
+
+def consume(response):
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def bulk_csv(rows=100):
+    lines = ["category,amount,date,description"]
+    lines += [f"Food,{i % 50 + 1}.25,2024-05-{i % 28 + 1:02d},bulk row {i}" for i in range(rows)]
+    return "\n".join(lines).encode()
+
+
+REPORT_YEAR = date.today().year
+
+
+def build_scenarios():
+    return [
+        Scenario('register', 'post', lambda ctx: ctx.client.post(
+            '/api/register/', {'username': f'bench-signup-{ctx.user.id}-{next(ctx.counter)}', 'password': 'benchpassword'}), repeat=5),
+        Scenario('token_obtain_pair', 'post', lambda ctx: ctx.client.post(
+            '/api/token/', {'username': ctx.user.username, 'password': ctx.password}), repeat=5),
+        Scenario('token_refresh', 'post', lambda ctx: ctx.client.post(
+            '/api/token/refresh/', {'refresh': ctx.refresh_token})),
+        Scenario('expense-list', 'get', lambda ctx: ctx.client.get('/api/expenses/', {'ordering': '-date'})),
+        Scenario('expense-list', 'get-page', lambda ctx: ctx.client.get(
+            '/api/expenses/', {'ordering': '-date', 'page_size': 50})),
+        Scenario('expense-list', 'get-stream', lambda ctx: ctx.client.get(
+            '/api/expenses/', {'ordering': '-date', 'stream': 'true'})),
+        Scenario('expense-list', 'post', lambda ctx: ctx.client.post(
+            '/api/expenses/', {'category': 'Food', 'amount': '9.99', 'date': '2024-06-01'})),
+        Scenario('expense-bulk-import', 'post-100-rows', lambda ctx: ctx.client.generic(
+            'POST', '/api/expenses/bulk/', bulk_csv(), content_type='text/csv'), repeat=10),
+        Scenario('expense-sync', 'post-20-ops', lambda ctx: ctx.client.post('/api/expenses/sync/', {'operations': [
+            {'key': f'bench-{ctx.user.id}-{n}', 'op': 'create', 'data': {'category': 'Food', 'amount': '4.50', 'date': '2024-06-01'}}
+            for n in (next(ctx.counter) for _ in range(20))
+        ]}, format='json'), repeat=10),
+        Scenario('expense-changes', 'get-page', lambda ctx: ctx.client.get('/api/expenses/changes/', {'page_size': 100})),
+        Scenario('expense-search', 'get', lambda ctx: ctx.client.get('/api/expenses/search/', {'q': 'coffee'})),
+        Scenario('expense-search', 'get-prefix', lambda ctx: ctx.client.get('/api/expenses/search/', {'q': 'gro*'})),
+        Scenario('expense-export', 'get-csv', lambda ctx: ctx.client.get('/api/expenses/export/')),
+        Scenario('expense-detail', 'put', lambda ctx: ctx.client.put(
+            f'/api/expenses/{ctx.expense_ids[0]}/', {'amount': f'{next(ctx.counter) % 90 + 1}.00'}, format='json')),
+        Scenario('expense-detail', 'delete', lambda ctx: ctx.client.delete(
+            f'/api/expenses/{ctx.expense_ids.pop()}/')),
+        Scenario('expense_summary', 'get', lambda ctx: ctx.client.get('/api/expense-summary/')),
+        Scenario('spending-trends', 'get-month', lambda ctx: ctx.client.get('/api/spending-trends/month/')),
+        Scenario('spending-trends', 'get-week', lambda ctx: ctx.client.get('/api/spending-trends/week/')),
+        Scenario('category-breakdown', 'get-month', lambda ctx: ctx.client.get('/api/category-breakdown/month/')),
+        Scenario('dashboard', 'get', lambda ctx: ctx.client.get('/api/dashboard/')),
+        Scenario('analytics-year-over-year', 'get', lambda ctx: ctx.client.get('/api/analytics/year-over-year/')),
+        Scenario('analytics-rolling', 'get-30', lambda ctx: ctx.client.get('/api/analytics/rolling/', {'window': 30})),
+        Scenario('analytics-percentiles', 'get', lambda ctx: ctx.client.get('/api/analytics/percentiles/')),
+        Scenario('analytics-forecast', 'get', lambda ctx: ctx.client.get('/api/analytics/forecast/')),
+        Scenario('budget-list', 'get', lambda ctx: ctx.client.get('/api/budgets/')),
+        Scenario('budget-list', 'post', lambda ctx: ctx.client.post(
+            '/api/budgets/', {'category': f'Bench {next(ctx.counter)}', 'limit': '500.00'})),
+        Scenario('budget-detail', 'put', lambda ctx: ctx.client.put(
+            f'/api/budgets/{ctx.budget_id}/', {'limit': f'{next(ctx.counter) % 900 + 100}.00'}, format='json')),
+        Scenario('recurring-expense-list', 'get', lambda ctx: ctx.client.get('/api/recurring-expenses/')),
+        Scenario('recurring-expense-list', 'post', lambda ctx: ctx.client.post('/api/recurring-expenses/', {
+            'category': 'Bills', 'amount': '15.00', 'interval': 'monthly', 'anchor_date': '2024-06-01'})),
+        Scenario('recurring-expense-detail', 'delete', lambda ctx: ctx.client.delete(
+            f'/api/recurring-expenses/{ctx.rule_ids.pop()}/')),
+        Scenario('profile', 'get', lambda ctx: ctx.client.get('/api/profile/')),
+        Scenario('profile', 'put', lambda ctx: ctx.client.put('/api/profile/', {'home_currency': 'USD'}, format='json')),
+        # The statement is built once per size; posting it again finds the same job
+        Scenario('report-list', 'post-existing', lambda ctx: ctx.client.post('/api/reports/', {
+            'kind': 'annual_statement', 'params': {'start_year': REPORT_YEAR}}, format='json')),
+        Scenario('report-detail', 'get', lambda ctx: ctx.client.get(f'/api/reports/{ctx.report_id}/')),
+        Scenario('report-result', 'get', lambda ctx: ctx.client.get(f'/api/reports/{ctx.report_id}/result/')),
+        Scenario('metrics', 'get', lambda ctx: ctx.admin_client.get('/api/_metrics/')),
+        # Async views run through async_to_sync here; see load_asgi for the ASGI comparison
+        Scenario('async-expense-list', 'get', lambda ctx: ctx.client.get('/api/async/expenses/', {'ordering': '-date'})),
+        Scenario('async-expense-summary', 'get', lambda ctx: ctx.client.get('/api/async/expense-summary/')),
+        Scenario('async-spending-trends', 'get-month', lambda ctx: ctx.client.get('/api/async/spending-trends/month/')),
+        Scenario('async-category-breakdown', 'get-month', lambda ctx: ctx.client.get(
+            '/api/async/category-breakdown/month/')),
+        Scenario('async-dashboard', 'get', lambda ctx: ctx.client.get('/api/async/dashboard/')),
+    ]
+
+
+def peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS reports bytes, Linux KiB
+
+
+def run_size(size, scenarios, repeat, index):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from tracker.authentication import TrackerRefreshToken
+    from tracker.models import Budget, Expense, RecurringExpense
+    from tracker.reports import enqueue, run_inline
+
+    password = 'benchpassword'
+    user = User.objects.create_user(username=f'bench-{index}-{size}', password=password)
+    seed_expenses(user, size, seed=index)
+    admin = User.objects.create_superuser(username=f'bench-admin-{index}', password=password)
+    ctx = Context(auth_client(user), user, password, str(TrackerRefreshToken.for_user(user)), auth_client(admin))
+    ctx.budget_id = Budget.objects.create(user=user, category='Food', limit=500).id
+    job, _ = enqueue(user.id, 'annual_statement', {'start_year': REPORT_YEAR})
+    run_inline(job)
+    ctx.report_id = job.id
+    # Enough recurring expenses to delete one per call
+    ctx.rule_ids = [rule.id for rule in RecurringExpense.objects.bulk_create(
+        RecurringExpense(user=user, category='Bills', amount=15, anchor_date='2024-06-01')
+        for _ in range(max(scenario.repeat or repeat for scenario in scenarios) + 5)
+    )]
+
+    results = {}
+    for scenario in scenarios:
+        runs = scenario.repeat or repeat
+        # Enough expenses to delete one per call, warmup included
+        ctx.expense_ids = list(Expense.objects.filter(user=user).values_list('id', flat=True)[:runs + 5])
+
+        def call():
+            response = consume(scenario.call(ctx))
+            assert response.status_code < 400, (scenario.url_name, scenario.label, response.status_code)
+
+        stats = measure(call, runs, warmup=2, before_each=cache.clear if scenario.clear_cache else None)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            call()
+        stats['queries'] = len(queries)
+        stats['peak_rss_kb'] = peak_rss_kb()
+        results[f'{scenario.url_name}:{scenario.label}'] = stats
+    return results
+
+
+def run(sizes, repeat, background_users):
+    from django.test import override_settings
+    from tracker.synthetic import generate
+    from tracker.urls import urlpatterns
+
+    scenarios = build_scenarios()
+    covered = {scenario.url_name for scenario in scenarios}
+    missing = sorted(p.name for p in urlpatterns if p.name not in covered)
+
+    # Report results go to a scratch directory, not the project's
+    with test_database(), tempfile.TemporaryDirectory() as report_dir, override_settings(TRACKER_REPORT_DIR=report_dir):
+        generate(background_users, 2000, seed=99, prefix='bench-background')
+        results = [
+            {'size': size, 'endpoints': run_size(size, scenarios, repeat, index)}
+            for index, size in enumerate(sizes)
+        ]
+
+    import django
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'repeat': repeat,
+            'background_users': background_users,
+        },
+        'missing_scenarios': missing,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Return (size, endpoint, old p50, new p50) for every p50 that grew beyond ``threshold``."""
+    regressions = []
+    old = {(r['size'], name): stats for r in baseline['results'] for name, stats in r['endpoints'].items()}
+    for result in current['results']:
+        for name, stats in result['endpoints'].items():
+            before = old.get((result['size'], name))
+            if before and stats['p50_ms'] > before['p50_ms'] * (1 + threshold):
+                regressions.append((result['size'], name, before['p50_ms'], stats['p50_ms']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--background-users', type=int, default=3)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    parser.add_argument('--compare', help="Baseline JSON report to check for p50 regressions.")
+    parser.add_argument('--threshold', type=float, default=0.2, help="Allowed p50 growth, as a fraction.")
+    args = parser.parse_args()
+
+    setup_django()
+    report = run(args.sizes, args.repeat, args.background_users)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if report['missing_scenarios']:
+        print(f"No benchmark scenario for: {', '.join(report['missing_scenarios'])}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        for size, name, before, after in regressions:
+            print(f"REGRESSION size={size} {name}: p50 {before}ms -> {after}ms", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -93,6 +93,36 @@ export const deleteExpense = async (id) => {
   }
 };
 
+// Fetch only the expenses written or deleted since a cursor from the previous call
+export const getExpenseChanges = async (since = '') => {
+  try {
+    const params = new URLSearchParams();
+    if (since !== '') {
+      params.append('since', since);
+    }
+    return await API.get(`expenses/changes/?${params.toString()}`);
+  } catch (error) {
+    console.error("Error fetching expense changes:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+  }
+};
+
+// Send queued offline writes as one batch; resending the same keys is safe
+export const syncExpenses = async (operations) => {
+  try {
+    return await API.post("expenses/sync/", { operations });
+  } catch (error) {
+    console.error("Error syncing expenses:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+    // Conflicts and validation errors list the failing operations
+    return error.response;
+  }
+};
+
 // Fetch expense summary
 export const getExpenseSummary = async () => {
   try {
@@ -170,6 +200,76 @@ export const getCategoryBreakdown = async (period = 'month', startDate = '', mon
   }
 };
 
+// Fetch everything the dashboard shows (summary, breakdowns, trends, recent expenses) in one request
+export const getDashboard = async (period = 'month', month = '', year = '', recent = 5) => {
+  try {
+    const params = new URLSearchParams({ period, recent });
+
+    // Add month and year if both are provided
+    if (month && year) {
+      params.append('month', month);
+      params.append('year', year);
+    }
+
+    return await API.get(`dashboard/?${params.toString()}`);
+  } catch (error) {
+    console.error("Error fetching dashboard:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+  }
+};
+
+// Fetch the home currency that totals are reported in
+export const getProfile = async () => {
+  try {
+    return await API.get("profile/");
+  } catch (error) {
+    console.error("Error fetching profile:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+  }
+};
+
+// Change the home currency (a three-letter code such as "EUR")
+export const updateProfile = async (homeCurrency) => {
+  try {
+    return await API.put("profile/", { home_currency: homeCurrency });
+  } catch (error) {
+    console.error("Error updating profile:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+    return error.response;
+  }
+};
+
+// Queue a long-running report ("annual_statement" or "expense_history"); identical requests return the same job
+export const requestReport = async (kind, params = {}) => {
+  try {
+    return await API.post("reports/", { kind, params });
+  } catch (error) {
+    console.error("Error requesting report:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+    return error.response;
+  }
+};
+
+// Poll a report job; once its status is "done" it carries the result or a result_url to download
+export const getReport = async (id) => {
+  try {
+    return await API.get(`reports/${id}/`);
+  } catch (error) {
+    console.error("Error fetching report:", error);
+    if (error.response?.status === 401) {
+      window.location.href = "/login";
+    }
+  }
+};
+
 // Logout
 export const logout = () => {
   localStorage.removeItem("access_token");
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,11 +48,19 @@ INSTALLED_APPS = [
 # Authentication settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'tracker.authentication.TokenUserAuthentication',
     ],
 }
 
+# Read requests trust the JWT's claims instead of loading the User row
+# (tracker/authentication.py). A verified token is cached per process for
+# TRACKER_TOKEN_CACHE_TTL seconds, which bounds how long a deactivated user
+# or changed password goes unnoticed on reads; writes always check the row.
+TRACKER_TOKEN_CACHE_TTL = 60
+TRACKER_TOKEN_CACHE_SIZE = 10000
+
 MIDDLEWARE = [
+    'tracker.middleware.PerformanceMiddleware',  # First, so it times everything below it
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,9 +68,32 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'corsheaders.middleware.CorsMiddleware'
+    'corsheaders.middleware.CorsMiddleware',
+    'tracker.middleware.HashingBusyMiddleware',  # A full hashing pool is a 429 outside DRF too
 ]
 
+# Analytics response cache (tracker/cache.py). Uses the 'default' cache, which
+# is Django's local-memory backend unless CACHES is configured. Invalidation
+# bumps version keys in this cache, so with more than one process (several
+# workers, or load_fx_rates and rebuild_rollups run from a shell) it must be
+# a shared backend such as Redis or Memcached, or they serve stale responses
+# for up to the timeout.
+TRACKER_ANALYTICS_CACHE_ALIAS = 'default'
+TRACKER_ANALYTICS_CACHE_TIMEOUT = 300  # seconds
+
+# Per-request performance log lines (tracker/middleware.py) go to the
+# 'tracker.performance' logger at INFO; lower the level below to see them.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tracker': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React default port
 ]
@@ -97,6 +129,55 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile, enabled with TRACKER_DB_PROFILE=production.
+# WAL lets readers run while a write is in progress, and synchronous=NORMAL
+# only syncs at checkpoints (still safe against application crashes; a power
+# loss can drop the last commits). Connections are kept for CONN_MAX_AGE
+# seconds so the pragmas and page cache aren't redone per request. IMMEDIATE
+# transactions take the write lock up front, so concurrent writers wait up to
+# ``timeout`` seconds for it instead of failing with "database is locked".
+SQLITE_PRODUCTION_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',  # 256 MiB
+    'PRAGMA cache_size=-65536',  # 64 MiB
+    'PRAGMA temp_store=MEMORY',
+]
+SQLITE_PRODUCTION = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'init_command': ';'.join(SQLITE_PRODUCTION_PRAGMAS),
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 5,
+    },
+}
+if os.environ.get('TRACKER_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION)
+
+# Writes that still hit "database is locked" are retried this many times in
+# total, with jittered exponential backoff starting at the delay (seconds).
+TRACKER_DB_LOCK_ATTEMPTS = 3
+TRACKER_DB_LOCK_BACKOFF = 0.05
+
+# Report jobs (tracker/reports.py) are built by `manage.py run_report_worker`
+# on this many processes and their results kept in this directory.
+TRACKER_REPORT_WORKERS = 2
+TRACKER_REPORT_DIR = BASE_DIR / 'reports'
+
+# Password hashes (signup, login, admin login) run on a pool of this many
+# threads in each process (tracker/hashing.py); this many more may wait for
+# one, and requests beyond that get a 429. 0 hashes on the request thread.
+# Keep the workers below the cores a process gets, or reads still starve.
+AUTHENTICATION_BACKENDS = ['tracker.authentication.PooledModelBackend']
+TRACKER_HASH_WORKERS = 2
+TRACKER_HASH_QUEUE_DEPTH = 16
+
+# Token buckets for signup and login per client IP and per username
+# (tracker/throttles.py): (burst, seconds to refill a whole burst).
+TRACKER_AUTH_RATES = {'ip': (30, 60), 'username': (10, 60)}
+TRACKER_RATE_LIMIT_KEYS = 100000
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
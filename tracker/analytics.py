@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from .services import get_expenses_by_bucket, get_expenses_by_category, merge_rows
+
+TREND_PERIODS = ('month', 'week')
+INVALID_PERIOD = "Invalid period. Choose 'month' or 'week'."
+
+
+async def alist(queryset):
+    """Evaluate a queryset through the async ORM."""
+    return [row async for row in queryset]
+
+
+def trends_query(user_id, period_filter, period, currency=None):
+    """Totals in the filtered range, bucketed for the trend chart, in ``currency`` if given.
+
+    Month view breaks spending down into weeks, week view into days. An empty
+    range simply aggregates to no rows.
+    """
+    granularity = 'week' if period == 'month' else 'day'
+    buckets = get_expenses_by_bucket(user_id, granularity, period_filter.start, period_filter.end, currency=currency)
+    return buckets.values('bucket', 'total')
+
+
+def trends_data(rows):
+    return [{'period': row['bucket'], 'total': row['total']} for row in merge_rows(rows, 'bucket')]
+
+
+def category_totals_query(user_id, period_filter, currency=None):
+    return get_expenses_by_category(user_id, period_filter.start, period_filter.end, currency=currency)
+
+
+def category_totals_data(rows):
+    return [{'category': row['category'], 'total': row['total']} for row in merge_rows(rows, 'category')]
+
+
+def summary_query(user_id, currency=None):
+    """All-time totals per category, archived years included."""
+    return get_expenses_by_category(user_id, currency=currency)
+
+
+def summary_data(rows):
+    # Largest first, once archived totals are folded in
+    category_breakdown = sorted(category_totals_data(rows), key=lambda item: -(item['total'] or 0))
+    # Total amount spent, summed from the breakdown instead of a second query
+    total_spent = sum((item['total'] or 0 for item in category_breakdown), Decimal('0')) if category_breakdown else 0
+    return {'total_spent': total_spent, 'category_breakdown': category_breakdown}
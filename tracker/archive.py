@@ -0,0 +1,231 @@
+"""Move whole years of old expenses out of the expense table and back.
+
+``archive_year`` packs one user's expenses from one calendar year into an
+ArchivedYear row: every field, column by column, as compressed JSON (zstd
+when the ``zstandard`` package is installed, gzip otherwise). The year's
+per-category, per-day totals go into ArchivedTotal, and its expenses and
+rollup rows are deleted, so the hot tables only hold recent history.
+
+Aggregates add the ArchivedTotal rows in their range to the rollups'
+(see ``tracker.services``), bucketed the same way, so archiving changes
+no total at any granularity; foreign-currency totals convert at each
+day's rate, as the rollups do. Per-expense statistics read the archives
+back (``archived_expenses``). ``restore_year`` puts the expenses back
+exactly as they were, ids, versions and change numbers included.
+"""
+import gzip
+import json
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models.functions import ExtractYear
+
+from .cache import invalidate_user
+from .db import select_for_write
+from .models import ArchivedTotal, ArchivedYear, Expense, ExpenseRollup, MonthlyRollup
+from .rollups import apply_deltas, collect_deltas, monthly_deltas
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FORMAT_VERSION = 1
+GZIP, ZSTD = 'gzip', 'zstd'
+
+
+class ArchiveError(Exception):
+    """An archive that can't be read here."""
+
+
+def default_codec():
+    return ZSTD if zstandard is not None else GZIP
+
+
+def compress(payload, codec):
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=10).compress(payload)
+    return gzip.compress(payload, compresslevel=9, mtime=0)
+
+
+def decompress(data, codec):
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ArchiveError("This archive is zstd-compressed; install the zstandard package to read it.")
+        return zstandard.ZstdDecompressor().decompress(bytes(data))
+    if codec == GZIP:
+        return gzip.decompress(bytes(data))
+    raise ArchiveError(f"Unknown archive codec '{codec}'.")
+
+
+def dictionary(values):
+    """Repeated strings as (distinct values, index of each)."""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return list(index), codes
+
+
+def encode(expenses):
+    """A user-year's expenses as compressible columnar JSON bytes."""
+    expenses = sorted(expenses, key=lambda expense: (expense.date, expense.id))
+    categories, category_codes = dictionary(expense.category for expense in expenses)
+    currencies, currency_codes = dictionary(expense.currency for expense in expenses)
+    # Sorted dates go in as gaps in days, mostly 0 or 1
+    ordinals = [expense.date.toordinal() for expense in expenses]
+    columns = {
+        'format': FORMAT_VERSION,
+        'id': [expense.id for expense in expenses],
+        'date': [ordinal - previous for ordinal, previous in zip(ordinals, [0, *ordinals])],
+        'categories': categories,
+        'category': category_codes,
+        'currencies': currencies,
+        'currency': currency_codes,
+        # Whole cents keep the amounts exact
+        'amount': [int(expense.amount.scaleb(2)) for expense in expenses],
+        'description': [expense.description for expense in expenses],
+        'version': [expense.version for expense in expenses],
+        'seq': [expense.seq for expense in expenses],
+    }
+    return json.dumps(columns, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def decode(user_id, payload):
+    """The Expense objects ``encode`` packed, unsaved."""
+    columns = json.loads(payload)
+    if columns.get('format') != FORMAT_VERSION:
+        raise ArchiveError(f"Unsupported archive format {columns.get('format')!r}.")
+    expenses, ordinal = [], 0
+    for row in zip(
+        columns['id'], columns['date'], columns['category'], columns['currency'],
+        columns['amount'], columns['description'], columns['version'], columns['seq'],
+    ):
+        expense_id, gap, category, currency, cents, description, version, seq = row
+        ordinal += gap
+        expenses.append(Expense(
+            id=expense_id, user_id=user_id, date=date.fromordinal(ordinal),
+            category=columns['categories'][category], currency=columns['currencies'][currency],
+            amount=Decimal(cents).scaleb(-2), description=description, version=version, seq=seq,
+        ))
+    return expenses
+
+
+def read_archive(archive):
+    return decode(archive.user_id, decompress(archive.data, archive.codec))
+
+
+def year_totals(user_id, year, expenses):
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        total = totals[(expense.category, expense.date, expense.currency)]
+        total[0] += expense.amount
+        total[1] += 1
+    return [
+        ArchivedTotal(user_id=user_id, category=category, year=date(year, 1, 1), day=day, currency=currency,
+                      total=total, count=count)
+        for (category, day, currency), (total, count) in totals.items()
+    ]
+
+
+def year_range(year):
+    return {'date__gte': date(year, 1, 1), 'date__lt': date(year + 1, 1, 1)}
+
+
+def archive_year(user_id, year, codec=None):
+    """Move a user's expenses from ``year`` into its archive. Returns how many moved.
+
+    Expenses written into an already archived year since are added to it.
+    """
+    with transaction.atomic():
+        hot = Expense.objects.filter(user_id=user_id, **year_range(year))
+        # Under the write lock, so no write to these rows lands between reading and deleting them
+        expenses = list(select_for_write(hot))
+        if not expenses:
+            return 0
+        archive = ArchivedYear.objects.select_for_update().filter(user_id=user_id, year=year).first()
+        if archive is not None:
+            expenses += read_archive(archive)
+        else:
+            archive = ArchivedYear(user_id=user_id, year=year)
+
+        archive.codec = codec or default_codec()
+        archive.count = len(expenses)
+        archive.data = compress(encode(expenses), archive.codec)
+        archive.save()
+        ArchivedTotal.objects.filter(user_id=user_id, year=date(year, 1, 1)).delete()
+        ArchivedTotal.objects.bulk_create(year_totals(user_id, year, expenses))
+
+        moved, _ = hot.delete()
+        # The whole year leaves, so its rollup rows go rather than being netted to zero
+        ExpenseRollup.objects.filter(user_id=user_id, day__gte=date(year, 1, 1), day__lt=date(year + 1, 1, 1)).delete()
+        MonthlyRollup.objects.filter(
+            user_id=user_id, month__gte=date(year, 1, 1), month__lt=date(year + 1, 1, 1),
+        ).delete()
+        transaction.on_commit(lambda: invalidate_user(user_id))
+    return moved
+
+
+def archive_before(cutoff, user=None, codec=None):
+    """Archive every year that ended before ``cutoff``, for one user or all.
+
+    Each user-year moves in its own transaction. Returns ``(years, expenses)``.
+    """
+    old = Expense.objects.filter(date__lt=date(cutoff.year, 1, 1))
+    if user is not None:
+        old = old.filter(user=user)
+    user_years = old.values_list('user_id', ExtractYear('date')).distinct().order_by('user_id', ExtractYear('date'))
+    years = moved = 0
+    for user_id, year in list(user_years):
+        moved += archive_year(user_id, year, codec)
+        years += 1
+    return years, moved
+
+
+def restore_year(user_id, year):
+    """Move a user's archived ``year`` back into the expense table. Returns how many came back."""
+    with transaction.atomic():
+        archive = select_for_write(ArchivedYear.objects.filter(user_id=user_id, year=year)).first()
+        if archive is None:
+            return 0
+        expenses = read_archive(archive)
+        Expense.objects.bulk_create(expenses, batch_size=2000)
+        # Not record_deltas: old spending coming back shouldn't raise budget alerts
+        deltas = collect_deltas(added=expenses)
+        apply_deltas(deltas)
+        apply_deltas(monthly_deltas(deltas), MonthlyRollup)
+        ArchivedTotal.objects.filter(user_id=user_id, year=date(year, 1, 1)).delete()
+        archive.delete()
+        transaction.on_commit(lambda: invalidate_user(user_id))
+    return len(expenses)
+
+
+def archived_totals(user_id, start=None, end=None, category=None):
+    """A user's ArchivedTotal rows for the days in ``[start, end)``."""
+    rows = ArchivedTotal.objects.filter(user_id=user_id)
+    if start is not None:
+        rows = rows.filter(day__gte=start)
+    if end is not None:
+        rows = rows.filter(day__lt=end)
+    if category:
+        rows = rows.filter(category=category)
+    return rows
+
+
+def archived_expenses(user_id, start=None, end=None, **lookups):
+    """A user's archived expenses dated ``start`` to ``end`` inclusive, read back from their archives.
+
+    ``lookups`` are exact field matches, e.g. ``category``.
+    """
+    archives = ArchivedYear.objects.filter(user_id=user_id).order_by('year')
+    if start is not None:
+        archives = archives.filter(year__gte=start.year)
+    if end is not None:
+        archives = archives.filter(year__lte=end.year)
+    return [
+        expense
+        for archive in archives
+        for expense in read_archive(archive)
+        if (start is None or expense.date >= start) and (end is None or expense.date <= end)
+        and all(getattr(expense, name) == value for name, value in lookups.items())
+    ]
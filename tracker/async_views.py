@@ -0,0 +1,160 @@
+"""Async variants of the read endpoints, served under ``/api/async/``.
+
+They return the same JSON as their DRF counterparts in views.py and share
+the analytics cache with them. Under an ASGI server the event loop keeps
+accepting requests while queries run, but Django's async ORM still runs
+each query on a sync thread, so with SQLite this buys concurrency rather
+than faster queries; benchmarks/load_asgi.py measures the trade-off.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .analytics import (
+    INVALID_PERIOD, TREND_PERIODS, alist, category_totals_data, category_totals_query, summary_data, summary_query,
+    trends_data, trends_query,
+)
+from .cache import acached_analytics
+from .dashboard import DEFAULT_RECENT, MAX_RECENT, abuild_dashboard
+from .filters import FilterError, PeriodFilter
+from .fx import home_currency
+from .metrics import timed
+from .models import Expense
+from .pagination import KeysetPaginator
+from .renderers import JSONResponse
+from .streaming import streaming_json_response
+from .views import EXPENSE_ROWS
+
+
+def async_api_view(view):
+    """Run an async GET view with the API's authentication and IsAuthenticated.
+
+    ``@api_view`` can't await, so this covers the part of DRF's request
+    cycle these endpoints need: a DRF ``Request`` for ``query_params``,
+    authentication through DEFAULT_AUTHENTICATION_CLASSES off the event loop
+    (the JWT user lookup is a sync query), and DRF's error payloads.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return JSONResponse(
+                {'detail': exceptions.MethodNotAllowed(request.method).detail},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED, headers={'Allow': 'GET, HEAD'},
+            )
+
+        request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+        try:
+            user = await sync_to_async(getattr)(request, 'user')
+        except exceptions.APIException as exc:
+            return not_authenticated(request, exc)
+        if not user.is_authenticated:
+            return not_authenticated(request, exceptions.NotAuthenticated())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def not_authenticated(request, exc):
+    """401 with a WWW-Authenticate challenge, as APIView.permission_denied sends."""
+    authenticators = request.authenticators
+    header = authenticators[0].authenticate_header(request) if authenticators else None
+    if header is None:
+        return JSONResponse({'detail': exc.detail}, status=status.HTTP_403_FORBIDDEN)
+    return JSONResponse(
+        {'detail': exc.detail}, status=status.HTTP_401_UNAUTHORIZED, headers={'WWW-Authenticate': header},
+    )
+
+
+@async_api_view
+@acached_analytics
+async def spending_trends(request, period):
+    if period not in TREND_PERIODS:
+        return JSONResponse({"error": INVALID_PERIOD}, status=400)
+
+    try:
+        period_filter = PeriodFilter.from_request(request)
+    except FilterError as e:
+        return JSONResponse({"error": str(e)}, status=400)
+
+    rows = await alist(trends_query(request.user.id, period_filter, period, home_currency(request.user.id)))
+    return JSONResponse({'trends': trends_data(rows)})
+
+
+@async_api_view
+@acached_analytics
+async def category_breakdown(request, period):
+    if period not in TREND_PERIODS:
+        return JSONResponse({"error": INVALID_PERIOD}, status=400)
+
+    try:
+        period_filter = PeriodFilter.from_request(request)
+    except FilterError as e:
+        return JSONResponse({"error": str(e)}, status=400)
+
+    rows = category_totals_query(request.user.id, period_filter, home_currency(request.user.id))
+    data = category_totals_data(await alist(rows))
+
+    # No data in the default month: keep returning the bare empty breakdown
+    if not data and period_filter.is_default:
+        return JSONResponse({'category_breakdown': []})
+
+    return JSONResponse({'category_breakdown': data, 'period_info': period_filter.period_info()})
+
+
+@async_api_view
+@acached_analytics
+async def expense_summary(request):
+    return JSONResponse(summary_data(await alist(summary_query(request.user.id, home_currency(request.user.id)))))
+
+
+@async_api_view
+@acached_analytics
+async def dashboard(request):
+    """Summary, category breakdown, trends and recent expenses in one response"""
+    period = request.query_params.get('period', 'month')
+    if period not in TREND_PERIODS:
+        return JSONResponse({"error": INVALID_PERIOD}, status=400)
+
+    try:
+        period_filter = PeriodFilter.from_request(request)
+        recent = min(int(request.query_params.get('recent', DEFAULT_RECENT)), MAX_RECENT)
+    except FilterError as e:
+        return JSONResponse({"error": str(e)}, status=400)
+    except ValueError:
+        return JSONResponse({"error": "recent must be an integer."}, status=400)
+
+    currency = home_currency(request.user.id)
+    return JSONResponse(
+        await abuild_dashboard(request.user.id, period_filter, period, max(recent, 0), EXPENSE_ROWS, currency),
+    )
+
+
+@async_api_view
+async def expense_list(request):
+    """Same as ExpenseList.get: the full list, keyset pages or a streamed array"""
+    expenses = Expense.objects.filter(user_id=request.user.id)
+    ordering = request.query_params.get('ordering', '')
+
+    if 'cursor' in request.query_params or 'page_size' in request.query_params:
+        try:
+            paginator = KeysetPaginator(ordering, request.query_params.get('page_size'))
+            rows, next_cursor = await paginator.apaginate(
+                EXPENSE_ROWS.values(expenses), request.query_params.get('cursor'), transform=EXPENSE_ROWS.to_dicts,
+            )
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return JSONResponse({"results": rows, "next": next_cursor})
+
+    if ordering:
+        expenses = expenses.order_by(ordering)
+
+    if request.query_params.get('stream') in ('1', 'true'):
+        return streaming_json_response(EXPENSE_ROWS.values(expenses), EXPENSE_ROWS.to_dicts, asynchronous=True)
+
+    rows = await alist(EXPENSE_ROWS.values(expenses))
+    with timed('serialize'):
+        data = EXPENSE_ROWS.to_dicts(rows)
+    return JSONResponse(data)
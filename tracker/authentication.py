@@ -0,0 +1,162 @@
+import hmac
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import hashing
+from .metrics import timed
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that reports its time to the performance middleware."""
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+
+class UserClaimsMixin:
+    """Sign the claims TrackerTokenUser reads into tokens issued for a user."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['username'] = user.get_username()
+        token['is_active'] = user.is_active
+        token['is_staff'] = user.is_staff
+        return token
+
+
+class TrackerRefreshToken(UserClaimsMixin, RefreshToken):
+    # Access tokens minted from it copy the claims
+    pass
+
+
+class TrackerAccessToken(UserClaimsMixin, AccessToken):
+    pass
+
+
+class TrackerTokenUser(TokenUser):
+    """A TokenUser that also trusts the token's ``is_active`` claim."""
+
+    @cached_property
+    def is_active(self):
+        return self.token.get('is_active', True)
+
+
+VerifiedToken = namedtuple('VerifiedToken', 'raw_token user token expires')
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified tokens, keyed by their signature.
+
+    An entry is only returned for the exact token it was stored for, and
+    only until it expires.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, signature, raw_token, now):
+        with self.lock:
+            entry = self.entries.get(signature)
+            if entry is None:
+                return None
+            if entry.expires <= now:
+                del self.entries[signature]
+                return None
+            self.entries.move_to_end(signature)
+        return entry if hmac.compare_digest(entry.raw_token, raw_token) else None
+
+    def set(self, signature, entry):
+        maxsize = getattr(settings, 'TRACKER_TOKEN_CACHE_SIZE', 10000)
+        with self.lock:
+            self.entries[signature] = entry
+            self.entries.move_to_end(signature)
+            while len(self.entries) > maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+VERIFIED_TOKENS = VerifiedTokenCache()
+
+
+class TokenUserAuthentication(TimedJWTAuthentication):
+    """JWT authentication that skips the User query on read requests.
+
+    Reads get a TrackerTokenUser built from the signed claims. The first
+    time a token is seen its user is still loaded and checked (exists,
+    active, password unchanged when CHECK_REVOKE_TOKEN is on), and the
+    result is cached for TRACKER_TOKEN_CACHE_TTL seconds, so deactivating a
+    user reaches reads within that window. Writes always load the User row.
+    Views should filter on ``request.user.id`` since a TokenUser isn't a
+    model instance.
+    """
+
+    def authenticate(self, request):
+        if request.method not in SAFE_METHODS:
+            return super().authenticate(request)
+
+        with timed('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            now = time.time()
+            signature = raw_token.rpartition(b'.')[2]
+            entry = VERIFIED_TOKENS.get(signature, raw_token, now)
+            if entry is None:
+                entry = self.verify(raw_token, now)
+                VERIFIED_TOKENS.set(signature, entry)
+            return entry.user, entry.token
+
+    def verify(self, raw_token, now):
+        validated_token = self.get_validated_token(raw_token)
+        self.get_user(validated_token)  # Raises for missing, inactive or revoked users
+        ttl = getattr(settings, 'TRACKER_TOKEN_CACHE_TTL', 60)
+        return VerifiedToken(
+            raw_token, TrackerTokenUser(validated_token), validated_token, min(now + ttl, validated_token['exp']),
+        )
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend that checks passwords on the hashing pool (tracker/hashing.py).
+
+    The user is still loaded on the request thread; only the hash runs on
+    the pool, which raises HashingBusy (a 429) when it's full.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so an unknown username takes as long as a wrong password, as ModelBackend does
+            hashing.make_password(password)
+            return None
+        if not (hashing.check_password(password, user.password) and self.user_can_authenticate(user)):
+            return None
+        if hashing.must_update(user.password):
+            user.password = hashing.make_password(password)
+            user.save(update_fields=['password'])
+        return user
@@ -0,0 +1,122 @@
+import logging
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from .fx import home_currencies, home_currency
+from .models import ArchivedTotal, Budget, MonthlyRollup
+
+logger = logging.getLogger(__name__)
+
+OK, WARNING, EXCEEDED = 'ok', 'warning', 'exceeded'
+LEVELS = (OK, WARNING, EXCEEDED)
+
+# Sent once the write that crossed a threshold has committed, with ``alert``
+budget_threshold_crossed = Signal()
+
+BudgetAlert = namedtuple('BudgetAlert', 'budget month spent level')
+
+
+def budget_level(budget, spent):
+    """Where ``spent`` falls against a budget: ok, warning or exceeded."""
+    if spent >= budget.limit:
+        return EXCEEDED
+    if spent * 100 >= budget.limit * budget.warning_threshold:
+        return WARNING
+    return OK
+
+
+def check_thresholds(months):
+    """Return a BudgetAlert for every budget a write pushed to a higher level.
+
+    ``months`` are the write's (user_id, category, month, currency) ->
+    [amount, count] deltas, already applied to MonthlyRollup. Budgets are in
+    the user's home currency and count spending in it. The month-to-date
+    totals are read from their rollup rows, so this is three small queries
+    per write, and none for writes to categories without a budget.
+    """
+    months = {key: amount for key, (amount, _) in months.items() if amount > 0}
+    if not months:
+        return []
+
+    budgets = {
+        (budget.user_id, budget.category): budget
+        for budget in Budget.objects.filter(
+            user_id__in={key[0] for key in months},
+            category__in={key[1] for key in months},
+        )
+    }
+    months = {key: amount for key, amount in months.items() if key[:2] in budgets}
+    if not months:
+        return []
+    homes = home_currencies({key[0] for key in months})
+    months = {key: amount for key, amount in months.items() if key[3] == homes[key[0]]}
+    if not months:
+        return []
+
+    lookup = Q()
+    for user_id, category, month, currency in months:
+        lookup |= Q(user_id=user_id, category=category, month=month, currency=currency)
+    totals = {
+        (row['user_id'], row['category'], row['month'], row['currency']): row['total']
+        for row in MonthlyRollup.objects.filter(lookup).values('user_id', 'category', 'month', 'currency', 'total')
+    }
+
+    alerts = []
+    for key, amount in months.items():
+        budget = budgets[key[:2]]
+        spent = totals.get(key, Decimal('0'))
+        level = budget_level(budget, spent)
+        if LEVELS.index(level) > LEVELS.index(budget_level(budget, spent - amount)):
+            alert = BudgetAlert(budget, key[2], spent, level)
+            alerts.append(alert)
+            transaction.on_commit(lambda alert=alert: notify(alert))
+    return alerts
+
+
+def notify(alert):
+    logger.info(
+        "Budget %s for user %s is %s: %s of %s spent in %s",
+        alert.budget.category, alert.budget.user_id, alert.level, alert.spent, alert.budget.limit,
+        f'{alert.month:%Y-%m}',
+    )
+    budget_threshold_crossed.send(sender=Budget, alert=alert)
+
+
+def budgets_with_spending(user_id, month):
+    """A user's budgets with their category's home-currency total for ``month`` as ``spent``, and ``remaining``.
+
+    Budgets don't convert: spending in other currencies isn't in ``spent``,
+    and how many such expenses the month has is annotated as ``uncounted``
+    so clients can say so. A month in an archived year is read from its
+    archived daily totals.
+    """
+    money = DecimalField(max_digits=14, decimal_places=2)
+    home = home_currency(user_id)
+    rollups = MonthlyRollup.objects.filter(user_id=OuterRef('user_id'), category=OuterRef('category'), month=month)
+    archived = ArchivedTotal.objects.filter(
+        user_id=OuterRef('user_id'), category=OuterRef('category'),
+        day__gte=month, day__lt=(month + timedelta(days=31)).replace(day=1),
+    )
+
+    def spent(rows):
+        total = rows.filter(currency=home).values('category').annotate(spent=Sum('total')).values('spent')
+        return Coalesce(Subquery(total), Value(Decimal('0')), output_field=money)
+
+    def uncounted(rows):
+        count = rows.exclude(currency=home).values('category').annotate(n=Sum('count')).values('n')
+        return Coalesce(Subquery(count), Value(0), output_field=IntegerField())
+
+    return (
+        Budget.objects
+        .filter(user_id=user_id)
+        .annotate(spent=ExpressionWrapper(spent(rollups) + spent(archived), output_field=money))
+        .annotate(remaining=F('limit') - F('spent'))
+        .annotate(uncounted=uncounted(rollups) + uncounted(archived))
+        .order_by('category')
+    )
@@ -0,0 +1,153 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .renderers import JSONResponse
+
+GENERATION_KEY = 'tracker:analytics:generation'
+
+
+def get_cache():
+    return caches[getattr(settings, 'TRACKER_ANALYTICS_CACHE_ALIAS', 'default')]
+
+
+def version_key(user_id):
+    return f'tracker:analytics:version:{user_id}'
+
+
+def fresh_version():
+    # Seed from the clock so a version evicted from the cache never comes back as an old value
+    return time.time_ns()
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, fresh_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    cache = get_cache()
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, fresh_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, fresh_version(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """Drop every cached analytics response for one user."""
+    bump_version(version_key(user_id))
+
+
+def invalidate_all():
+    """Drop every cached analytics response, e.g. after a full rollup rebuild.
+
+    Only processes sharing the cache backend see it; see TRACKER_ANALYTICS_CACHE_ALIAS.
+    """
+    bump_version(GENERATION_KEY)
+
+
+def request_digest(request, args, kwargs):
+    params = sorted((key, request.query_params.getlist(key)) for key in request.query_params)
+    return hashlib.md5(repr((args, sorted(kwargs.items()), params)).encode()).hexdigest()
+
+
+def response_key(view_name, request, args, kwargs):
+    user_id = request.user.id
+    return (
+        f'tracker:analytics:{view_name}:{user_id}'
+        f':{get_version(GENERATION_KEY)}:{get_version(version_key(user_id))}'
+        f':{request_digest(request, args, kwargs)}'
+    )
+
+
+async def aresponse_key(view_name, request, args, kwargs):
+    user_id = request.user.id
+    return (
+        f'tracker:analytics:{view_name}:{user_id}'
+        f':{await aget_version(GENERATION_KEY)}:{await aget_version(version_key(user_id))}'
+        f':{request_digest(request, args, kwargs)}'
+    )
+
+
+def response_etag(data):
+    return '"%s"' % hashlib.md5(JSONRenderer().render(data)).hexdigest()
+
+
+def etag_matches(request, etag):
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+
+def cached_analytics(view):
+    """Cache a read-only analytics view per user, period and filter params.
+
+    Entries are keyed on a per-user version counter that every expense write
+    bumps, so they never have to be deleted one by one. Successful responses
+    carry an ETag and a matching If-None-Match gets an empty 304.
+
+    Apply it underneath ``@api_view`` so it sees the authenticated request.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cache = get_cache()
+        key = response_key(view.__name__, request, args, kwargs)
+
+        cached = cache.get(key)
+        if cached is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = {'data': response.data, 'etag': response_etag(response.data)}
+            cache.set(key, cached, getattr(settings, 'TRACKER_ANALYTICS_CACHE_TIMEOUT', 300))
+
+        if etag_matches(request, cached['etag']):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': cached['etag']})
+        return Response(cached['data'], headers={'ETag': cached['etag']})
+
+    return wrapper
+
+
+def acached_analytics(view):
+    """``cached_analytics`` for the async views, returning a JSONResponse.
+
+    Entries are shared with the sync view of the same name, whose payload is
+    identical.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        cache = get_cache()
+        key = await aresponse_key(view.__name__, request, args, kwargs)
+
+        cached = await cache.aget(key)
+        if cached is None:
+            response = await view(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = {'data': response.data, 'etag': response_etag(response.data)}
+            await cache.aset(key, cached, getattr(settings, 'TRACKER_ANALYTICS_CACHE_TIMEOUT', 300))
+
+        if etag_matches(request, cached['etag']):
+            return JSONResponse(None, status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': cached['etag']})
+        return JSONResponse(cached['data'], headers={'ETag': cached['etag']})
+
+    return wrapper
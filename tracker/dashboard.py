@@ -0,0 +1,105 @@
+import asyncio
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Case, DateField, Sum, When
+from django.db.models.functions import TruncDay, TruncWeek
+
+from .analytics import alist
+from .archive import archived_totals
+from .fx import converted
+from .models import Expense, ExpenseRollup
+
+CENT = Decimal('0.01')
+DEFAULT_RECENT = 5
+MAX_RECENT = 50
+
+
+def bucket_totals_query(user_id, period_filter, period, currency=None):
+    """One pass over the user's rollups grouped by category and in-period trend bucket.
+
+    Buckets outside the selected range collapse into a NULL trend bucket, so
+    the same rows give the all-time totals, the in-period category breakdown
+    and the trend series. Archived daily totals are bucketed the same way.
+    Totals are in ``currency`` if given.
+    """
+    trunc = TruncWeek if period == 'month' else TruncDay
+    in_period = Case(When(period_filter.range_q(), then=trunc('day')), output_field=DateField())
+    hot = (
+        ExpenseRollup.objects
+        .filter(user_id=user_id)
+        .values('category', bucket=in_period)
+        .annotate(total=total_in('day', currency))
+        .order_by()
+    )
+    archived = (
+        archived_totals(user_id)
+        .values('category', bucket=in_period)
+        .annotate(total=total_in('day', currency))
+        .order_by()
+    )
+    return hot.union(archived, all=True)
+
+
+def total_in(day, currency):
+    return Sum('total') if currency is None else Sum(converted('total', 'currency', day, currency))
+
+
+def recent_expenses_query(user_id, limit):
+    return Expense.objects.filter(user_id=user_id).order_by('-date', '-id')[:limit]
+
+
+def summarize_buckets(rows):
+    """Fold (category, bucket, total) rows into the dashboard's aggregate sections.
+
+    Converted bucket totals arrive unrounded and are rounded to the cent once summed.
+    """
+    all_time = defaultdict(Decimal)
+    in_period = defaultdict(Decimal)
+    trends = defaultdict(Decimal)
+    for row in rows:
+        # Without a rate to convert at, a bucket's total is missing
+        total = row['total'] or 0
+        all_time[row['category']] += total
+        if row['bucket'] is not None:
+            in_period[row['category']] += total
+            trends[row['bucket']] += total
+
+    for totals in (all_time, in_period, trends):
+        for key, total in totals.items():
+            totals[key] = total.quantize(CENT)
+    return {
+        'total_spent': sum(all_time.values(), Decimal('0')) if all_time else 0,
+        'category_breakdown': [
+            {'category': category, 'total': total}
+            for category, total in sorted(all_time.items(), key=lambda item: -item[1])
+        ],
+        'period_breakdown': [{'category': category, 'total': total} for category, total in in_period.items()],
+        'trends': [{'period': bucket, 'total': trends[bucket]} for bucket in sorted(trends)],
+    }
+
+
+def build_dashboard(user_id, period_filter, period, recent, serialize, currency=None):
+    """Everything the dashboard shows, from two queries.
+
+    ``serialize`` renders the queryset of recent expenses.
+    """
+    data = summarize_buckets(bucket_totals_query(user_id, period_filter, period, currency))
+    data['period_info'] = period_filter.period_info()
+    data['recent_expenses'] = serialize(recent_expenses_query(user_id, recent))
+    return data
+
+
+async def abuild_dashboard(user_id, period_filter, period, recent, rows, currency=None):
+    """``build_dashboard`` for async views, issuing its two queries together.
+
+    ``rows`` is the ExpenseRowSerializer for the recent expenses.
+    """
+    buckets, recent_rows = await asyncio.gather(
+        alist(bucket_totals_query(user_id, period_filter, period, currency)),
+        alist(rows.values(recent_expenses_query(user_id, recent))),
+    )
+    data = summarize_buckets(buckets)
+    data['period_info'] = period_filter.period_info()
+    data['recent_expenses'] = rows.to_dicts(recent_rows)
+    return data
@@ -0,0 +1,68 @@
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, migrations
+from django.db.backends.base.schema import BaseDatabaseSchemaEditor
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked_error(exc):
+    """Whether ``exc`` is SQLite refusing a statement because another connection holds the lock."""
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCKED_MESSAGES)
+
+
+def retry_if_locked(func, *args, attempts=None, backoff=None, **kwargs):
+    """Call ``func``, retrying with jittered exponential backoff while the database is locked.
+
+    ``func`` should be a whole transaction, since a locked statement can't be
+    retried inside the transaction it failed in. Other errors, and the last
+    lock error, propagate.
+    """
+    attempts = attempts or getattr(settings, 'TRACKER_DB_LOCK_ATTEMPTS', 3)
+    backoff = getattr(settings, 'TRACKER_DB_LOCK_BACKOFF', 0.05) if backoff is None else backoff
+    for attempt in range(attempts):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as exc:
+            if not is_locked_error(exc) or attempt == attempts - 1:
+                raise
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def select_for_write(queryset):
+    """``queryset.select_for_update()``, with SQLite's write lock taken first.
+
+    SQLite ignores FOR UPDATE, and a deferred transaction only takes the
+    write lock at its first write, so rows read before then can change
+    underneath it. On SQLite this starts with a write that touches no rows,
+    so the rows are read under the lock (with IMMEDIATE transactions it's
+    already held). Call inside ``transaction.atomic()``.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'sqlite':
+        quote, meta = connection.ops.quote_name, queryset.model._meta
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {quote(meta.db_table)} SET {quote(meta.pk.column)} = {quote(meta.pk.column)} WHERE 0')
+    return queryset.select_for_update()
+
+
+class AddFieldInPlace(migrations.AddField):
+    """AddField that adds the column with ALTER TABLE on SQLite instead of rebuilding the table.
+
+    Django's SQLite backend copies the whole table into a new one to add any
+    NOT NULL column, which is slow on a large expense table and silently
+    drops its triggers (see migration 0011). A field with a constant
+    ``db_default`` can be added in place, as every other backend does.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'sqlite':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            field = model._meta.get_field(self.name)
+            if not (field.null or field.has_db_default()):
+                raise ValueError(f"{self.model_name}.{self.name} needs null=True or a db_default to be added in place.")
+            BaseDatabaseSchemaEditor.add_field(schema_editor, model, field)
@@ -0,0 +1,115 @@
+import re
+from datetime import date
+
+from django.db.models import Q
+
+ISO_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+
+
+def parse_iso_date(value):
+    """Parse YYYY-MM-DD with a precompiled pattern, raising ValueError otherwise."""
+    match = ISO_DATE_RE.match(value)
+    if not match:
+        raise ValueError(value)
+    return date(*map(int, match.groups()))
+
+
+def month_bounds(year, month):
+    """Return the first day of a month and the first day of the next one."""
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+class FilterError(ValueError):
+    pass
+
+
+def requested_month(request, today=None):
+    """First day of the month picked by the month and year params, defaulting to the current month."""
+    month = request.query_params.get('month')
+    year = request.query_params.get('year')
+    if month and year:
+        try:
+            return month_bounds(int(year), int(month))[0]
+        except ValueError:
+            raise FilterError("Invalid month or year format.")
+    return (today or date.today()).replace(day=1)
+
+
+# Expense list / export / search query params -> queryset lookups
+EXPENSE_LOOKUPS = [('date', 'date'), ('start_date', 'date__gte'), ('end_date', 'date__lte')]
+
+
+def expense_lookups(params):
+    """The category and inclusive date range filters shared by the expense endpoints."""
+    lookups = {}
+    category = params.get('category')
+    if category:
+        lookups['category'] = category
+    for param, lookup in EXPENSE_LOOKUPS:
+        value = params.get(param)
+        if value:
+            try:
+                lookups[lookup] = parse_iso_date(value)
+            except ValueError:
+                raise FilterError(f"Invalid {param} format. Use YYYY-MM-DD.")
+    return lookups
+
+
+class PeriodFilter:
+    """The start_date / month+year filter shared by the analytics views.
+
+    Parsed and validated once per request; ``apply`` then narrows a
+    queryset to the requesting user and the selected date range. With no
+    parameters it defaults to the current month.
+    """
+
+    def __init__(self, start=None, end=None, month=None, year=None, is_default=False):
+        self.start = start
+        self.end = end
+        self.month = month
+        self.year = year
+        self.is_default = is_default
+
+    @classmethod
+    def from_request(cls, request, today=None):
+        params = request.query_params
+        start_date = params.get('start_date')
+        month = params.get('month')
+        year = params.get('year')
+
+        if start_date:
+            try:
+                return cls(start=parse_iso_date(start_date), month=month, year=year)
+            except ValueError:
+                raise FilterError("Invalid start_date format. Use YYYY-MM-DD.")
+        if month and year:
+            try:
+                start, end = month_bounds(int(year), int(month))
+            except ValueError:
+                raise FilterError("Invalid month or year format.")
+            return cls(start=start, end=end, month=month, year=year)
+
+        # Default to the current month. If it has no data we don't fall back
+        # to the previous one, as that would be confusing with the month selector.
+        today = today or date.today()
+        return cls(start=today.replace(day=1), is_default=True)
+
+    def range_q(self, field='day'):
+        """The selected date range as a Q object, e.g. for conditional aggregation."""
+        q = Q()
+        if self.start:
+            q &= Q(**{f'{field}__gte': self.start})
+        if self.end:
+            q &= Q(**{f'{field}__lt': self.end})
+        return q
+
+    def apply(self, queryset, user_id, field='day'):
+        return queryset.filter(self.range_q(field), user_id=user_id)
+
+    def period_info(self):
+        return {
+            'month': self.month if self.month else self.start.month,
+            'year': self.year if self.year else self.start.year,
+        }
@@ -0,0 +1,203 @@
+"""Currency conversion against the locally loaded FxRate table.
+
+A rate is what one unit of a currency was worth in the base currency
+(``settings.TRACKER_FX_BASE_CURRENCY``) on a day. An amount converts with
+the latest rate on or before its date, so weekends and gaps in the file
+reuse the last known rate; amounts with no rate at all are left out of
+converted totals.
+
+Aggregates convert inside SQL: ``converted`` wraps a rollup or expense
+column in a CASE that passes home-currency rows through untouched and
+looks up both rates for the rest, and ``home_currency`` is a subquery, so
+a converted total is still a single query. Python-side conversions go
+through ``rate``, an in-process LRU cache of hot (currency, day) rates.
+Each load is recorded as an FxRateLoad, and the cache and any results
+kept outside it are keyed on ``rates_generation``, so a load in any
+process is seen by every other one.
+"""
+import csv
+import re
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import CharField, Case, DecimalField, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round, TruncMonth
+from django.db.models.lookups import Exact
+
+from .cache import invalidate_all
+from .models import DEFAULT_CURRENCY, ExpenseRollup, FxRate, FxRateLoad, Profile
+
+CURRENCY_CODE = re.compile(r'^[A-Z]{3}$')
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+RATE = FxRate._meta.get_field('rate')
+
+
+class RateFileError(ValueError):
+    """A rates file row that can't be loaded."""
+
+
+def base_currency():
+    return getattr(settings, 'TRACKER_FX_BASE_CURRENCY', DEFAULT_CURRENCY)
+
+
+def home_currency(user_id):
+    """A user's home currency as an SQL expression, to convert into without a query of its own."""
+    return Coalesce(
+        Subquery(Profile.objects.filter(user_id=user_id).values('home_currency')[:1]),
+        Value(DEFAULT_CURRENCY), output_field=CharField(),
+    )
+
+
+def home_currency_code(user_id):
+    """A user's home currency, read from their profile."""
+    return home_currencies([user_id])[user_id]
+
+
+def home_currencies(user_ids):
+    """The home currency of each of ``user_ids``."""
+    homes = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'home_currency'))
+    return {user_id: homes.get(user_id, DEFAULT_CURRENCY) for user_id in user_ids}
+
+
+def latest_rate(currency, day):
+    """Subquery for the latest rate of ``currency`` on or before ``day`` (values or expressions)."""
+    return Subquery(
+        FxRate.objects.filter(currency=currency, date__lte=day).order_by('-date').values('rate')[:1],
+        output_field=RATE,
+    )
+
+
+def as_expression(currency):
+    return Value(currency) if isinstance(currency, str) else currency
+
+
+def converted(amount, currency, day, home):
+    """An expression converting column ``amount`` into ``home``.
+
+    ``currency`` and ``day`` name the row's currency and date columns;
+    ``home`` is a code or an expression such as ``home_currency``. Rows
+    already in ``home`` skip the lookups; rows whose rate is unknown come
+    out NULL, which SUM ignores.
+    """
+    base, home = Value(base_currency()), as_expression(home)
+    row_rate = Case(
+        When(Exact(F(currency), base), then=Value(Decimal(1))),
+        default=latest_rate(OuterRef(currency), OuterRef(day)),
+        output_field=RATE,
+    )
+    home_rate = Case(
+        When(Exact(home, base), then=Value(Decimal(1))),
+        default=latest_rate(home, OuterRef(day)),
+        output_field=RATE,
+    )
+    return Case(
+        When(Exact(F(currency), home), then=F(amount)),
+        default=F(amount) * row_rate / home_rate,
+        output_field=MONEY,
+    )
+
+
+def converted_month(home):
+    """``converted`` for MonthlyRollup rows.
+
+    A month in another currency is re-summed from its daily rollup rows, each
+    at its own day's rate; home-currency months are used as they are.
+    """
+    home = as_expression(home)
+    days = (
+        ExpenseRollup.objects
+        .filter(user_id=OuterRef('user_id'), category=OuterRef('category'), currency=OuterRef('currency'))
+        .annotate(month=TruncMonth('day'))
+        .filter(month=OuterRef('month'))
+        .values('month')
+        .annotate(converted=Sum(converted('total', 'currency', 'day', home)))
+        .values('converted')
+    )
+    return Case(
+        When(Exact(F('currency'), home), then=F('total')),
+        default=Subquery(days, output_field=MONEY),
+        output_field=MONEY,
+    )
+
+
+def converted_sum(expression, rounded=True):
+    """SUM of a ``converted`` expression, rounded to the cent once, after adding, unless not ``rounded``."""
+    total = Sum(expression, output_field=MONEY)
+    return Round(total, 2, output_field=MONEY) if rounded else total
+
+
+@lru_cache(maxsize=4096)
+def cached_rate(generation, base, currency, day):
+    if currency == base:
+        return Decimal(1)
+    return FxRate.objects.filter(currency=currency, date__lte=day).order_by('-date').values_list(
+        'rate', flat=True,
+    ).first()
+
+
+def rate(currency, day, generation=None):
+    """The latest rate of ``currency`` on or before ``day``, None if there is none.
+
+    Pass ``generation``, from ``rates_generation``, when looking up many
+    rates at once to save reading it for each.
+    """
+    if generation is None:
+        generation = rates_generation()
+    return cached_rate(generation, base_currency(), currency, day)
+
+
+def factor(currency, home, day, generation=None):
+    """What to multiply an amount in ``currency`` by to get ``home``, None if a rate is missing."""
+    if currency == home:
+        return Decimal(1)
+    row_rate, home_rate = rate(currency, day, generation), rate(home, day, generation)
+    if row_rate is None or not home_rate:
+        return None
+    return row_rate / home_rate
+
+
+def convert(amount, currency, home, day, generation=None):
+    """``amount`` in ``currency`` as ``home`` on ``day``, to the cent; None if a rate is missing."""
+    multiplier = factor(currency, home, day, generation)
+    return None if multiplier is None else (Decimal(amount) * multiplier).quantize(Decimal('0.01'))
+
+
+def read_rates(stream):
+    """Parse ``date,currency,rate`` CSV rows (with that header) into FxRate objects."""
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames or {'date', 'currency', 'rate'} - set(reader.fieldnames):
+        raise RateFileError("The rates file needs a 'date,currency,rate' header.")
+    for line_num, row in enumerate(reader, start=2):
+        try:
+            day = date.fromisoformat(row['date'].strip())
+            value = Decimal(row['rate'].strip())
+        except (AttributeError, ValueError, InvalidOperation):
+            raise RateFileError(f"Line {line_num}: expected an ISO date and a decimal rate.")
+        currency = (row['currency'] or '').strip().upper()
+        if not CURRENCY_CODE.match(currency) or value <= 0:
+            raise RateFileError(f"Line {line_num}: expected a three-letter currency and a positive rate.")
+        yield FxRate(currency=currency, date=day, rate=value)
+
+
+def load_rates(rates, batch_size=1000):
+    """Insert or replace rates, all or nothing. Returns how many were loaded."""
+    rates = list(rates)
+    with transaction.atomic():
+        FxRate.objects.bulk_create(
+            rates, batch_size=batch_size,
+            update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate'],
+        )
+        FxRateLoad.objects.create(count=len(rates))
+        # Every converted total may have changed. Cached rates are keyed on the
+        # generation, so only need clearing to free the stale entries.
+        transaction.on_commit(cached_rate.cache_clear)
+        transaction.on_commit(invalidate_all)
+    return len(rates)
+
+
+def rates_generation():
+    """A number that changes whenever rates are loaded, for keying results converted with them."""
+    return FxRateLoad.objects.order_by('-id').values_list('id', flat=True).first() or 0
@@ -0,0 +1,90 @@
+"""Password hashing and verification on a bounded thread pool.
+
+A PBKDF2 hash at Django's iteration count costs tens of milliseconds of
+CPU. Run on request threads, a burst of signups or logins puts every one
+of them on a core and starves the cheap read endpoints. Here at most
+TRACKER_HASH_WORKERS hashes run at once (hashlib releases the GIL, so
+they run in parallel with everything else), up to TRACKER_HASH_QUEUE_DEPTH
+more wait for a thread, and any request beyond that is refused at once
+with HashingBusy, a 429, instead of queueing without end.
+
+The pool only ever hashes: the request thread does any database work, so
+the pool threads never hold connections.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework.exceptions import Throttled
+
+
+class HashingBusy(Throttled):
+    default_detail = "Too many sign-ins in progress. Try again shortly."
+    default_code = 'hashing_busy'
+
+
+class HashPool:
+    """A thread pool that refuses work once its queue is full.
+
+    Created on first use from the settings; ``shutdown`` lets the next use
+    pick up changed settings.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.slots = None
+
+    def start(self):
+        with self.lock:
+            if self.executor is None:
+                workers = getattr(settings, 'TRACKER_HASH_WORKERS', 2)
+                if workers:
+                    depth = getattr(settings, 'TRACKER_HASH_QUEUE_DEPTH', 16)
+                    self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+                    self.slots = threading.BoundedSemaphore(workers + depth)
+            return self.executor, self.slots
+
+    def run(self, func, *args):
+        """Call ``func`` on the pool and wait for its result; raises HashingBusy when the pool is full.
+
+        With TRACKER_HASH_WORKERS = 0 it's called on this thread, unbounded.
+        """
+        executor, slots = self.start()
+        if executor is None:
+            return func(*args)
+        if not slots.acquire(blocking=False):
+            raise HashingBusy(wait=getattr(settings, 'TRACKER_HASH_RETRY_AFTER', 1))
+        try:
+            future = executor.submit(func, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future.result()
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+            self.executor = self.slots = None
+
+
+POOL = HashPool()
+
+
+def make_password(password):
+    return POOL.run(hashers.make_password, password)
+
+
+def check_password(password, encoded):
+    """Whether ``password`` matches ``encoded``. Unlike ``hashers.check_password`` it never upgrades the hash."""
+    return POOL.run(hashers.check_password, password, encoded)
+
+
+def must_update(encoded):
+    """Whether a hash that just verified should be redone with the preferred hasher (cheap, no hashing)."""
+    preferred = hashers.get_hasher('default')
+    hasher = hashers.identify_hasher(encoded)
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
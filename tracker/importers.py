@@ -0,0 +1,138 @@
+import codecs
+import csv
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+from .changes import stamp
+from .models import Expense
+from .rollups import collect_deltas, record_deltas
+from .serializers import ExpenseSerializer
+
+CSV_CONTENT_TYPES = {'text/csv', 'application/csv'}
+JSONL_CONTENT_TYPES = {'application/x-ndjson', 'application/jsonl', 'application/x-jsonlines', 'application/json-lines'}
+IMPORT_FIELDS = ('category', 'amount', 'date', 'description', 'currency')
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_lines(stream):
+    """Decode a binary request stream line by line without reading it all."""
+    return codecs.iterdecode(stream, 'utf-8-sig')
+
+
+def iter_csv_rows(stream):
+    reader = csv.DictReader(iter_lines(stream))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_jsonl_rows(stream):
+    for line_num, line in enumerate(iter_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_num, None
+            continue
+        yield line_num, row
+
+
+def get_row_reader(content_type):
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CSV_CONTENT_TYPES:
+        return iter_csv_rows
+    if media_type in JSONL_CONTENT_TYPES:
+        return iter_jsonl_rows
+    return None
+
+
+class RowValidator:
+    """Validate import rows with the same rules as ExpenseSerializer and Expense.clean.
+
+    The serializer's field objects are built once and reused for every row,
+    which skips the per-row cost of instantiating a full serializer.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.serializer = ExpenseSerializer()
+        self.fields = {name: self.serializer.fields[name] for name in IMPORT_FIELDS}
+
+    def __call__(self, row):
+        expense = Expense(user=self.user, **self.validate_values(row))
+        try:
+            expense.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError({'non_field_errors': e.messages})
+        return expense
+
+    def validate_values(self, row, partial=False):
+        """Validated field values from ``row``; with ``partial`` only the fields it has."""
+        if not isinstance(row, dict):
+            raise serializers.ValidationError({'non_field_errors': ["Row is not a valid JSON object."]})
+
+        values, errors = {}, {}
+        for name, field in self.fields.items():
+            if partial and name not in row:
+                continue
+            value = row.get(name)
+            if value is None or (value == '' and name != 'description'):
+                value = serializers.empty
+            try:
+                values[name] = field.run_validation(value)
+            except SkipField:
+                pass  # Optional and missing, leave it to the model default
+            except serializers.ValidationError as e:
+                errors[name] = e.detail
+        for name in ('date', 'currency'):
+            if name not in values:
+                continue
+            try:
+                values[name] = getattr(self.serializer, f'validate_{name}')(values[name])
+            except serializers.ValidationError as e:
+                errors[name] = e.detail
+        if errors:
+            raise serializers.ValidationError(errors)
+        return values
+
+
+def import_expenses(user, rows, batch_size=500):
+    """Validate and insert ``(line_num, row)`` pairs in ``bulk_create`` batches.
+
+    Invalid rows are reported and skipped rather than aborting the upload.
+    Returns ``(created, failed, errors)``.
+    """
+    validate = RowValidator(user)
+    created, failed, errors = 0, 0, []
+    batch = []
+    # Rollup deltas are netted over the whole upload and applied once at the end
+    deltas = collect_deltas()
+
+    def flush():
+        Expense.objects.bulk_create(stamp(user.id, batch))
+        collect_deltas(added=batch, deltas=deltas)
+        batch.clear()
+
+    with transaction.atomic():
+        for line_num, row in rows:
+            try:
+                batch.append(validate(row))
+            except serializers.ValidationError as e:
+                failed += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({'row': line_num, 'errors': e.detail})
+                continue
+
+            if len(batch) >= batch_size:
+                created += len(batch)
+                flush()
+        if batch:
+            created += len(batch)
+            flush()
+        record_deltas(deltas)
+
+    return created, failed, errors
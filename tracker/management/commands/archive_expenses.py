@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.archive import GZIP, ZSTD, archive_before, zstandard
+
+
+class Command(BaseCommand):
+    help = "Move expenses from years that ended before a cutoff into compressed per-year archives."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', required=True, help="Archive whole years ending before this date (YYYY-MM-DD).")
+        parser.add_argument('--user', help="Only archive this username's expenses.")
+        parser.add_argument('--codec', choices=[GZIP, ZSTD], help="Compression; zstd when available by default.")
+
+    def handle(self, *args, **options):
+        try:
+            cutoff = date.fromisoformat(options['before'])
+        except ValueError:
+            raise CommandError("--before must be a date in YYYY-MM-DD format.")
+        if options['codec'] == ZSTD and zstandard is None:
+            raise CommandError("zstd needs the zstandard package.")
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        years, moved = archive_before(cutoff, user, options['codec'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} expenses from {years} user-years."))
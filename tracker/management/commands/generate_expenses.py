@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users and expenses for benchmarking and local testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help="Number of users to create.")
+        parser.add_argument('--expenses', type=int, default=1000, help="Expenses per user.")
+        parser.add_argument('--years', type=int, default=3, help="How many years back the dates go.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data.")
+        parser.add_argument('--prefix', default='synthetic', help="Username prefix.")
+        parser.add_argument('--password', default='synthetic-password', help="Password for every user.")
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users with prefix '{options['prefix']}' already exist. Pick another --prefix.")
+
+        users = generate(
+            options['users'], options['expenses'], years=options['years'], seed=options['seed'],
+            prefix=options['prefix'], password=options['password'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users with {options['expenses']} expenses each."
+        ))
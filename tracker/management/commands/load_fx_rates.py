@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.fx import RateFileError, base_currency, load_rates, read_rates
+
+
+class Command(BaseCommand):
+    help = "Load historical exchange rates from a local 'date,currency,rate' CSV file, replacing existing ones."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file of rates, each the value of one unit in the base currency.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as stream:
+                count = load_rates(read_rates(stream))
+        except OSError as e:
+            raise CommandError(f"Can't read {options['path']}: {e.strerror}")
+        except RateFileError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} rates against {base_currency()}."))
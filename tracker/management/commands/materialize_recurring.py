@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.recurring import DEFAULT_BATCH_SIZE, materialize
+
+
+class Command(BaseCommand):
+    help = "Create the expenses due from every user's recurring expense rules. Safe to run repeatedly."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--today', help="Materialize occurrences up to this date (YYYY-MM-DD) instead of today.")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Rules per transaction.")
+
+    def handle(self, *args, **options):
+        today = date.today()
+        if options['today']:
+            try:
+                today = date.fromisoformat(options['today'])
+            except ValueError:
+                raise CommandError("--today must be a date in YYYY-MM-DD format.")
+            if today > date.today():
+                raise CommandError("--today can't be in the future; expenses can't be dated ahead.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        rules, created = materialize(today, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} expenses from {rules} due rules."))
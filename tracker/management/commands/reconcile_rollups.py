@@ -0,0 +1,32 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.rollups import ROLLUP_BUCKETS, reconcile
+
+
+class Command(BaseCommand):
+    help = "Check the daily and monthly rollups against the raw expense table and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only check rollups for this username.")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without repairing it.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist.")
+
+        drifted = 0
+        for model in ROLLUP_BUCKETS:
+            keys = reconcile(model, user=user, repair=not options['dry_run'])
+            for user_id, category, bucket, currency in keys:
+                self.stdout.write(f"{model.__name__}: user {user_id} {category} {bucket} {currency}")
+            drifted += len(keys)
+
+        if options['dry_run'] and drifted:
+            raise CommandError(f"{drifted} rollup buckets have drifted.")
+        verb = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {drifted} drifted rollup buckets."))
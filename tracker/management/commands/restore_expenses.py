@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.archive import ArchiveError, restore_year
+
+
+class Command(BaseCommand):
+    help = "Move a user's archived year of expenses back into the expense table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('year', type=int)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['username']}' does not exist.")
+
+        try:
+            restored = restore_year(user.id, options['year'])
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        if not restored:
+            raise CommandError(f"{user.username} has no archive for {options['year']}.")
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} expenses from {options['year']}."))
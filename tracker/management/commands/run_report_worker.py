@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.reports import run_worker
+
+
+class Command(BaseCommand):
+    help = "Build queued reports on a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=getattr(settings, 'TRACKER_REPORT_WORKERS', 2),
+            help="Pool processes; 0 builds reports in this process.",
+        )
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is empty.")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between queue checks.")
+        parser.add_argument(
+            '--stale-after', type=int, default=3600,
+            help="Requeue jobs left running this many seconds, e.g. by a killed worker.",
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 0:
+            raise CommandError("--workers can't be negative.")
+        if options['poll_interval'] <= 0:
+            raise CommandError("--poll-interval must be positive.")
+
+        finished = run_worker(
+            options['workers'], options['once'], options['poll_interval'], options['stale_after'],
+            log=lambda message: self.stdout.write(message) if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Finished {finished} reports."))
@@ -0,0 +1,151 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+SLOWEST_STATEMENTS = 3
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings collected while one request is being handled."""
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = []  # min-heap of (duration, sql)
+        self.timings = {}
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        entry = (duration, sql[:500])
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def slowest_statements(self):
+        return [{'ms': round(d * 1000, 3), 'sql': sql} for d, sql in sorted(self.slowest, reverse=True)]
+
+
+class QueryRecorder:
+    """Database execute_wrapper that times every statement into the current request's metrics."""
+
+    def __call__(self, execute, sql, params, many, context):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.record_query(sql, time.perf_counter() - start)
+
+
+QUERY_RECORDER = QueryRecorder()
+
+
+def install_query_recorder(connection, **kwargs):
+    """Add QUERY_RECORDER to a connection's execute wrappers, once.
+
+    It stays installed rather than being wrapped around each request, since
+    the async ORM runs queries on a worker thread's connection, which an
+    ``execute_wrapper()`` block entered on the event loop never sees. The
+    request's metrics follow the query there through the context variable.
+    """
+    if QUERY_RECORDER not in connection.execute_wrappers:
+        connection.execute_wrappers.append(QUERY_RECORDER)
+
+
+@contextmanager
+def timed(name):
+    """Add the time spent in the block to the current request under ``name``.
+
+    SQL run inside the block is excluded since it is already reported as
+    database time, e.g. a lazy queryset evaluated by a serializer.
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    sql_before = metrics.sql_time
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start - (metrics.sql_time - sql_before)
+        metrics.timings[name] = metrics.timings.get(name, 0.0) + max(elapsed, 0.0)
+
+
+class Histogram:
+    """A cumulative Prometheus-style histogram, one series per label set."""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self.lock:
+            counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self.series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return lines
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram(
+    'tracker_request_duration_seconds', "Time to produce a response, by URL name.", DURATION_BUCKETS)
+SQL_DURATION = Histogram(
+    'tracker_request_sql_duration_seconds', "Time spent in SQL per request, by URL name.", DURATION_BUCKETS)
+SQL_QUERIES = Histogram(
+    'tracker_request_sql_queries', "SQL statements per request, by URL name.", (0, 1, 2, 3, 5, 10, 25, 50, 100))
+RESPONSE_SIZE = Histogram(
+    'tracker_response_size_bytes', "Response body size, by URL name.", (256, 1024, 4096, 16384, 65536, 262144, 1048576))
+
+HISTOGRAMS = (REQUEST_DURATION, SQL_DURATION, SQL_QUERIES, RESPONSE_SIZE)
+
+
+def observe_request(view, method, duration, metrics, size):
+    labels = (('method', method), ('view', view))
+    REQUEST_DURATION.observe(labels, duration)
+    SQL_DURATION.observe(labels, metrics.sql_time)
+    SQL_QUERIES.observe(labels, metrics.queries)
+    if size is not None:
+        RESPONSE_SIZE.observe(labels, size)
+
+
+def render_prometheus():
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,110 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .hashing import HashingBusy
+from .metrics import RequestMetrics, current_metrics, install_query_recorder, observe_request
+
+logger = logging.getLogger('tracker.performance')
+
+
+class PerformanceMiddleware:
+    """Time each request's SQL, serialization and auth.
+
+    Results go out as a ``Server-Timing`` header and a structured log line,
+    and are folded into per-URL histograms served by ``/api/_metrics/``.
+    Works under WSGI and ASGI, so async views aren't pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_recorder, dispatch_uid='tracker.install_query_recorder')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, metrics)
+
+    def finish(self, request, response, duration, metrics):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        # Streamed bodies are produced after we return, so their size isn't known here
+        size = None if response.streaming else len(response.content)
+
+        response['Server-Timing'] = server_timing(duration, metrics)
+        observe_request(view, request.method, duration, metrics, size)
+        log_request(request, response, view, duration, metrics, size)
+        return response
+
+
+class HashingBusyMiddleware(MiddlewareMixin):
+    """Answer a HashingBusy raised outside DRF, e.g. by the admin login, with a 429.
+
+    DRF views already turn it into one; elsewhere it would be a 500. The
+    mixin makes it async-capable too, so async views aren't pushed onto a thread.
+    """
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(exception.detail, status=exception.status_code, content_type='text/plain')
+        response['Retry-After'] = str(exception.wait)
+        return response
+
+
+def server_timing(duration, metrics):
+    entries = [
+        f'total;dur={duration * 1000:.2f}',
+        f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.queries} queries"',
+    ]
+    entries += [f'{name};dur={elapsed * 1000:.2f}' for name, elapsed in metrics.timings.items()]
+    return ', '.join(entries)
+
+
+def log_request(request, response, view, duration, metrics, size):
+    data = {
+        'method': request.method,
+        'path': request.path,
+        'view': view,
+        'status': response.status_code,
+        'total_ms': round(duration * 1000, 2),
+        'sql_ms': round(metrics.sql_time * 1000, 2),
+        'queries': metrics.queries,
+        **{f'{name}_ms': round(elapsed * 1000, 2) for name, elapsed in metrics.timings.items()},
+        'bytes': size,
+    }
+    # logfmt in the message for plain handlers, the full record in ``extra`` for JSON ones
+    logger.info(
+        ' '.join(f'{key}={value}' for key, value in data.items()),
+        extra={'performance': {**data, 'slowest_sql': metrics.slowest_statements()}},
+    )
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# Contentless FTS5 index over expense descriptions, keyed by expense id. The
+# owner column holds 'u<user_id>' so a search only walks one user's postings,
+# and prefixes up to 6 characters are indexed so search-as-you-type queries
+# don't merge every matching term's postings. Triggers keep it in step with
+# every write path, bulk imports included.
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE tracker_expense_fts USING fts5(
+        owner, description, content='', prefix='2 3 4 5 6', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_insert AFTER INSERT ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(rowid, owner, description) VALUES (new.id, 'u' || new.user_id, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_delete AFTER DELETE ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, owner, description)
+        VALUES ('delete', old.id, 'u' || old.user_id, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_update AFTER UPDATE OF user_id, description ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, owner, description)
+        VALUES ('delete', old.id, 'u' || old.user_id, old.description);
+        INSERT INTO tracker_expense_fts(rowid, owner, description) VALUES (new.id, 'u' || new.user_id, new.description);
+    END
+    """,
+    """
+    INSERT INTO tracker_expense_fts(rowid, owner, description)
+    SELECT id, 'u' || user_id, description FROM tracker_expense
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_insert",
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_delete",
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_update",
+    "DROP TABLE IF EXISTS tracker_expense_fts",
+]
+
+
+def has_fts5(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases, or SQLite builds without FTS5, use the icontains fallback in tracker.search
+    if has_fts5(schema_editor.connection):
+        for statement in FTS_SQL:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in DROP_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_budget_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
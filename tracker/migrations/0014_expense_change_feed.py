@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Max
+
+from tracker.db import AddFieldInPlace
+
+
+def number_existing_expenses(apps, schema_editor):
+    # Ids already increase with insertion, so they serve as each user's first change numbers
+    Expense = apps.get_model('tracker', 'Expense')
+    ChangeCounter = apps.get_model('tracker', 'ChangeCounter')
+    Expense.objects.update(seq=F('id'))
+    ChangeCounter.objects.bulk_create(
+        [
+            ChangeCounter(user_id=row['user_id'], last=row['last'])
+            for row in Expense.objects.values('user_id').annotate(last=Max('id')).order_by()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tracker', '0013_expense_version_syncoperation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExpenseTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expense_id', models.BigIntegerField()),
+                ('seq', models.BigIntegerField()),
+            ],
+        ),
+        # In place, keeping the search index triggers on tracker_expense
+        AddFieldInPlace(
+            model_name='expense',
+            name='seq',
+            field=models.BigIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['user', 'seq'], name='expense_user_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='expensetombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='expensetombstone',
+            index=models.Index(fields=['user', 'seq'], name='tombstone_user_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_expenses, migrations.RunPython.noop),
+    ]
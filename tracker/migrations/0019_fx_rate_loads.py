@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0018_report_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRateLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('loaded_at', models.DateTimeField(auto_now_add=True)),
+                ('count', models.PositiveIntegerField()),
+            ],
+        ),
+    ]
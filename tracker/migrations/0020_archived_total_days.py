@@ -0,0 +1,55 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def clear_totals(apps, schema_editor):
+    apps.get_model('tracker', 'ArchivedTotal').objects.all().delete()
+
+
+def rebuild_totals(apps, schema_editor):
+    """Recompute the totals per day from the archives themselves."""
+    from tracker.archive import read_archive
+
+    ArchivedTotal = apps.get_model('tracker', 'ArchivedTotal')
+    for archive in apps.get_model('tracker', 'ArchivedYear').objects.all():
+        totals = defaultdict(lambda: [Decimal('0'), 0])
+        for expense in read_archive(archive):
+            total = totals[(expense.category, expense.date, expense.currency)]
+            total[0] += expense.amount
+            total[1] += 1
+        ArchivedTotal.objects.bulk_create(
+            ArchivedTotal(user_id=archive.user_id, category=category, year=datetime.date(archive.year, 1, 1),
+                          day=day, currency=currency, total=total, count=count)
+            for (category, day, currency), (total, count) in totals.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0019_fx_rate_loads'),
+    ]
+
+    # The yearly totals are replaced by daily ones rebuilt from the archives.
+    # Migrating back leaves no totals; archive the years again to restore them.
+    operations = [
+        migrations.RunPython(clear_totals, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='archivedtotal',
+            name='unique_archived_total',
+        ),
+        migrations.AddField(
+            model_name='archivedtotal',
+            name='day',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name='archivedtotal',
+            constraint=models.UniqueConstraint(fields=('user', 'category', 'day', 'currency'), name='unique_archived_total'),
+        ),
+        migrations.RunPython(rebuild_totals, clear_totals),
+    ]
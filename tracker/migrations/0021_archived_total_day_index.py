@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0020_archived_total_days'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtotal',
+            index=models.Index(fields=['user', 'day'], name='archived_total_user_day_idx'),
+        ),
+    ]
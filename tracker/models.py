@@ -3,6 +3,9 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 
+# ISO 4217 code for amounts entered without one
+DEFAULT_CURRENCY = 'USD'
+
 class Expense(models.Model):
     CATEGORY_CHOICES = [
         ('Food', 'Food'),
@@ -15,8 +18,22 @@ class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.CharField(max_length=50)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY, db_default=DEFAULT_CURRENCY)
     date = models.DateField()
     description = models.TextField(blank=True)
+    # Bumped on every update so offline clients can detect conflicting edits
+    version = models.PositiveIntegerField(default=1, db_default=1)
+    # The user's change number at the last write, see tracker.changes
+    seq = models.BigIntegerField(default=0, db_default=0)
+
+    class Meta:
+        indexes = [
+            # Every hot query filters on user first, then ranges or sorts on one column
+            models.Index(fields=['user', 'date'], name='expense_user_date_idx'),
+            models.Index(fields=['user', 'amount'], name='expense_user_amount_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='expense_user_cat_date_idx'),
+            models.Index(fields=['user', 'seq'], name='expense_user_seq_idx'),
+        ]
 
     def clean(self):
         if self.amount <= 0:
@@ -27,3 +44,309 @@ class Expense(models.Model):
 
     def formatted_date(self):
         return self.date.strftime("%B %d, %Y")
+
+
+class ExpenseRollup(models.Model):
+    """Pre-aggregated spending per user, category, day and currency.
+
+    Kept in step with ``Expense`` by ``tracker.rollups`` so the analytics
+    endpoints can sum buckets instead of rescanning every expense. Totals
+    are in the bucket's own currency; ``tracker.fx`` converts them.
+    """
+    bucket_field = 'day'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50)
+    day = models.DateField()
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'day', 'currency'], name='unique_rollup_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day'], name='rollup_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} on {self.day}: ${self.total} ({self.count})"
+
+
+class MonthlyRollup(models.Model):
+    """Spending per user, category, calendar month and currency.
+
+    Maintained alongside ``ExpenseRollup`` so a month-to-date total, e.g. for
+    a budget check, is a single row instead of a sum over the month's days.
+    ``month`` is the first day of the month.
+    """
+    bucket_field = 'month'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50)
+    month = models.DateField()
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'month', 'currency'], name='unique_monthly_rollup_bucket'),
+        ]
+        indexes = [
+            # Month, quarter and year buckets over a date range, see tracker.services
+            models.Index(fields=['user', 'month'], name='monthly_rollup_user_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} in {self.month:%Y-%m}: ${self.total} ({self.count})"
+
+
+class Budget(models.Model):
+    """A monthly spending limit for one of a user's categories, in their home currency."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50)
+    limit = models.DecimalField(max_digits=10, decimal_places=2)
+    # Percentage of the limit at which the budget counts as nearly spent
+    warning_threshold = models.PositiveSmallIntegerField(default=80)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_budget_category'),
+        ]
+
+    def clean(self):
+        if self.limit <= 0:
+            raise ValidationError("Limit must be greater than 0")
+        if not 1 <= self.warning_threshold <= 100:
+            raise ValidationError("Warning threshold must be between 1 and 100")
+
+    def __str__(self):
+        return f"{self.category}: ${self.limit} a month"
+
+
+class SyncOperation(models.Model):
+    """An operation applied through the sync endpoint, recorded under its idempotency key.
+
+    A retried batch finds its keys here and gets the stored outcome back
+    instead of applying the operation again.
+    """
+    CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+    OPS = [(CREATE, 'Create'), (UPDATE, 'Update'), (DELETE, 'Delete')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=64)
+    op = models.CharField(max_length=6, choices=OPS)
+    # Not a foreign key: the expense may since have been deleted
+    expense_id = models.BigIntegerField()
+    version = models.PositiveIntegerField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_sync_operation_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.op} {self.expense_id} ({self.key})"
+
+
+class ChangeCounter(models.Model):
+    """The last change number handed out for a user's expenses.
+
+    Writers bump it inside their transaction, which also locks the row, so
+    one user's changes commit in the order of their numbers.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    last = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.last}"
+
+
+class ExpenseTombstone(models.Model):
+    """A deleted expense, kept so the change feed can report the deletion."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Not a foreign key: the expense is gone
+    expense_id = models.BigIntegerField()
+    seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='tombstone_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.expense_id} deleted at {self.seq}"
+
+
+class RecurringExpense(models.Model):
+    """A rule for an expense that repeats, such as rent or a subscription.
+
+    Occurrence ``n`` falls ``n * every`` intervals after ``anchor_date``
+    (monthly and yearly ones on the anchor's day, or the month's last day
+    when it is shorter). ``occurrences`` counts those already turned into
+    expenses by ``tracker.recurring.materialize`` and ``next_date`` is when
+    the next one is due, or null once the rule has ended.
+    """
+    DAILY, WEEKLY, MONTHLY, YEARLY = 'daily', 'weekly', 'monthly', 'yearly'
+    INTERVALS = [(DAILY, 'Daily'), (WEEKLY, 'Weekly'), (MONTHLY, 'Monthly'), (YEARLY, 'Yearly')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    description = models.TextField(blank=True)
+    interval = models.CharField(max_length=7, choices=INTERVALS, default=MONTHLY)
+    every = models.PositiveSmallIntegerField(default=1)
+    anchor_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    occurrences = models.PositiveIntegerField(default=0)
+    next_date = models.DateField(null=True)
+
+    class Meta:
+        indexes = [
+            # The scheduler only visits rules that are due
+            models.Index(fields=['next_date'], name='recurring_next_date_idx'),
+        ]
+
+    def clean(self):
+        if self.amount <= 0:
+            raise ValidationError("Amount must be greater than 0")
+        if self.every < 1:
+            raise ValidationError("Every must be at least 1")
+        if self.end_date is not None and self.end_date < self.anchor_date:
+            raise ValidationError("End date must not be before the anchor date")
+
+    def __str__(self):
+        return f"{self.category}: ${self.amount} {self.interval} (every {self.every})"
+
+
+class Profile(models.Model):
+    """Per-user preferences. Users without one use the defaults."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    # Analytics report totals in this currency
+    home_currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.home_currency}"
+
+
+class FxRate(models.Model):
+    """What one unit of ``currency`` was worth in the base currency on ``date``.
+
+    The base is ``settings.TRACKER_FX_BASE_CURRENCY``. Loaded from files by
+    the load_fx_rates command; see ``tracker.fx``.
+    """
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            # Also the index for looking up the latest rate on or before a day
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_fx_rate'),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} on {self.date}: {self.rate}"
+
+
+class FxRateLoad(models.Model):
+    """One load of exchange rates. The latest id is the rates' generation, see ``tracker.fx.rates_generation``."""
+    loaded_at = models.DateTimeField(auto_now_add=True)
+    count = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.count} rates at {self.loaded_at}"
+
+
+class ArchivedYear(models.Model):
+    """One calendar year of a user's expenses, moved out of the expense table.
+
+    ``data`` holds every field of every expense column by column, compressed
+    with ``codec``; see ``tracker.archive``. The year's totals are kept next
+    to it in ArchivedTotal.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    codec = models.CharField(max_length=8)
+    count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'year'], name='unique_archived_year'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.year}: {self.count} expenses ({self.codec})"
+
+
+class ArchivedTotal(models.Model):
+    """Spending per user, category, day and currency in an archived year.
+
+    Stands in for the year's rollup rows, which are dropped with its
+    expenses, so converted totals use each day's rate as they did before.
+    ``year`` is the first day of the year.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50)
+    year = models.DateField()
+    day = models.DateField()
+    currency = models.CharField(max_length=3, default=DEFAULT_CURRENCY)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'day', 'currency'], name='unique_archived_total'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'year'], name='archived_total_user_year_idx'),
+            # Aggregates read the days in a range, as from the rollups
+            models.Index(fields=['user', 'day'], name='archived_total_user_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category} on {self.day}: ${self.total} ({self.count})"
+
+
+class ReportJob(models.Model):
+    """A report requested through the API and built by the run_report_worker command.
+
+    ``key`` identifies the report's contents: the user, kind, parameters and
+    the user's change number at request time, see ``tracker.reports``. A
+    request matching a job that hasn't failed gets that job back, and the
+    result file is named after the key.
+    """
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUSES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=32)
+    params = models.JSONField(default=dict)
+    key = models.CharField(max_length=64)
+    status = models.CharField(max_length=7, choices=STATUSES, default=QUEUED)
+    result_file = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            # One live job per distinct report; a failed one can be requested again
+            models.UniqueConstraint(
+                fields=['key'], condition=~models.Q(status='failed'), name='unique_live_report_job',
+            ),
+        ]
+        indexes = [
+            # The worker takes the oldest queued jobs
+            models.Index(fields=['status', 'id'], name='report_job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.user_id}: {self.status}"
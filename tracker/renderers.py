@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+
+from django.http import HttpResponse
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RowRenderer(BaseRenderer):
+    """Base for flat row formats that can be rendered whole or streamed.
+
+    ``render`` handles ordinary responses (including error payloads), while
+    ``stream`` encodes ``values_list`` tuples without building model
+    instances, yielding roughly ``chunk_size`` bytes at a time.
+    """
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = [data] if isinstance(data, dict) else list(data)
+        header = list(rows[0]) if rows else []
+        return b''.join(self.stream(header, ([row.get(name) for name in header] for row in rows)))
+
+    def stream(self, header, rows, chunk_size=64 * 1024):
+        buffer = io.StringIO()
+        write_row = self.start(buffer, header)
+        for row in rows:
+            write_row(row)
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode(self.charset)
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+    def start(self, buffer, header):
+        """Write any preamble to ``buffer`` and return a function that writes one row."""
+        raise NotImplementedError
+
+
+class CSVRenderer(RowRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def start(self, buffer, header):
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        return writer.writerow
+
+
+class JSONLinesRenderer(RowRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    extension = 'jsonl'
+
+    def start(self, buffer, header):
+        encode = json.JSONEncoder(default=str, ensure_ascii=False, separators=(',', ':')).encode
+
+        def write_row(row):
+            buffer.write(encode(dict(zip(header, row))))
+            buffer.write('\n')
+        return write_row
+
+
+def refuse(value):
+    raise TypeError
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson when it can, byte-for-byte like the stdlib path.
+
+    Meant for row payloads of strings, integers and None, such as the output
+    of ExpenseRowSerializer, which orjson writes exactly as DRF's encoder
+    does. Anything orjson would write differently (Decimals, dates and
+    datetimes, indented output) falls back to the regular JSONRenderer, as
+    does a missing orjson.
+    """
+    orjson_options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=refuse, option=self.orjson_options)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same strict-JavaScript-subset escaping as JSONRenderer
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class JSONResponse(HttpResponse):
+    """A plain Django response with the body a DRF ``Response`` would get from FastJSONRenderer.
+
+    For the async views, which run outside DRF's request/response cycle.
+    ``data`` is kept on the response like ``Response.data``.
+    """
+
+    def __init__(self, data, status=200, headers=None):
+        content = b'' if data is None else FastJSONRenderer().render(data)
+        super().__init__(content, content_type=FastJSONRenderer.media_type, status=status, headers=headers)
+        self.data = data
@@ -0,0 +1,15 @@
+"""Entry points for run_report_worker's pool processes.
+
+Pool processes are spawned, so they unpickle these functions before
+Django is set up; this module must not import models at import time.
+"""
+
+
+def setup():
+    import django
+    django.setup()
+
+
+def build(job_id):
+    from .reports import build
+    return build(job_id)
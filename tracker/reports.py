@@ -0,0 +1,284 @@
+"""Reports too slow to build inside a request, queued in the database.
+
+``enqueue`` records a ReportJob; the run_report_worker command claims
+queued jobs and builds them on a process pool, so a long report never
+holds a web worker and several build side by side. There is no broker:
+the ReportJob table is the queue, claimed with ``skip_locked`` where the
+database supports it.
+
+A job's key hashes the user, kind, parameters, home currency, the user's
+change number (see ``tracker.changes``) and the exchange rates'
+generation, so asking again for a report over unchanged data returns the
+existing job, and its result file in ``settings.TRACKER_REPORT_DIR`` is
+named after the key and reused. A done job whose file has since gone is
+marked failed, so it can be asked for again.
+"""
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from decimal import Decimal
+from heapq import merge
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import report_pool
+from .archive import read_archive
+from .fx import home_currency_code, rates_generation
+from .models import ArchivedYear, ChangeCounter, Expense, ReportJob
+from .services import get_expenses_by_bucket, get_expenses_by_category, merge_rows
+
+CENT = Decimal('0.01')
+MISSING_RESULT = "The result file is gone; request the report again."
+MAX_STATEMENT_YEARS = 50
+HISTORY_FIELDS = ('id', 'category', 'amount', 'date', 'description', 'currency')
+
+
+class ReportError(ValueError):
+    """A report request with an unknown kind or invalid parameters."""
+
+
+def report_dir():
+    return getattr(settings, 'TRACKER_REPORT_DIR', os.path.join(settings.BASE_DIR, 'reports'))
+
+
+def year_param(params, name, default=None):
+    value = params.get(name, default)
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        raise ReportError(f"{name} must be a year.")
+    if not 1900 <= year <= date.today().year:
+        raise ReportError(f"{name} must be between 1900 and this year.")
+    return year
+
+
+def statement_params(params):
+    start = year_param(params, 'start_year')
+    end = year_param(params, 'end_year', start)
+    if not 0 <= end - start < MAX_STATEMENT_YEARS:
+        raise ReportError(f"end_year must be from start_year to {MAX_STATEMENT_YEARS - 1} years after it.")
+    return {'start_year': start, 'end_year': end}
+
+
+def history_params(params):
+    if params:
+        raise ReportError("This report takes no parameters.")
+    return {}
+
+
+def money(total):
+    """A total to the cent, 0 when it couldn't be converted."""
+    return Decimal(total or 0).quantize(CENT)
+
+
+def annual_statement(user_id, params, stream):
+    """Per-year category and monthly totals in the user's home currency, archived years included."""
+    currency = home_currency_code(user_id)
+    years = []
+    for year in range(params['start_year'], params['end_year'] + 1):
+        start, end = date(year, 1, 1), date(year + 1, 1, 1)
+        categories = [
+            {'category': row['category'], 'total': money(row['total']), 'count': row['count']}
+            for row in merge_rows(get_expenses_by_category(user_id, start, end, currency=currency), 'category')
+        ]
+        months = get_expenses_by_bucket(user_id, 'month', start, end, currency=currency)
+        years.append({
+            'year': year,
+            'total': sum((row['total'] for row in categories), money(0)),
+            'categories': categories,
+            'months': [
+                {'month': f"{row['bucket']:%Y-%m}", 'total': money(row['total'])} for row in merge_rows(months, 'bucket')
+            ],
+        })
+    json.dump({'currency': currency, 'years': years}, stream, cls=DjangoJSONEncoder)
+
+
+def expense_history(user_id, params, stream):
+    """Every expense the user has, archived years included, as CSV in date order."""
+    def rows(expenses):
+        return ((expense.date, expense.id, [getattr(expense, name) for name in HISTORY_FIELDS]) for expense in expenses)
+
+    hot = Expense.objects.filter(user_id=user_id).order_by('date', 'id').iterator(chunk_size=2000)
+    # Archives come back in (date, id) order, year after year
+    archived = (
+        row
+        for archive in ArchivedYear.objects.filter(user_id=user_id).order_by('year')
+        for row in rows(read_archive(archive))
+    )
+    writer = csv.writer(stream)
+    writer.writerow(HISTORY_FIELDS)
+    writer.writerows(row for _, _, row in merge(rows(hot), archived, key=lambda row: row[:2]))
+
+
+# Kind -> (parameter validator, builder, result file extension)
+KINDS = {
+    'annual_statement': (statement_params, annual_statement, 'json'),
+    'expense_history': (history_params, expense_history, 'csv'),
+}
+
+
+def clean_params(kind, params):
+    if kind not in KINDS:
+        raise ReportError(f"Unknown report kind. Choose one of: {', '.join(KINDS)}.")
+    if not isinstance(params, dict):
+        raise ReportError("params must be an object.")
+    return KINDS[kind][0](params)
+
+
+def report_key(user_id, kind, params):
+    change = ChangeCounter.objects.filter(user_id=user_id).values_list('last', flat=True).first() or 0
+    identity = [user_id, kind, params, home_currency_code(user_id), change, rates_generation()]
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+def result_name(job):
+    return f'{job.key}.{KINDS[job.kind][2]}'
+
+
+def result_path(job):
+    return os.path.join(report_dir(), job.result_file)
+
+
+def enqueue(user_id, kind, params):
+    """Queue a report, or find the same report already queued or built.
+
+    Returns ``(job, created)``; raises ReportError for an invalid request.
+    """
+    params = clean_params(kind, params)
+    key = report_key(user_id, kind, params)
+    live = ReportJob.objects.filter(key=key).exclude(status=ReportJob.FAILED)
+    job = live.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            return ReportJob.objects.create(user_id=user_id, kind=kind, params=params, key=key), True
+    except IntegrityError:
+        # An identical request got in first
+        return live.get(), False
+
+
+def claim(limit):
+    """Mark up to ``limit`` of the oldest queued jobs running and return them."""
+    with transaction.atomic():
+        jobs = list(
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ReportJob.QUEUED).order_by('id')[:limit]
+        )
+        ReportJob.objects.filter(id__in=[job.id for job in jobs]).update(
+            status=ReportJob.RUNNING, started_at=timezone.now(),
+        )
+    return jobs
+
+
+def requeue_stale(after):
+    """Put back jobs left running for longer than ``after`` seconds, e.g. by a killed worker."""
+    return ReportJob.objects.filter(
+        status=ReportJob.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=after),
+    ).update(status=ReportJob.QUEUED, started_at=None)
+
+
+def build(job_id):
+    """Build a job's result file unless an earlier job left it, and return the file name.
+
+    Runs in a pool process (through ``report_pool``); the worker records the outcome.
+    """
+    job = ReportJob.objects.get(id=job_id)
+    job.result_file = result_name(job)
+    path = result_path(job)
+    if not os.path.exists(path):
+        os.makedirs(report_dir(), exist_ok=True)
+        # Written aside and renamed, so a crash never leaves a partial file under the final name
+        partial = f'{path}.{os.getpid()}.tmp'
+        try:
+            with open(partial, 'w', newline='', encoding='utf-8') as stream:
+                KINDS[job.kind][1](job.user_id, job.params, stream)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    return job.result_file
+
+
+def finish(job_id, result_file=None, error=None):
+    ReportJob.objects.filter(id=job_id).update(
+        status=ReportJob.FAILED if error else ReportJob.DONE,
+        result_file=result_file or '', error=error or '', finished_at=timezone.now(),
+    )
+
+
+def expire(job):
+    """Mark a done job failed because its result file is missing."""
+    finish(job.id, error=MISSING_RESULT)
+    job.refresh_from_db()
+
+
+def check_result(job):
+    """Expire a done job whose result file has been removed. Returns whether it's still done."""
+    if job.status == ReportJob.DONE and not os.path.exists(result_path(job)):
+        expire(job)
+    return job.status == ReportJob.DONE
+
+
+def run_inline(job):
+    try:
+        finish(job.id, build(job.id))
+    except Exception as e:
+        finish(job.id, error=f"{type(e).__name__}: {e}")
+
+
+def run_worker(workers, once=False, poll_interval=1.0, stale_after=3600, log=lambda message: None):
+    """Build queued reports until stopped, or until the queue is empty with ``once``.
+
+    ``workers`` pool processes build side by side; with 0 jobs are built in
+    this process. Returns the number of jobs finished.
+    """
+    requeue_stale(stale_after)
+    finished = 0
+    if not workers:
+        while True:
+            jobs = claim(1)
+            if not jobs:
+                if once:
+                    return finished
+                time.sleep(poll_interval)
+                continue
+            run_inline(jobs[0])
+            finished += 1
+            log(f"Finished report {jobs[0].id}.")
+
+    # Spawned rather than forked, so no process inherits this one's database connection
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=report_pool.setup) as pool:
+        running = {}
+        while True:
+            for job in claim(workers - len(running)) if len(running) < workers else []:
+                try:
+                    running[pool.submit(report_pool.build, job.id)] = job.id
+                except BrokenProcessPool:
+                    # Leave it for the next worker; the pool can't take more work
+                    ReportJob.objects.filter(id=job.id).update(status=ReportJob.QUEUED, started_at=None)
+                    raise
+            if not running:
+                if once:
+                    return finished
+                time.sleep(poll_interval)
+                continue
+            done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = running.pop(future)
+                try:
+                    finish(job_id, future.result())
+                except Exception as e:
+                    finish(job_id, error=f"{type(e).__name__}: {e}")
+                finished += 1
+                log(f"Finished report {job_id}.")
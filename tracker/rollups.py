@@ -0,0 +1,243 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from .budgets import check_thresholds
+from .cache import invalidate_all, invalidate_user
+from .models import Expense, ExpenseRollup, MonthlyRollup
+
+
+def bucket_key(expense):
+    """Return the (user_id, category, day, currency) bucket an expense falls into."""
+    return (expense.user_id, expense.category, expense.date, expense.currency)
+
+
+def collect_deltas(added=(), removed=(), deltas=None):
+    """Net out added and removed expenses into per-bucket (amount, count) deltas.
+
+    Pass an earlier result as ``deltas`` to keep accumulating into it.
+    """
+    if deltas is None:
+        deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in added:
+        delta = deltas[bucket_key(expense)]
+        delta[0] += Decimal(expense.amount)
+        delta[1] += 1
+    for expense in removed:
+        delta = deltas[bucket_key(expense)]
+        delta[0] -= Decimal(expense.amount)
+        delta[1] -= 1
+    return deltas
+
+
+# Above this many touched buckets, fetch and update them in batches rather than one by one
+BULK_THRESHOLD = 8
+BULK_BATCH_SIZE = 250
+
+
+def monthly_deltas(deltas):
+    """Fold daily bucket deltas into (user_id, category, first of month, currency) deltas."""
+    months = defaultdict(lambda: [Decimal('0'), 0])
+    for (user_id, category, day, currency), (amount, count) in deltas.items():
+        delta = months[(user_id, category, day.replace(day=1), currency)]
+        delta[0] += amount
+        delta[1] += count
+    return months
+
+
+def bucket_filter(model, key):
+    user_id, category, bucket, currency = key
+    return {'user_id': user_id, 'category': category, model.bucket_field: bucket, 'currency': currency}
+
+
+def apply_bucket_delta(key, amount, count, model=ExpenseRollup):
+    """Add one delta to its bucket. Returns the bucket queryset if it may now be empty."""
+    bucket = model.objects.filter(**bucket_filter(model, key))
+    if bucket.update(total=F('total') + amount, count=F('count') + count):
+        return bucket if count < 0 else None
+
+    try:
+        # Savepoint so a concurrent insert of the same bucket doesn't poison the outer transaction
+        with transaction.atomic():
+            model.objects.create(**bucket_filter(model, key), total=amount, count=count)
+    except IntegrityError:
+        bucket.update(total=F('total') + amount, count=F('count') + count)
+    return None
+
+
+def add_to_buckets(model, rows):
+    """Add ``(amount, count, id)`` rows to existing buckets in one ``executemany``.
+
+    Relative updates, so concurrent writers to the same bucket still add up.
+    ``bulk_update`` would need a CASE branch per bucket, which costs more to
+    build and evaluate than the updates themselves.
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    total, count, pk = quote('total'), quote('count'), quote(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(model._meta.db_table)} SET {total} = {total} + %s, {count} = {count} + %s '
+            f'WHERE {pk} = %s',
+            rows,
+        )
+
+
+def apply_deltas_in_bulk(deltas, model=ExpenseRollup):
+    """Apply many bucket deltas with a handful of queries per batch."""
+    keys = list(deltas)
+    for start in range(0, len(keys), BULK_BATCH_SIZE):
+        batch = keys[start:start + BULK_BATCH_SIZE]
+        candidates = model.objects.filter(**{
+            'user_id__in': {key[0] for key in batch},
+            'category__in': {key[1] for key in batch},
+            f'{model.bucket_field}__in': {key[2] for key in batch},
+            'currency__in': {key[3] for key in batch},
+        }).only('id', 'user_id', 'category', model.bucket_field, 'currency')
+        wanted = set(batch)
+        existing = {bucket_key_of(bucket): bucket for bucket in candidates if bucket_key_of(bucket) in wanted}
+
+        shrinking = [bucket.id for key, bucket in existing.items() if deltas[key][1] < 0]
+        add_to_buckets(model, [(*deltas[key], bucket.id) for key, bucket in existing.items()])
+
+        missing = [
+            model(**bucket_filter(model, key), total=deltas[key][0], count=deltas[key][1])
+            for key in batch if key not in existing
+        ]
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(missing)
+        except IntegrityError:
+            # Someone else created some of these buckets meanwhile, fall back to one at a time
+            for bucket in missing:
+                apply_bucket_delta(bucket_key_of(bucket), bucket.total, bucket.count, model)
+
+        if shrinking:
+            model.objects.filter(id__in=shrinking, count=0).delete()
+
+
+def bucket_key_of(bucket):
+    return (bucket.user_id, bucket.category, getattr(bucket, bucket.bucket_field), bucket.currency)
+
+
+def apply_deltas(deltas, model=ExpenseRollup):
+    """Apply bucket deltas to a rollup table, creating and dropping buckets as needed."""
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if len(deltas) > BULK_THRESHOLD:
+        apply_deltas_in_bulk(deltas, model)
+        return
+
+    emptied = [apply_bucket_delta(key, amount, count, model) for key, (amount, count) in deltas.items()]
+    for bucket in emptied:
+        if bucket is not None:
+            bucket.filter(count=0).delete()
+
+
+def record_changes(added=(), removed=()):
+    """Fold created, updated or deleted expenses into the rollup tables.
+
+    An update is recorded as removing the old version and adding the new one,
+    so moves between categories or months land in the right buckets. Call
+    this inside the same transaction as the write itself; cached analytics
+    for the affected users are invalidated once it commits. Returns the
+    budget thresholds the change crossed.
+    """
+    return record_deltas(collect_deltas(added, removed))
+
+
+def record_deltas(deltas):
+    """Apply deltas from ``collect_deltas`` to the daily and monthly rollups.
+
+    Invalidates the affected users' analytics on commit and returns the
+    budget thresholds crossed, see ``tracker.budgets.check_thresholds``.
+    """
+    months = monthly_deltas(deltas)
+    apply_deltas(deltas)
+    apply_deltas(months, MonthlyRollup)
+    for user_id in {key[0] for key in deltas}:
+        transaction.on_commit(lambda user_id=user_id: invalidate_user(user_id))
+    return check_thresholds(months)
+
+
+# Rollup table -> how its bucket is derived from an expense
+ROLLUP_BUCKETS = {
+    ExpenseRollup: F('date'),
+    MonthlyRollup: TruncMonth('date'),
+}
+
+
+def fresh_buckets(model, user=None):
+    """The rollup buckets for ``model`` aggregated straight from the expense table."""
+    expenses = Expense.objects.all()
+    if user is not None:
+        expenses = expenses.filter(user=user)
+    return (
+        expenses
+        .values('user_id', 'category', 'currency', bucket=ROLLUP_BUCKETS[model])
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def rebuild_rollups(user=None):
+    """Recompute the rollup tables from scratch, optionally for a single user.
+
+    Returns the number of daily buckets.
+    """
+    with transaction.atomic():
+        counts = {}
+        for model in ROLLUP_BUCKETS:
+            rollups = model.objects.all() if user is None else model.objects.filter(user=user)
+            rollups.delete()
+            created = model.objects.bulk_create(
+                (
+                    model(**bucket_filter(model, (row['user_id'], row['category'], row['bucket'], row['currency'])),
+                          total=row['total'], count=row['count'])
+                    for row in fresh_buckets(model, user).iterator()
+                ),
+                batch_size=1000,
+            )
+            counts[model] = len(created)
+        transaction.on_commit(invalidate_all if user is None else lambda: invalidate_user(user.id))
+    return counts[ExpenseRollup]
+
+
+def reconcile(model, user=None, repair=True):
+    """Compare a rollup table against a fresh aggregate and optionally fix it.
+
+    Returns the keys of the buckets that had drifted: wrong totals, missing
+    buckets and buckets with no expenses left behind them.
+    """
+    with transaction.atomic():
+        expected = {
+            (row['user_id'], row['category'], row['bucket'], row['currency']): (row['total'], row['count'])
+            for row in fresh_buckets(model, user).iterator()
+        }
+        rollups = model.objects.all() if user is None else model.objects.filter(user=user)
+        stale, drifted = [], []
+        for bucket in rollups.iterator():
+            key = bucket_key_of(bucket)
+            want = expected.pop(key, None)
+            if want is None:
+                stale.append(bucket.id)
+                drifted.append(key)
+            elif (bucket.total, bucket.count) != want:
+                bucket.total, bucket.count = want
+                drifted.append(key)
+                if repair:
+                    bucket.save(update_fields=['total', 'count'])
+        drifted.extend(expected)
+
+        if repair and drifted:
+            model.objects.filter(id__in=stale).delete()
+            model.objects.bulk_create(
+                model(**bucket_filter(model, key), total=total, count=count)
+                for key, (total, count) in expected.items()
+            )
+            users = {key[0] for key in drifted}
+            transaction.on_commit(lambda: [invalidate_user(user_id) for user_id in users])
+    return drifted
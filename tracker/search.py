@@ -0,0 +1,97 @@
+import re
+import unicodedata
+from collections import namedtuple
+
+from django.db import connection
+
+from .models import Expense
+
+FTS_TABLE = 'tracker_expense_fts'
+
+# Words of the query; a trailing * asks for a prefix match
+TERM_RE = re.compile(r'(\w+)(\*?)')
+
+# expense_lookups() key -> SQL condition on the joined expense row
+FTS_CONDITIONS = {
+    'category': 'tracker_expense.category = %s',
+    'date': 'tracker_expense.date = %s',
+    'date__gte': 'tracker_expense.date >= %s',
+    'date__lte': 'tracker_expense.date <= %s',
+}
+
+SearchTerm = namedtuple('SearchTerm', 'word prefix')
+
+_fts_tables = {}
+
+
+def fold(text):
+    """Lowercase and strip diacritics, like unicode61 with remove_diacritics."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def parse_query(query):
+    """Split a search box query into terms, e.g. ``coff* beans`` -> coff (prefix), beans."""
+    return [SearchTerm(fold(word), bool(star)) for word, star in TERM_RE.findall(query or '')]
+
+
+def match_expression(user_id, terms):
+    """An FTS5 MATCH expression for all of ``terms`` within one user's expenses.
+
+    Terms are \\w+ only, so quoting them is enough to keep FTS5 syntax out.
+    """
+    parts = [f'owner:"u{int(user_id)}"']
+    parts += [f'description:"{term.word}"' + ('*' if term.prefix else '') for term in terms]
+    return ' AND '.join(parts)
+
+
+def fts_available(using=connection):
+    """Whether the FTS5 index from migration 0011 exists on this database."""
+    if using.vendor != 'sqlite':
+        return False
+    name = using.settings_dict['NAME']
+    if name not in _fts_tables:
+        _fts_tables[name] = FTS_TABLE in using.introspection.table_names()
+    return _fts_tables[name]
+
+
+def ranked_ids(user_id, terms, lookups, limit, offset):
+    """Ids of one page of a user's matching expenses, best match first, straight off the index."""
+    conditions = [f'{FTS_TABLE} MATCH %s']
+    params = [match_expression(user_id, terms)]
+    for lookup, value in lookups.items():
+        conditions.append(FTS_CONDITIONS[lookup])
+        params.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+
+    # bm25() is lower for better matches; the owner column is the same for every row, so it weighs nothing
+    sql = (
+        f'SELECT tracker_expense.id FROM {FTS_TABLE} '
+        f'JOIN tracker_expense ON tracker_expense.id = {FTS_TABLE}.rowid '
+        f'WHERE {" AND ".join(conditions)} '
+        f'ORDER BY bm25({FTS_TABLE}, 0.0, 1.0), {FTS_TABLE}.rowid DESC LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        return [expense_id for expense_id, in cursor.fetchall()]
+
+
+def search_expenses(user_id, terms, lookups, limit, offset, rows):
+    """One page of a user's expenses matching every term, as ``rows`` dicts.
+
+    ``rows`` is an ExpenseRowSerializer. With the FTS5 index every match is
+    ranked by FTS5's bm25(), so the cost grows with how common the words
+    are. Without it every term becomes a description ``icontains`` (a table
+    scan, so only suitable for small databases) and results are newest
+    first. Either way every match can be paged to.
+    """
+    if fts_available():
+        ids = ranked_ids(user_id, terms, lookups, limit, offset)
+        found = {row['id']: row for row in rows.serialize(Expense.objects.filter(id__in=ids))}
+        return [found[expense_id] for expense_id in ids if expense_id in found]
+
+    expenses = Expense.objects.filter(user_id=user_id, **lookups)
+    for term in terms:
+        expenses = expenses.filter(description__icontains=term.word)
+    return rows.serialize(expenses.order_by('-date', '-id')[offset:offset + limit])
@@ -1,15 +1,198 @@
+from decimal import Decimal, getcontext
 from rest_framework import serializers
-from .models import Expense
+from rest_framework.settings import api_settings
+from rest_framework.fields import ISO_8601
+from rest_framework_simplejwt import serializers as jwt_serializers
+from .authentication import TrackerRefreshToken
+from .models import Budget, Expense, Profile, RecurringExpense, ReportJob
+from .budgets import budget_level
+from .fx import CURRENCY_CODE
+from .reports import result_path
 from datetime import date
+import json
+
+
+def validate_currency_code(value):
+    value = value.strip().upper()
+    if not CURRENCY_CODE.match(value):
+        raise serializers.ValidationError("Currency must be a three-letter ISO 4217 code.")
+    return value
+
 
 class ExpenseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Expense
         fields = '__all__'
+        read_only_fields = ['version', 'seq']
 
-    
 
     def validate_date(self, value):
         if value > date.today():
             raise serializers.ValidationError("Date cannot be in the future.")
         return value
+
+    def validate_currency(self, value):
+        return validate_currency_code(value)
+
+
+def decimal_converter(field):
+    exponent = Decimal('.1') ** field.decimal_places
+    quantize_context = getcontext().copy()
+    if field.max_digits is not None:
+        quantize_context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return f'{value.quantize(exponent, rounding=rounding, context=quantize_context):f}'
+    return convert
+
+
+def column_converter(field):
+    """Pick a converter giving the same output as ``field.to_representation``.
+
+    Returns None when the raw column value can be used as is.
+    """
+    if isinstance(field, (serializers.IntegerField, serializers.PrimaryKeyRelatedField)):
+        return None
+    if isinstance(field, serializers.CharField):
+        return None
+    if isinstance(field, serializers.DateField) and getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+        return lambda value: value.isoformat() if value else None
+    if (isinstance(field, serializers.DecimalField) and field.decimal_places is not None
+            and not field.normalize_output and not field.localize
+            and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)):
+        return decimal_converter(field)
+    return field.to_representation
+
+
+class ExpenseRowSerializer:
+    """Read-only fast path producing exactly what ExpenseSerializer would.
+
+    Rows come from ``values_list`` and each column goes through a converter
+    chosen once from ExpenseSerializer's own fields, so there are no model
+    instances and no per-field DRF machinery on large lists.
+    """
+
+    def __init__(self, serializer_class=ExpenseSerializer):
+        fields = serializer_class().fields
+        model = serializer_class.Meta.model
+        self.names = tuple(fields)
+        self.columns = tuple(model._meta.get_field(field.source).attname for field in fields.values())
+        self.converters = tuple(
+            (index, converter)
+            for index, field in enumerate(fields.values())
+            if (converter := column_converter(field)) is not None
+        )
+
+    def values(self, queryset):
+        """The queryset as tuples in serializer field order."""
+        return queryset.values_list(*self.columns)
+
+    def to_dicts(self, rows):
+        """Convert ``values`` tuples into response dicts."""
+        names, converters = self.names, self.converters
+        data = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters:
+                if row[index] is not None:
+                    row[index] = convert(row[index])
+            data.append(dict(zip(names, row)))
+        return data
+
+    def serialize(self, queryset):
+        return self.to_dicts(self.values(queryset))
+
+
+
+class BudgetSerializer(serializers.ModelSerializer):
+    """A budget plus, when read through ``budgets_with_spending``, where it stands this month."""
+    spent = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    remaining = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+    # This month's expenses in other currencies, which ``spent`` leaves out
+    uncounted = serializers.IntegerField(read_only=True)
+    status = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Budget
+        fields = '__all__'
+
+    def validate_limit(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Limit must be greater than 0.")
+        return value
+
+    def validate_warning_threshold(self, value):
+        if not 1 <= value <= 100:
+            raise serializers.ValidationError("Warning threshold must be between 1 and 100.")
+        return value
+
+    def get_status(self, budget):
+        spent = getattr(budget, 'spent', None)
+        return None if spent is None else budget_level(budget, spent)
+
+
+class RecurringExpenseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecurringExpense
+        fields = '__all__'
+        read_only_fields = ['occurrences', 'next_date']
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be greater than 0.")
+        return value
+
+    def validate_every(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Every must be at least 1.")
+        return value
+
+    def validate_currency(self, value):
+        return validate_currency_code(value)
+
+    def validate(self, attrs):
+        end_date = attrs.get('end_date')
+        if end_date is not None and end_date < attrs['anchor_date']:
+            raise serializers.ValidationError({'end_date': "End date must not be before the anchor date."})
+        return attrs
+
+    def create(self, validated_data):
+        # The first occurrence is the anchor itself; the scheduler takes it from there
+        validated_data['next_date'] = validated_data['anchor_date']
+        return super().create(validated_data)
+
+
+class ProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Profile
+        fields = ['home_currency']
+
+    def validate_home_currency(self, value):
+        return validate_currency_code(value)
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """A report job's status; once done, JSON reports carry their result and every report a download link."""
+    result = serializers.SerializerMethodField()
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ReportJob
+        fields = ['id', 'kind', 'params', 'status', 'error', 'created_at', 'finished_at', 'result', 'result_url']
+
+    def get_result(self, job):
+        if job.status != ReportJob.DONE or not job.result_file.endswith('.json'):
+            return None
+        with open(result_path(job), encoding='utf-8') as stream:
+            return json.load(stream)
+
+    def get_result_url(self, job):
+        return f'/api/reports/{job.id}/result/' if job.status == ReportJob.DONE else None
+
+
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Issues tokens carrying the claims TokenUserAuthentication trusts on reads."""
+    token_class = TrackerRefreshToken
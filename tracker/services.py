@@ -1,14 +1,145 @@
-from .models import Expense
-from django.db.models import Sum
+"""User-scoped spending aggregates at day, week, month, quarter or year granularity.
 
-def get_total_expenses():
-    """Calculate total expenses."""
-    return Expense.objects.aggregate(Sum('amount'))['amount__sum'] or 0
+Every query filters on one user first and, by default, reads the persisted
+rollup tables rather than the expenses themselves: month and coarser buckets
+come from MonthlyRollup when the range falls on month boundaries, anything
+else from the daily ExpenseRollup. Both are indexed on (user, bucket).
+Buckets use the portable ``Trunc*`` functions, so the same queries run on
+SQLite and PostgreSQL. Pass ``persisted=False`` to aggregate the expense
+table directly, e.g. to check the rollups.
 
-def get_expenses_by_category():
-    """Group expenses by category."""
-    return Expense.objects.values('category').annotate(total=Sum('amount'))
+Ranges are half-open: ``start`` is included, ``end`` is not.
 
-def get_monthly_expenses():
-    """Group expenses by month."""
-    return Expense.objects.extra(select={'month': "strftime('%%Y-%%m', date)"}).values('month').annotate(total=Sum('amount'))
+Years moved out by ``tracker.archive`` keep counting: every query is a
+UNION ALL of the rollups and the archived daily totals in its range,
+bucketed the same way, so a category or bucket can come back as two
+rows; ``merge_rows`` folds them. Converted totals come back unrounded,
+and ``merge_rows`` rounds them to the cent once folded, so archiving a
+year changes no total.
+
+Pass ``currency``, a code or ``tracker.fx.home_currency(user_id)``, to
+report totals in it, converted inside the same aggregate query. Without
+it totals are plain sums of whatever currencies the rows are in.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+
+from .archive import archived_totals
+from .fx import converted, converted_month, converted_sum
+from .models import Expense, ExpenseRollup, MonthlyRollup
+
+CENT = Decimal('0.01')
+
+# Granularity -> truncation of a date column to the start of its bucket
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+# Granularities a monthly bucket can be rolled up into
+MONTHLY_GRANULARITIES = ('month', 'quarter', 'year')
+
+
+def bucket_source(granularity=None, start=None, end=None, persisted=True, currency=None):
+    """The (model, date column, total expression, count expression) to aggregate."""
+    if not persisted:
+        return Expense, 'date', total_in('amount', 'date', currency), Count('id')
+    month_aligned = all(bound is None or bound.day == 1 for bound in (start, end))
+    if month_aligned and granularity in (None, *MONTHLY_GRANULARITIES):
+        total = Sum('total') if currency is None else converted_sum(converted_month(currency), rounded=False)
+        return MonthlyRollup, 'month', total, Sum('count')
+    return ExpenseRollup, 'day', total_in('total', 'day', currency), Sum('count')
+
+
+def total_in(amount, day, currency):
+    """The unrounded total of column ``amount``, converted at each ``day``'s rate into ``currency`` if given."""
+    if currency is None:
+        return Sum(amount)
+    return converted_sum(converted(amount, 'currency', day, currency), rounded=False)
+
+
+def archived_total(currency):
+    return total_in('total', 'day', currency)
+
+
+def to_cent(total):
+    return total if total is None else Decimal(total).quantize(CENT)
+
+
+def merge_rows(rows, key):
+    """Fold rows sharing ``key``, e.g. a year's hot and archived rows, adding up their other columns.
+
+    Totals are rounded to the cent once added up.
+    """
+    merged = {}
+    for row in rows:
+        if row[key] not in merged:
+            merged[row[key]] = dict(row)
+            continue
+        into = merged[row[key]]
+        for name, value in row.items():
+            if name != key and value is not None:
+                into[name] = value if into[name] is None else into[name] + value
+    for row in merged.values():
+        if 'total' in row:
+            row['total'] = to_cent(row['total'])
+    return list(merged.values())
+
+
+def user_rows(model, field, user_id, start=None, end=None, category=None):
+    rows = model.objects.filter(user_id=user_id)
+    if start is not None:
+        rows = rows.filter(**{f'{field}__gte': start})
+    if end is not None:
+        rows = rows.filter(**{f'{field}__lt': end})
+    if category:
+        rows = rows.filter(category=category)
+    return rows
+
+
+def get_total_expenses(user_id, start=None, end=None, category=None, persisted=True, currency=None):
+    """Total spent by a user."""
+    model, field, total, _ = bucket_source(None, start, end, persisted, currency)
+    hot = user_rows(model, field, user_id, start, end, category).aggregate(total=total)['total'] or 0
+    archived = archived_totals(user_id, start, end, category).aggregate(total=archived_total(currency))['total']
+    total = hot + (archived or 0)
+    # Rounded once, after adding the archived days
+    return total if currency is None else to_cent(total)
+
+
+def get_expenses_by_category(user_id, start=None, end=None, persisted=True, currency=None):
+    """A user's total and count per category, archived years included; see ``merge_rows``."""
+    model, field, total, count = bucket_source(None, start, end, persisted, currency)
+    hot = user_rows(model, field, user_id, start, end).values('category').annotate(total=total, count=count)
+    archived = archived_totals(user_id, start, end).values('category').annotate(
+        total=archived_total(currency), count=Sum('count'),
+    )
+    return hot.order_by().union(archived.order_by(), all=True).order_by('category')
+
+
+def get_expenses_by_bucket(user_id, granularity='month', start=None, end=None, category=None, persisted=True,
+                           currency=None):
+    """A user's total and count per ``granularity`` bucket, oldest first.
+
+    ``bucket`` is the first day of each bucket (weeks start on Monday).
+    Archived years are included; see ``merge_rows``.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularity must be one of: {', '.join(GRANULARITIES)}.")
+    model, field, total, count = bucket_source(granularity, start, end, persisted, currency)
+    # A monthly rollup's column already is the month bucket, so it groups on the index as is
+    bucket = F(field) if model is MonthlyRollup and granularity == 'month' else GRANULARITIES[granularity](field)
+    hot = user_rows(model, field, user_id, start, end, category).values(bucket=bucket).annotate(total=total, count=count)
+    archived = archived_totals(user_id, start, end, category).values(bucket=GRANULARITIES[granularity]('day')).annotate(
+        total=archived_total(currency), count=Sum('count'),
+    )
+    return hot.order_by().union(archived.order_by(), all=True).order_by('bucket')
+
+
+def get_monthly_expenses(user_id, **kwargs):
+    """A user's spending per month."""
+    return get_expenses_by_bucket(user_id, 'month', **kwargs)
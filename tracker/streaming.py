@@ -0,0 +1,84 @@
+import re
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+
+from .renderers import FastJSONRenderer
+
+accepts_gzip_re = re.compile(r'\bgzip\b')
+
+
+def chunked(iterable, size):
+    """Yield lists of up to ``size`` items from ``iterable``."""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def iter_json_array(queryset, serialize, chunk_size=500):
+    """Render ``queryset`` as a JSON array a chunk at a time.
+
+    ``serialize`` turns a list of rows into a list of plain dicts. Rows come
+    from ``.iterator()`` so only one chunk is ever held in memory.
+    """
+    renderer = FastJSONRenderer()
+    yield b'['
+    first = True
+    for chunk in chunked(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        body = renderer.render(serialize(chunk))[1:-1]  # Strip the chunk's own brackets
+        if not first:
+            yield b','
+        yield body
+        first = False
+    yield b']'
+
+
+async def aiter_json_array(queryset, serialize, chunk_size=500):
+    """``iter_json_array`` for async views, stepping it on the ORM's sync thread.
+
+    ``values_list().aiterator()`` runs its query straight in the async
+    context, so the sync generator is advanced through ``sync_to_async``
+    instead, which keeps every chunk of one cursor on the same thread.
+    """
+    parts = iter_json_array(queryset, serialize, chunk_size)
+    next_part = sync_to_async(next)
+    while (part := await next_part(parts, None)) is not None:
+        yield part
+
+
+def streaming_json_response(queryset, serialize, chunk_size=500, asynchronous=False):
+    iter_array = aiter_json_array if asynchronous else iter_json_array
+    return StreamingHttpResponse(
+        iter_array(queryset, serialize, chunk_size),
+        content_type='application/json',
+    )
+
+
+def accepts_gzip(request):
+    return bool(accepts_gzip_re.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress an iterable of byte chunks incrementally into one gzip stream."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if compressed := compressor.compress(chunk):
+            yield compressed
+    yield compressor.flush()
+
+
+def streaming_rows_response(request, renderer, header, rows, filename):
+    """Stream ``rows`` through a RowRenderer, gzipped if the client accepts it."""
+    chunks = renderer.stream(header, rows)
+    gzipped = accepts_gzip(request)
+    if gzipped:
+        chunks = gzip_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=f'{renderer.media_type}; charset={renderer.charset}')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{renderer.extension}"'
+    response['Vary'] = 'Accept, Accept-Encoding'
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,213 @@
+"""Apply an offline client's queued expense writes as one idempotent batch.
+
+Every operation carries a client-generated ``key``. Applied operations are
+recorded in SyncOperation under that key, so a retried batch, or a batch
+overlapping an earlier one, gets the stored outcome back for the keys it
+already sent instead of writing them again. A batch is all or nothing.
+"""
+from copy import copy
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from rest_framework import serializers, status
+
+from .importers import IMPORT_FIELDS, RowValidator
+from .changes import record_deletions, stamp
+from .models import Expense, SyncOperation
+from .rollups import collect_deltas, record_deltas
+
+MAX_OPERATIONS = 500
+KEY_LENGTH = SyncOperation._meta.get_field('key').max_length
+OPS = (SyncOperation.CREATE, SyncOperation.UPDATE, SyncOperation.DELETE)
+
+
+class SyncError(Exception):
+    """The batch was rejected and nothing was written.
+
+    ``errors`` lists ``{'index', 'key', 'errors'}`` for each failing
+    operation, ``status`` is the HTTP status to answer with.
+    """
+
+    def __init__(self, errors, status=status.HTTP_400_BAD_REQUEST):
+        super().__init__(errors)
+        self.errors = errors
+        self.status = status
+
+
+def operation_error(index, operation, errors):
+    key = operation.get('key') if isinstance(operation, dict) else None
+    return {'index': index, 'key': key, 'errors': errors}
+
+
+def check_operations(operations):
+    """Reject malformed batches before touching the database."""
+    if not isinstance(operations, list) or not operations:
+        raise SyncError([{'index': None, 'key': None, 'errors': ["Send a non-empty list of operations."]}])
+    if len(operations) > MAX_OPERATIONS:
+        raise SyncError([{'index': None, 'key': None, 'errors': [f"At most {MAX_OPERATIONS} operations per batch."]}])
+
+    errors, seen = [], set()
+    for index, operation in enumerate(operations):
+        problems = []
+        if not isinstance(operation, dict):
+            errors.append(operation_error(index, operation, ["Operation is not a JSON object."]))
+            continue
+        key = operation.get('key')
+        if not isinstance(key, str) or not 0 < len(key) <= KEY_LENGTH:
+            problems.append(f"key must be a string of 1 to {KEY_LENGTH} characters.")
+        elif key in seen:
+            problems.append("key is repeated in this batch.")
+        seen.add(key)
+
+        op = operation.get('op')
+        if op not in OPS:
+            problems.append(f"op must be one of: {', '.join(OPS)}.")
+        if op in (SyncOperation.CREATE, SyncOperation.UPDATE) and not isinstance(operation.get('data'), dict):
+            problems.append("data must be an object.")
+        if op in (SyncOperation.UPDATE, SyncOperation.DELETE):
+            target, ref = operation.get('id'), operation.get('ref')
+            if (target is None) == (ref is None):
+                problems.append("Give either id or ref (the key of the operation that created the expense).")
+            elif target is not None and (not isinstance(target, int) or isinstance(target, bool)):
+                problems.append("id must be an integer.")
+            version = operation.get('version')
+            if version is not None and (not isinstance(version, int) or isinstance(version, bool)):
+                problems.append("version must be an integer.")
+        if problems:
+            errors.append(operation_error(index, operation, problems))
+    if errors:
+        raise SyncError(errors)
+
+
+def apply_batch(user, operations):
+    """Apply ``operations`` for ``user`` and return one result per operation, in order.
+
+    Raises SyncError if the batch is malformed, invalid or conflicts with
+    the server's data.
+    """
+    check_operations(operations)
+    try:
+        return apply_operations(user, operations)
+    except IntegrityError:
+        # A concurrent retry of this batch recorded the same keys first; now they are duplicates
+        return apply_operations(user, operations)
+
+
+def apply_operations(user, operations):
+    validate = RowValidator(user)
+    refs = {operation['ref'] for operation in operations if operation.get('ref') is not None}
+    with transaction.atomic():
+        recorded = {
+            record.key: record
+            for record in SyncOperation.objects.filter(user=user, key__in={o['key'] for o in operations} | refs)
+        }
+        pending = [(index, operation) for index, operation in enumerate(operations) if operation['key'] not in recorded]
+
+        created, changes, errors = {}, {}, []
+        for index, operation in pending:
+            try:
+                if operation['op'] == SyncOperation.CREATE:
+                    created[operation['key']] = validate(operation['data'])
+                elif operation['op'] == SyncOperation.UPDATE:
+                    changes[index] = validate.validate_values(operation['data'], partial=True)
+            except serializers.ValidationError as e:
+                errors.append(operation_error(index, operation, e.detail))
+        if errors:
+            raise SyncError(errors)
+
+        # One INSERT for every new expense, so later operations can refer to their ids
+        Expense.objects.bulk_create(stamp(user.id, created.values()))
+        created_ids = {key: expense.id for key, expense in created.items()}
+        created_ids.update((key, record.expense_id) for key, record in recorded.items() if record.op == SyncOperation.CREATE)
+
+        def target_of(operation):
+            if operation.get('ref') is not None:
+                return created_ids.get(operation['ref'])
+            return operation['id']
+
+        new_ids = {expense.id for expense in created.values()}
+        targets = {
+            target_of(operation) for _, operation in pending if operation['op'] != SyncOperation.CREATE
+        } - new_ids - {None}
+        expenses = {e.id: e for e in Expense.objects.select_for_update().filter(user=user, id__in=targets)}
+        originals = {expense_id: copy(expense) for expense_id, expense in expenses.items()}
+        expenses.update((expense.id, expense) for expense in created.values())
+
+        results, dirty, deleted = {}, set(), set()
+        conflict = False
+        for index, operation in pending:
+            op = operation['op']
+            if op == SyncOperation.CREATE:
+                expense = created[operation['key']]
+                results[index] = (expense.id, expense.version)
+                continue
+
+            expense_id = target_of(operation)
+            if expense_id is None:
+                errors.append(operation_error(index, operation, ["ref does not name a create operation."]))
+                continue
+            expense = expenses.get(expense_id)
+            if expense is None:
+                if op == SyncOperation.DELETE and expense_id not in deleted:
+                    results[index] = (expense_id, None)  # Already gone, which is what the client wants
+                else:
+                    conflict = True
+                    errors.append(operation_error(index, operation, ["Expense not found."]))
+                continue
+            if operation.get('version') is not None and operation['version'] != expense.version:
+                conflict = True
+                errors.append(operation_error(
+                    index, operation, [f"Expense is at version {expense.version}, not {operation['version']}."],
+                ))
+                continue
+
+            if op == SyncOperation.DELETE:
+                del expenses[expense_id]
+                dirty.discard(expense_id)
+                deleted.add(expense_id)
+                results[index] = (expense_id, None)
+                continue
+
+            for name, value in changes[index].items():
+                setattr(expense, name, value)
+            try:
+                expense.clean()
+            except DjangoValidationError as e:
+                errors.append(operation_error(index, operation, {'non_field_errors': e.messages}))
+                continue
+            expense.version += 1
+            dirty.add(expense_id)
+            results[index] = (expense_id, expense.version)
+
+        if errors:
+            raise SyncError(errors, status.HTTP_409_CONFLICT if conflict else status.HTTP_400_BAD_REQUEST)
+
+        if dirty:
+            Expense.objects.bulk_update(stamp(user.id, (expenses[i] for i in dirty)), [*IMPORT_FIELDS, 'version', 'seq'])
+        if deleted:
+            Expense.objects.filter(user=user, id__in=deleted).delete()
+            record_deletions(user.id, deleted)
+
+        touched = dirty | deleted | new_ids
+        record_deltas(collect_deltas(
+            added=[expenses[i] for i in touched if i in expenses],
+            removed=[originals[i] for i in touched if i in originals],
+        ))
+        SyncOperation.objects.bulk_create([
+            SyncOperation(
+                user=user, key=operation['key'], op=operation['op'],
+                expense_id=results[index][0], version=results[index][1],
+            )
+            for index, operation in pending
+        ])
+
+    return [
+        {
+            'key': operation['key'],
+            'op': operation['op'],
+            'status': 'applied' if index in results else 'duplicate',
+            'id': results[index][0] if index in results else recorded[operation['key']].expense_id,
+            'version': results[index][1] if index in results else recorded[operation['key']].version,
+        }
+        for index, operation in enumerate(operations)
+    ]
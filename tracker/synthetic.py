@@ -0,0 +1,76 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .changes import stamp
+from .models import Expense, MonthlyRollup
+from .rollups import apply_deltas, collect_deltas, monthly_deltas
+
+# Category -> (relative frequency, typical amount). Food and transport dominate,
+# big-ticket bills are rarer, roughly like real bank exports.
+CATEGORY_PROFILE = {
+    'Food': (35, 18),
+    'Transport': (20, 12),
+    'Shopping': (15, 60),
+    'Bills': (12, 140),
+    'Entertainment': (10, 35),
+    'Other': (8, 45),
+}
+DESCRIPTIONS = {
+    'Food': ['Groceries', 'Lunch', 'Coffee', 'Dinner out', 'Bakery'],
+    'Transport': ['Bus pass', 'Fuel', 'Taxi', 'Train ticket', 'Parking'],
+    'Shopping': ['Clothes', 'Electronics', 'Books', 'Household items'],
+    'Bills': ['Electricity', 'Internet', 'Phone', 'Water', 'Insurance'],
+    'Entertainment': ['Cinema', 'Concert', 'Streaming', 'Games'],
+    'Other': ['Gift', 'Donation', 'Pharmacy', ''],
+}
+
+
+def synthetic_expenses(user, count, rng, years=3, today=None):
+    """Yield ``count`` unsaved expenses with skewed categories spread over ``years``."""
+    today = today or date.today()
+    categories = list(CATEGORY_PROFILE)
+    weights = [CATEGORY_PROFILE[c][0] for c in categories]
+    span = 365 * years
+    for _ in range(count):
+        category = rng.choices(categories, weights)[0]
+        typical = CATEGORY_PROFILE[category][1]
+        # Log-normal amounts: mostly near the typical value with a long tail
+        amount = Decimal(str(round(max(0.5, rng.lognormvariate(0, 0.6) * typical), 2)))
+        # Recent days are a little more likely, as accounts fill up over time
+        offset = int(span * rng.random() ** 1.3)
+        yield Expense(
+            user=user,
+            category=category,
+            amount=amount,
+            date=today - timedelta(days=offset),
+            description=rng.choice(DESCRIPTIONS[category]),
+        )
+
+
+def generate(users, expenses_per_user, years=3, seed=0, prefix='synthetic', password='synthetic-password'):
+    """Create ``users`` users with ``expenses_per_user`` expenses each, and their rollups.
+
+    Returns the created users. Usernames are ``<prefix>-<n>``. Other users'
+    rollups are left alone.
+    """
+    rng = random.Random(seed)
+    hashed = make_password(password)  # Hash once; every synthetic user shares it
+
+    with transaction.atomic():
+        created = User.objects.bulk_create(
+            User(username=f'{prefix}-{n}', password=hashed) for n in range(users)
+        )
+        deltas = None
+        for user in created:
+            expenses = stamp(user.id, synthetic_expenses(user, expenses_per_user, rng, years))
+            Expense.objects.bulk_create(expenses, batch_size=2000)
+            deltas = collect_deltas(added=expenses, deltas=deltas)
+        if deltas:
+            apply_deltas(deltas)
+            apply_deltas(monthly_deltas(deltas), MonthlyRollup)
+    return created
@@ -1,20 +1,1804 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import json
+
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
 from .models import Expense
 
 class ExpenseServiceTests(TestCase):
     def setUp(self):
+        from tracker.rollups import rebuild_rollups
         self.user = User.objects.create_user(username='testuser', password='testpassword')
         Expense.objects.create(user=self.user, category="Food", amount=50.0, date="2025-01-01")
         Expense.objects.create(user=self.user, category="Transport", amount=20.0, date="2025-01-02")
+        Expense.objects.create(user=self.user, category="Food", amount=5.0, date="2025-05-20")
+        other = User.objects.create_user(username='otherservice', password='testpassword')
+        Expense.objects.create(user=other, category="Food", amount=999.0, date="2025-01-01")
+        rebuild_rollups()
 
     def test_get_total_expenses(self):
         from tracker.services import get_total_expenses
-        total = get_total_expenses()
-        self.assertEqual(total, 70.0)
+        total = get_total_expenses(self.user.id)
+        self.assertEqual(total, 75.0)
+        self.assertEqual(get_total_expenses(self.user.id, start=date(2025, 1, 2)), 25.0)
+        self.assertEqual(get_total_expenses(self.user.id, category='Food', persisted=False), 55.0)
 
     def test_get_expenses_by_category(self):
         from tracker.services import get_expenses_by_category
-        categories = get_expenses_by_category()
+        categories = get_expenses_by_category(self.user.id)
         self.assertEqual(len(categories), 2)
-        self.assertEqual(categories[0]['total'], 50.0)
+        self.assertEqual(categories[0]['total'], 55.0)
+        self.assertEqual(categories[0]['count'], 2)
+
+    def test_buckets_match_raw_expenses_at_every_granularity(self):
+        from tracker.services import GRANULARITIES, get_expenses_by_bucket
+        expected = {
+            'day': [('2025-01-01', 50), ('2025-01-02', 20), ('2025-05-20', 5)],
+            'week': [('2024-12-30', 70), ('2025-05-19', 5)],
+            'month': [('2025-01-01', 70), ('2025-05-01', 5)],
+            'quarter': [('2025-01-01', 70), ('2025-04-01', 5)],
+            'year': [('2025-01-01', 75)],
+        }
+        for granularity in GRANULARITIES:
+            for persisted in (True, False):
+                with self.subTest(granularity=granularity, persisted=persisted):
+                    rows = get_expenses_by_bucket(self.user.id, granularity, persisted=persisted)
+                    self.assertEqual(
+                        [(str(row['bucket']), row['total']) for row in rows],
+                        [(bucket, Decimal(total)) for bucket, total in expected[granularity]],
+                    )
+
+        rows = get_expenses_by_bucket(self.user.id, 'month', start=date(2025, 1, 2), end=date(2025, 5, 1))
+        self.assertEqual([(str(row['bucket']), row['count']) for row in rows], [('2025-01-01', 1)])
+        with self.assertRaises(ValueError):
+            get_expenses_by_bucket(self.user.id, 'fortnight')
+
+class ExpenseRollupTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        cache.clear()
+        self.user = User.objects.create_user(username='rollupuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def buckets(self):
+        from tracker.models import ExpenseRollup
+        return {
+            (r.category, str(r.day)): (r.total, r.count)
+            for r in ExpenseRollup.objects.filter(user=self.user)
+        }
+
+    def test_writes_keep_rollup_in_sync(self):
+        response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '12.50', 'date': '2025-01-01'})
+        self.assertEqual(response.status_code, 201)
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '7.50', 'date': '2025-01-01'})
+        self.assertEqual(self.buckets(), {('Food', '2025-01-01'): (Decimal('20.00'), 2)})
+
+        expense_id = response.data['id']
+        self.client.put(f'/api/expenses/{expense_id}/', {'category': 'Bills', 'date': '2025-01-03'}, format='json')
+        self.assertEqual(self.buckets(), {
+            ('Food', '2025-01-01'): (Decimal('7.50'), 1),
+            ('Bills', '2025-01-03'): (Decimal('12.50'), 1),
+        })
+
+        self.client.delete(f'/api/expenses/{expense_id}/')
+        self.assertEqual(self.buckets(), {('Food', '2025-01-01'): (Decimal('7.50'), 1)})
+
+    def test_detail_writes_read_the_row_under_the_write_lock(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        expense_id = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '5.00', 'date': '2025-01-01'}).data['id']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.put(f'/api/expenses/{expense_id}/', {'amount': '6.00'}, format='json')
+        statements = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertTrue(statements[0].startswith('UPDATE') and statements[0].endswith('WHERE 0'))
+        self.assertIn('"tracker_expense"."id" =', statements[1])
+
+        # A repeated delete finds nothing and doesn't subtract the expense again
+        self.assertEqual(self.client.delete(f'/api/expenses/{expense_id}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/expenses/{expense_id}/').status_code, 404)
+        self.assertEqual(self.buckets(), {})
+
+    def test_rebuild_command_matches_raw_expenses(self):
+        from django.core.management import call_command
+        Expense.objects.create(user=self.user, category="Food", amount=50.0, date="2025-01-01")
+        Expense.objects.create(user=self.user, category="Food", amount=5.0, date="2025-01-01")
+        Expense.objects.create(user=self.user, category="Transport", amount=20.0, date="2025-01-02")
+        self.assertEqual(self.buckets(), {})
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.buckets(), {
+            ('Food', '2025-01-01'): (Decimal('55.00'), 2),
+            ('Transport', '2025-01-02'): (Decimal('20.00'), 1),
+        })
+
+        response = self.client.get('/api/expense-summary/')
+        self.assertEqual(response.data['total_spent'], Decimal('75.00'))
+        self.assertEqual(response.data['category_breakdown'][0], {'category': 'Food', 'total': Decimal('55.00')})
+
+
+class ExpenseListPaginationTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(username='pageuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        # Duplicate dates and amounts so the id tie-breaker matters
+        for i in range(7):
+            Expense.objects.create(user=self.user, category="Food", amount=10 + i % 3, date=f"2025-01-0{1 + i % 2}")
+
+    def collect_pages(self, ordering, page_size=3):
+        ids, cursor = [], None
+        while True:
+            params = {'ordering': ordering, 'page_size': page_size}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get('/api/expenses/', params)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), page_size)
+            ids += [row['id'] for row in response.data['results']]
+            cursor = response.data['next']
+            if not cursor:
+                return ids
+
+    def test_pages_match_full_ordering(self):
+        for ordering in ['', 'date', '-date', 'amount', '-amount']:
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    Expense.objects.filter(user=self.user)
+                    .order_by(*(['id'] if not ordering else [ordering, '-id' if ordering.startswith('-') else 'id']))
+                    .values_list('id', flat=True)
+                )
+                self.assertEqual(self.collect_pages(ordering), expected)
+
+    def test_invalid_cursor_and_ordering(self):
+        self.assertEqual(self.client.get('/api/expenses/', {'cursor': 'garbage'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/expenses/', {'page_size': 2, 'ordering': 'description'}).status_code, 400)
+
+    def test_streaming_matches_plain_list(self):
+        import json
+        plain = self.client.get('/api/expenses/', {'ordering': '-amount'})
+        streamed = self.client.get('/api/expenses/', {'ordering': '-amount', 'stream': 'true'})
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(json.loads(b''.join(streamed.streaming_content)), json.loads(plain.content))
+
+
+class QueryPlanTests(TestCase):
+    """Fail if a hot endpoint query falls back to a full table scan on SQLite."""
+
+    def setUp(self):
+        from django.db import connection
+        from rest_framework.test import APIClient
+        from tracker.rollups import rebuild_rollups
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN checks are SQLite-specific")
+        self.user = User.objects.create_user(username='planuser', password='testpassword')
+        for i in range(20):
+            Expense.objects.create(user=self.user, category=["Food", "Bills"][i % 2], amount=5 + i, date=f"2025-01-{1 + i:02d}")
+        rebuild_rollups()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assert_no_table_scans(self, url, params=None, allow_sort=True):
+        import re
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        cache.clear()  # Make sure the analytics views actually hit the database
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+
+        queries = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'tracker_' in q['sql']]
+        self.assertTrue(queries, f"No tracker queries captured for {url}")
+        with connection.cursor() as cursor:
+            for sql in queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plan = [row[-1] for row in cursor.fetchall()]
+                scans = [step for step in plan if re.match(r'SCAN tracker_', step)]
+                if not allow_sort:
+                    scans += [step for step in plan if step.startswith('USE TEMP B-TREE FOR ORDER BY')]
+                self.assertFalse(scans, f"Full scan in {url}:\n{sql}\n{plan}")
+
+    def test_expense_list_queries_use_indexes(self):
+        for ordering in ['', 'date', '-date', 'amount', '-amount']:
+            with self.subTest(ordering=ordering):
+                # Sorting should come straight off the composite index too
+                self.assert_no_table_scans('/api/expenses/', {'ordering': ordering}, allow_sort=False)
+                self.assert_no_table_scans('/api/expenses/', {'ordering': ordering, 'page_size': 5}, allow_sort=False)
+
+    def test_analytics_queries_use_indexes(self):
+        self.assert_no_table_scans('/api/expense-summary/')
+        for view in ['spending-trends', 'category-breakdown']:
+            for period in ['month', 'week']:
+                with self.subTest(view=view, period=period):
+                    self.assert_no_table_scans(f'/api/{view}/{period}/', {'month': 1, 'year': 2025})
+                    self.assert_no_table_scans(f'/api/{view}/{period}/', {'start_date': '2025-01-10'})
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        cache.clear()
+        self.user = User.objects.create_user(username='cacheuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '10.00', 'date': '2025-01-01'})
+
+    def test_repeat_requests_are_served_from_cache(self):
+        first = self.client.get('/api/expense-summary/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/expense-summary/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_params_are_part_of_the_key(self):
+        january = self.client.get('/api/category-breakdown/month/', {'month': 1, 'year': 2025})
+        february = self.client.get('/api/category-breakdown/month/', {'month': 2, 'year': 2025})
+        self.assertEqual(len(january.data['category_breakdown']), 1)
+        self.assertEqual(february.data['category_breakdown'], [])
+
+    def test_writes_invalidate_cached_responses(self):
+        before = self.client.get('/api/expense-summary/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/expenses/', {'category': 'Bills', 'amount': '5.00', 'date': '2025-01-02'})
+        after = self.client.get('/api/expense-summary/')
+        self.assertEqual(before.data['total_spent'], Decimal('10.00'))
+        self.assertEqual(after.data['total_spent'], Decimal('15.00'))
+        self.assertNotEqual(before['ETag'], after['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/expense-summary/')['ETag']
+        response = self.client.get('/api/expense-summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(self.client.get('/api/expense-summary/', HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+
+class ExpenseBulkImportTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(username='importuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, body, content_type):
+        return self.client.generic('POST', '/api/expenses/bulk/', body.encode(), content_type=content_type)
+
+    def test_csv_import_reports_bad_rows_and_keeps_good_ones(self):
+        from tracker.models import ExpenseRollup
+        body = (
+            "category,amount,date,description\n"
+            "Food,12.50,2025-01-01,Lunch\n"
+            "Food,-3,2025-01-01,Refund\n"
+            "Bills,40,2999-01-01,\n"
+            "Transport,7.25,2025-01-02,\n"
+        )
+        response = self.upload(body, 'text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([e['row'] for e in response.data['errors']], [3, 4])
+        self.assertIn('date', response.data['errors'][1]['errors'])
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ExpenseRollup.objects.filter(user=self.user).count(), 2)
+
+    def test_jsonl_import_in_batches(self):
+        import json
+        lines = [json.dumps({'category': 'Food', 'amount': i + 1, 'date': '2025-01-01'}) for i in range(1200)]
+        lines.insert(5, 'not json')
+        response = self.upload("\n".join(lines), 'application/x-ndjson')
+        self.assertEqual(response.data['created'], 1200)
+        self.assertEqual(response.data['errors'][0]['row'], 6)
+
+        from tracker.models import ExpenseRollup
+        bucket = ExpenseRollup.objects.get(user=self.user)
+        self.assertEqual((bucket.total, bucket.count), (Decimal(1200 * 1201 // 2), 1200))
+
+    def test_rejects_unknown_content_type_and_all_bad_uploads(self):
+        self.assertEqual(self.upload('{}', 'application/json').status_code, 415)
+        response = self.upload("category,amount,date\nFood,abc,2025-01-01\n", 'text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('amount', response.data['errors'][0]['errors'])
+
+    def test_many_bucket_import_matches_rebuilt_rollups(self):
+        from tracker.models import ExpenseRollup
+        from tracker.rollups import rebuild_rollups
+        rows = "\n".join(f"{['Food', 'Bills'][i % 2]},{i % 7 + 1},2025-01-{i % 28 + 1:02d}" for i in range(300))
+        self.upload("category,amount,date\n" + rows, 'text/csv')
+        # A second upload into the same buckets takes the relative-update path
+        self.upload("category,amount,date\n" + rows, 'text/csv')
+
+        def snapshot():
+            return sorted(ExpenseRollup.objects.values_list('category', 'day', 'total', 'count'))
+        incremental = snapshot()
+        rebuild_rollups()
+        self.assertEqual(len(incremental), 28)
+        self.assertEqual(incremental, snapshot())
+
+
+class ExpenseExportTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(username='exportuser', password='testpassword')
+        other = User.objects.create_user(username='otheruser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Expense.objects.create(user=self.user, category="Food", amount=50.0, date="2025-01-01", description="Lunch, with \"quotes\"")
+        Expense.objects.create(user=self.user, category="Transport", amount=20.0, date="2025-01-02")
+        Expense.objects.create(user=self.user, category="Food", amount=5.5, date="2025-02-01", description="Café")
+        Expense.objects.create(user=other, category="Food", amount=99.0, date="2025-01-01")
+
+    def export(self, params=None, **extra):
+        response = self.client.get('/api/expenses/export/', params or {}, **extra)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_export_with_filters(self):
+        import csv
+        response, body = self.export({'category': 'Food'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(body.decode().splitlines()))
+        self.assertEqual(rows[0], ['id', 'category', 'amount', 'date', 'description', 'currency'])
+        self.assertEqual([r[2:] for r in rows[1:]], [
+            ['50.00', '2025-01-01', 'Lunch, with "quotes"', 'USD'],
+            ['5.50', '2025-02-01', 'Café', 'USD'],
+        ])
+
+        _, body = self.export({'start_date': '2025-01-02', 'end_date': '2025-01-31'})
+        self.assertEqual(len(body.decode().splitlines()), 2)
+
+    def test_jsonl_export_gzipped(self):
+        import gzip
+        import json
+        response, body = self.export({'format': 'jsonl'}, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['amount'], '50.00')
+        self.assertEqual(rows[2]['description'], 'Café')
+
+    def test_invalid_date(self):
+        response = self.client.get('/api/expenses/export/', {'start_date': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AnalyticsFilterTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        self.user = User.objects.create_user(username='filteruser', password='testpassword')
+        other = User.objects.create_user(username='otherfilteruser', password='testpassword')
+        Expense.objects.create(user=self.user, category="Food", amount=50.0, date="2025-01-01")
+        Expense.objects.create(user=self.user, category="Bills", amount=20.0, date="2025-01-15")
+        Expense.objects.create(user=other, category="Food", amount=999.0, date="2025-01-01")
+        rebuild_rollups()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_each_analytics_request_runs_one_query(self):
+        urls = [
+            ('/api/expense-summary/', {}),
+            ('/api/spending-trends/month/', {'month': 1, 'year': 2025}),
+            ('/api/spending-trends/week/', {'start_date': '2025-01-10'}),
+            ('/api/spending-trends/month/', {}),
+            ('/api/category-breakdown/month/', {'month': 1, 'year': 2025}),
+            ('/api/category-breakdown/week/', {}),
+        ]
+        for url, params in urls:
+            with self.subTest(url=url, params=params), self.assertNumQueries(1):
+                self.assertEqual(self.client.get(url, params).status_code, 200)
+
+    def test_analytics_are_scoped_to_the_requesting_user(self):
+        breakdown = self.client.get('/api/category-breakdown/month/', {'month': 1, 'year': 2025}).data
+        self.assertEqual(
+            sorted((item['category'], item['total']) for item in breakdown['category_breakdown']),
+            [('Bills', Decimal('20.00')), ('Food', Decimal('50.00'))],
+        )
+        self.assertEqual(breakdown['period_info'], {'month': '1', 'year': '2025'})
+
+        trends = self.client.get('/api/spending-trends/week/', {'month': 1, 'year': 2025}).data['trends']
+        self.assertEqual([item['total'] for item in trends], [Decimal('50.00'), Decimal('20.00')])
+
+        summary = self.client.get('/api/expense-summary/').data
+        self.assertEqual(summary['total_spent'], Decimal('70.00'))
+
+    def test_invalid_filters(self):
+        for params in [{'start_date': '2025/01/01'}, {'month': 13, 'year': 2025}, {'month': 'x', 'year': 2025}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/spending-trends/month/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/category-breakdown/year/').status_code, 400)
+
+    def test_empty_default_month(self):
+        self.assertEqual(self.client.get('/api/spending-trends/month/').data, {'trends': []})
+        self.assertEqual(self.client.get('/api/category-breakdown/month/').data, {'category_breakdown': []})
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        self.user = User.objects.create_user(username='dashuser', password='testpassword')
+        for i in range(12):
+            Expense.objects.create(
+                user=self.user, category=["Food", "Bills", "Other"][i % 3], amount=5 + i,
+                date=f"2025-{1 + i % 2:02d}-{1 + i:02d}",
+            )
+        rebuild_rollups()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_dashboard_matches_individual_endpoints_in_two_queries(self):
+        params = {'month': 1, 'year': 2025}
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/dashboard/', {**params, 'recent': 3}).data
+
+        summary = self.client.get('/api/expense-summary/').data
+        trends = self.client.get('/api/spending-trends/month/', params).data
+        breakdown = self.client.get('/api/category-breakdown/month/', params).data
+        expenses = self.client.get('/api/expenses/', {'ordering': '-date'}).data
+
+        self.assertEqual(data['total_spent'], summary['total_spent'])
+        self.assertEqual(data['category_breakdown'], summary['category_breakdown'])
+        self.assertEqual(data['trends'], trends['trends'])
+        self.assertEqual(
+            sorted(data['period_breakdown'], key=lambda item: item['category']),
+            sorted(breakdown['category_breakdown'], key=lambda item: item['category']),
+        )
+        self.assertEqual(data['period_info'], breakdown['period_info'])
+        self.assertEqual(data['recent_expenses'], expenses[:3])
+
+    def test_invalid_params(self):
+        self.assertEqual(self.client.get('/api/dashboard/', {'period': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/', {'recent': 'x'}).status_code, 400)
+
+
+class GenerateExpensesCommandTests(TestCase):
+    def test_generates_users_expenses_and_rollups(self):
+        from django.core.management import call_command
+        from django.db.models import Count, Sum
+        from tracker.models import ExpenseRollup, MonthlyRollup
+        # A real user's rollups, deliberately stale, are left as they are
+        real = User.objects.create_user(username='realuser', password='testpassword')
+        Expense.objects.create(user=real, category="Food", amount=Decimal('5.00'), date=date(2025, 1, 1))
+        call_command('generate_expenses', users=3, expenses=200, seed=1, prefix='gen', stdout=StringIO())
+        self.assertFalse(ExpenseRollup.objects.filter(user=real).exists())
+        Expense.objects.filter(user=real).delete()
+
+        users = User.objects.filter(username__startswith='gen-')
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Expense.objects.filter(user__in=users).count(), 600)
+        rollup = ExpenseRollup.objects.aggregate(total=Sum('total'), count=Sum('count'))
+        self.assertEqual(rollup['count'], 600)
+        # SQLite sums decimals as floats, so compare to the cent
+        cents = Decimal('0.01')
+        self.assertEqual(rollup['total'].quantize(cents), Expense.objects.aggregate(total=Sum('amount'))['total'].quantize(cents))
+        self.assertEqual(MonthlyRollup.objects.aggregate(count=Sum('count'))['count'], 600)
+
+        # Skewed: the most common category is well ahead of the least common
+        per_category = Expense.objects.values('category').annotate(n=Count('id')).order_by('-n')
+        self.assertGreater(per_category[0]['n'], 2 * per_category.last()['n'])
+
+    def test_refuses_existing_prefix(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        call_command('generate_expenses', users=1, expenses=1, prefix='dup', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_expenses', users=1, expenses=1, prefix='dup', stdout=StringIO())
+
+
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.metrics import HISTOGRAMS
+        for histogram in HISTOGRAMS:
+            histogram.reset()
+        self.user = User.objects.create_user(username='perfuser', password='testpassword')
+        Expense.objects.create(user=self.user, category="Food", amount=50.0, date="2025-01-01")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('tracker.performance', level='INFO') as logs:
+            response = self.client.get('/api/expenses/')
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+
+        record = logs.records[0]
+        self.assertEqual(record.performance['view'], 'expense-list')
+        self.assertEqual(record.performance['queries'], 1)
+        self.assertEqual(record.performance['bytes'], len(response.content))
+        self.assertIn('tracker_expense', record.performance['slowest_sql'][0]['sql'])
+
+    def test_metrics_endpoint_is_admin_only_prometheus_text(self):
+        self.client.get('/api/expenses/')
+        self.assertEqual(self.client.get('/api/_metrics/').status_code, 403)
+
+        admin = User.objects.create_superuser(username='perfadmin', password='testpassword')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/_metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE tracker_request_duration_seconds histogram', body)
+        self.assertIn('tracker_request_duration_seconds_count{method="GET",view="expense-list"} 1', body)
+        self.assertIn('tracker_request_sql_queries_bucket{method="GET",view="expense-list",le="1"} 1', body)
+
+
+class FastSerializationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='fastuser', password='testpassword')
+        descriptions = ['', 'Plain', 'Café ☕ 日本', 'Line\u2028separator\u2029', 'Tab\tnew\nline "quoted" \\ \x01', '😀']
+        for i, description in enumerate(descriptions):
+            Expense.objects.create(
+                user=self.user, category="Food", amount=Decimal('99999999.99') if i == 0 else Decimal(i) / 3,
+                date=f"2025-01-{i + 1:02d}", description=description,
+            )
+
+    def test_fast_path_is_byte_for_byte_compatible(self):
+        from unittest import mock
+        from rest_framework.renderers import JSONRenderer
+        from tracker.renderers import FastJSONRenderer
+        from tracker.serializers import ExpenseRowSerializer, ExpenseSerializer
+
+        expenses = Expense.objects.filter(user=self.user).order_by('id')
+        expected = JSONRenderer().render(ExpenseSerializer(expenses, many=True).data)
+        rows = ExpenseRowSerializer().serialize(expenses)
+        self.assertEqual(FastJSONRenderer().render(rows), expected)
+        with mock.patch('tracker.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(rows), expected)
+
+    def test_list_endpoint_matches_model_serializer(self):
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.test import APIClient
+        from tracker.serializers import ExpenseSerializer
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+
+        expenses = Expense.objects.filter(user=self.user).order_by('-amount')
+        expected = JSONRenderer().render(ExpenseSerializer(expenses, many=True).data)
+        self.assertEqual(client.get('/api/expenses/', {'ordering': '-amount'}).content, expected)
+
+    def test_falls_back_for_values_orjson_would_encode_differently(self):
+        from rest_framework.renderers import JSONRenderer
+        from tracker.renderers import FastJSONRenderer
+        data = {'total': Decimal('10.50'), 'day': date(2025, 1, 1), 'rows': [1, None, 'x']}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        self.user = User.objects.create_user(username='asyncuser', password='testpassword')
+        for i in range(12):
+            Expense.objects.create(
+                user=self.user, category=["Food", "Bills", "Other"][i % 3], amount=Decimal(5 + i) / 4,
+                date=f"2025-{1 + i % 2:02d}-{1 + i:02d}",
+            )
+        rebuild_rollups()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_responses_match_the_sync_views(self):
+        for path, params in [
+            ('expense-summary/', {}),
+            ('spending-trends/month/', {'month': 1, 'year': 2025}),
+            ('spending-trends/year/', {}),
+            ('category-breakdown/week/', {'start_date': '2025-01-05'}),
+            ('category-breakdown/month/', {'start_date': 'bad'}),
+            ('dashboard/', {'month': 2, 'year': 2025, 'recent': 3}),
+            ('expenses/', {'ordering': '-amount'}),
+            ('expenses/', {'ordering': 'date', 'page_size': 5}),
+            ('expenses/', {'cursor': '!'}),
+        ]:
+            with self.subTest(path=path, params=params):
+                cache.clear()
+                expected = self.client.get(f'/api/{path}', params)
+                cache.clear()
+                response = self.client.get(f'/api/async/{path}', params)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response.get('ETag'), expected.get('ETag'))
+
+    def test_keyset_pages_and_cache_hits(self):
+        first = self.client.get('/api/async/expenses/', {'ordering': '-date', 'page_size': 5}).json()
+        second = self.client.get('/api/async/expenses/', {'ordering': '-date', 'page_size': 5, 'cursor': first['next']})
+        self.assertEqual(
+            [row['id'] for row in first['results'] + second.json()['results']],
+            list(Expense.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True)[:10]),
+        )
+
+        etag = self.client.get('/api/async/expense-summary/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/async/expense-summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_middleware_runs_async_views_without_a_thread(self):
+        from django.core.handlers.asgi import ASGIHandler
+        from django.test import override_settings
+        # Django only logs a sync middleware it wraps for an async handler with DEBUG on
+        with override_settings(DEBUG=True), self.assertNoLogs('django.request', level='DEBUG'):
+            ASGIHandler().load_middleware(is_async=True)
+
+    async def test_served_over_asgi_with_jwt(self):
+        import json
+        from asgiref.sync import sync_to_async
+        from django.test import AsyncClient
+        from rest_framework_simplejwt.tokens import AccessToken
+        client = AsyncClient()
+
+        response = await client.get('/api/async/dashboard/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="api"')
+        self.assertEqual((await client.post('/api/async/dashboard/')).status_code, 405)
+
+        token = await sync_to_async(AccessToken.for_user)(self.user)
+        response = await client.get('/api/async/dashboard/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['recent_expenses']), 5)
+        # Queries run on the ORM's worker thread are still attributed to the request
+        self.assertIn('desc="3 queries"', response['Server-Timing'])
+
+        response = await client.get(
+            '/api/async/expenses/', {'stream': '1', 'ordering': 'id'}, headers={'Authorization': f'Bearer {token}'},
+        )
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual([row['id'] for row in json.loads(body)], await sync_to_async(list)(
+            Expense.objects.filter(user=self.user).order_by('id').values_list('id', flat=True)
+        ))
+
+
+class SQLiteProfileTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(username='lockuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_production_profile_applies_pragmas(self):
+        import tempfile
+        from pathlib import Path
+        from django.conf import settings
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = DatabaseWrapper(
+                {**connection.settings_dict, 'NAME': str(Path(tmp) / 'profile.sqlite3'), **settings.SQLITE_PRODUCTION},
+                alias='production-profile',
+            )
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ['journal_mode', 'synchronous', 'mmap_size', 'cache_size']:
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+            finally:
+                wrapper.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'mmap_size': 268435456, 'cache_size': -65536})
+
+    def test_create_retries_while_locked(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from django.test import override_settings
+        from tracker.models import ExpenseRollup
+        from tracker.rollups import record_changes
+
+        calls = []
+
+        def locked_once(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            record_changes(**kwargs)
+
+        with override_settings(TRACKER_DB_LOCK_BACKOFF=0), mock.patch('tracker.views.record_changes', locked_once):
+            response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '4.50', 'date': '2025-03-01'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(calls), 2)
+        expense = Expense.objects.get(user=self.user)
+        self.assertEqual(response.data['id'], expense.id)
+        self.assertEqual(ExpenseRollup.objects.get(user=self.user).total, Decimal('4.50'))
+
+    def test_create_gives_up_with_503(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from django.test import override_settings
+
+        with override_settings(TRACKER_DB_LOCK_BACKOFF=0), mock.patch(
+            'tracker.views.record_changes', side_effect=OperationalError('database is locked'),
+        ) as record:
+            response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '4.50', 'date': '2025-03-01'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(record.call_count, 3)
+        self.assertFalse(Expense.objects.filter(user=self.user).exists())
+
+
+class TokenUserAuthenticationTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.authentication import VERIFIED_TOKENS, TrackerAccessToken
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        VERIFIED_TOKENS.clear()
+        self.user = User.objects.create_user(username='tokenuser', password='testpassword')
+        Expense.objects.create(user=self.user, category="Food", amount=12, date="2025-01-02")
+        rebuild_rollups()
+        self.token = str(TrackerAccessToken.for_user(self.user))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_reads_trust_the_token_after_the_first_check(self):
+        with self.assertNumQueries(2):  # User row, then the summary
+            first = self.client.get('/api/expense-summary/')
+        cache.clear()
+        with self.assertNumQueries(1):
+            second = self.client.get('/api/expense-summary/')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(second.data['total_spent'], Decimal('12'))
+
+        with self.assertNumQueries(1):
+            expenses = self.client.get('/api/expenses/').json()
+        self.assertEqual([expense['user'] for expense in expenses], [self.user.id])
+
+    def test_revocation_reaches_reads_within_the_ttl(self):
+        import time
+        from unittest import mock
+        self.assertEqual(self.client.get('/api/expenses/').status_code, 200)
+        User.objects.filter(id=self.user.id).update(is_active=False)
+
+        # Writes always load the user; reads keep the cached check until it expires
+        response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '1.00', 'date': '2025-01-03'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get('/api/expenses/').status_code, 200)
+        with mock.patch('tracker.authentication.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.client.get('/api/expenses/').status_code, 401)
+
+    def test_cache_is_bounded_and_only_matches_the_exact_token(self):
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from tracker.authentication import VERIFIED_TOKENS, TrackerAccessToken
+
+        other = User.objects.create_user(username='othertoken', password='testpassword')
+        tokens = [self.token] + [str(TrackerAccessToken.for_user(other)) for _ in range(2)]
+        client = APIClient()
+        with override_settings(TRACKER_TOKEN_CACHE_SIZE=2):
+            for token in tokens:
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+                self.assertEqual(client.get('/api/expenses/').status_code, 200)
+        self.assertEqual(len(VERIFIED_TOKENS.entries), 2)
+        self.assertNotIn(self.token.encode().rpartition(b'.')[2], VERIFIED_TOKENS.entries)
+
+        # Another user's claims under a cached signature are verified, and rejected
+        header, payload, signature = tokens[2].split('.')
+        forged = '.'.join([header, self.token.split('.')[1], signature])
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {forged}')
+        self.assertEqual(client.get('/api/expenses/').status_code, 401)
+
+    def test_issued_tokens_carry_the_trusted_claims(self):
+        from rest_framework.test import APIClient
+        from rest_framework_simplejwt.tokens import AccessToken
+        User.objects.create_superuser(username='tokenadmin', password='testpassword')
+        client = APIClient()
+
+        tokens = client.post('/api/token/', {'username': 'tokenadmin', 'password': 'testpassword'}).data
+        refreshed = client.post('/api/token/refresh/', {'refresh': tokens['refresh']}).data
+        for raw in [tokens['access'], refreshed['access']]:
+            token = AccessToken(raw)
+            self.assertEqual((token['username'], token['is_active'], token['is_staff']), ('tokenadmin', True, True))
+
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {refreshed['access']}")
+        self.assertEqual(client.get('/api/_metrics/').status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/_metrics/').status_code, 200)
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        cache.clear()
+        self.user = User.objects.create_user(username='budgetuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.month = date.today().replace(day=1)
+
+    def months(self):
+        from tracker.models import MonthlyRollup
+        return {
+            (r.category, str(r.month)): (r.total, r.count)
+            for r in MonthlyRollup.objects.filter(user=self.user)
+        }
+
+    def test_month_to_date_totals_follow_writes(self):
+        response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': '12.50', 'date': '2025-01-05'})
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '7.50', 'date': '2025-01-20'})
+        self.assertEqual(self.months(), {('Food', '2025-01-01'): (Decimal('20.00'), 2)})
+
+        expense_id = response.data['id']
+        self.client.put(f'/api/expenses/{expense_id}/', {'category': 'Bills', 'date': '2025-02-03'}, format='json')
+        self.assertEqual(self.months(), {
+            ('Food', '2025-01-01'): (Decimal('7.50'), 1),
+            ('Bills', '2025-02-01'): (Decimal('12.50'), 1),
+        })
+
+        self.client.delete(f'/api/expenses/{expense_id}/')
+        self.assertEqual(self.months(), {('Food', '2025-01-01'): (Decimal('7.50'), 1)})
+
+    def test_budget_list_reports_spending(self):
+        response = self.client.post('/api/budgets/', {'category': 'Food', 'limit': '100.00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['spent'], '0.00')
+
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '85.00', 'date': self.month.isoformat()})
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '50.00', 'date': '2020-01-01'})
+        response = self.client.get('/api/budgets/')
+        self.assertEqual(response.data['month'], f'{self.month:%Y-%m}')
+        budget = response.data['budgets'][0]
+        self.assertEqual((budget['spent'], budget['remaining'], budget['status']), ('85.00', '15.00', 'warning'))
+
+        response = self.client.get('/api/budgets/', {'month': 1, 'year': 2020})
+        self.assertEqual(response.data['budgets'][0]['status'], 'ok')
+        self.assertEqual(self.client.get('/api/budgets/', {'month': 13, 'year': 2025}).status_code, 400)
+
+        duplicate = self.client.post('/api/budgets/', {'category': 'Food', 'limit': '10.00'})
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(self.client.post('/api/budgets/', {'category': 'Bills', 'limit': '-1'}).status_code, 400)
+
+    def test_threshold_signal_fires_once_per_crossing(self):
+        from tracker.budgets import EXCEEDED, WARNING, budget_threshold_crossed
+        from tracker.models import Budget
+        Budget.objects.create(user=self.user, category='Food', limit=Decimal('100.00'))
+        levels = []
+
+        def receiver(sender, alert, **kwargs):
+            levels.append(alert.level)
+
+        budget_threshold_crossed.connect(receiver)
+        self.addCleanup(budget_threshold_crossed.disconnect, receiver)
+        day = self.month.isoformat()
+        for amount in ('50.00', '35.00', '5.00', '20.00', '1.00'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/api/expenses/', {'category': 'Food', 'amount': amount, 'date': day})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/expenses/', {'category': 'Bills', 'amount': '500.00', 'date': day})
+
+        self.assertEqual(levels, [WARNING, EXCEEDED])
+
+    def test_budget_update_and_delete_are_scoped_to_owner(self):
+        from tracker.models import Budget
+        budget = Budget.objects.create(user=self.user, category='Food', limit=Decimal('100.00'))
+        other = User.objects.create_user(username='otherbudget', password='testpassword')
+        foreign = Budget.objects.create(user=other, category='Food', limit=Decimal('100.00'))
+
+        response = self.client.put(f'/api/budgets/{budget.id}/', {'limit': '250.00'}, format='json')
+        self.assertEqual(response.data['limit'], '250.00')
+        self.assertEqual(self.client.put(f'/api/budgets/{foreign.id}/', {'limit': '1'}, format='json').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/budgets/{foreign.id}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/budgets/{budget.id}/').status_code, 204)
+
+    def test_reconcile_repairs_drift(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from tracker.models import ExpenseRollup, MonthlyRollup
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '10.00', 'date': '2025-01-05'})
+        self.client.post('/api/expenses/', {'category': 'Bills', 'amount': '30.00', 'date': '2025-01-06'})
+        MonthlyRollup.objects.filter(category='Food').update(total=Decimal('99.00'))
+        MonthlyRollup.objects.filter(category='Bills').delete()
+        ExpenseRollup.objects.create(user=self.user, category='Ghost', day=date(2025, 1, 7), total=1, count=1)
+
+        with self.assertRaises(CommandError):
+            call_command('reconcile_rollups', '--dry-run', stdout=StringIO())
+        call_command('reconcile_rollups', stdout=StringIO())
+
+        self.assertEqual(self.months(), {
+            ('Food', '2025-01-01'): (Decimal('10.00'), 1),
+            ('Bills', '2025-01-01'): (Decimal('30.00'), 1),
+        })
+        self.assertFalse(ExpenseRollup.objects.filter(category='Ghost').exists())
+        call_command('reconcile_rollups', '--dry-run', stdout=StringIO())
+
+
+class ExpenseSearchTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        cache.clear()
+        self.user = User.objects.create_user(username='searchuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        other = User.objects.create_user(username='othersearch', password='testpassword')
+        Expense.objects.create(user=other, category='Food', amount=1, date='2025-01-01', description='coffee beans')
+
+    def add(self, description, category='Food', day='2025-01-10'):
+        return Expense.objects.create(user=self.user, category=category, amount=5, date=day, description=description)
+
+    def search(self, **params):
+        response = self.client.get('/api/expenses/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['description'] for row in response.data['results']]
+
+    def test_index_follows_writes(self):
+        expense = self.add('Coffee with Sam')
+        self.assertEqual(self.search(q='coffee'), ['Coffee with Sam'])
+
+        self.client.put(f'/api/expenses/{expense.id}/', {'description': 'Tea with Sam'}, format='json')
+        self.assertEqual(self.search(q='coffee'), [])
+        self.assertEqual(self.search(q='tea sam'), ['Tea with Sam'])
+
+        self.client.delete(f'/api/expenses/{expense.id}/')
+        self.assertEqual(self.search(q='tea'), [])
+
+    def test_prefix_ranking_and_filters(self):
+        self.add('Café lunch', day='2025-01-05')
+        self.add('Coffee coffee coffee', day='2025-02-05')
+        self.add('Coffee and a bagel', category='Other', day='2025-03-05')
+        self.add('Cinema')
+
+        self.assertEqual(self.search(q='coff'), [])
+        self.assertEqual(self.search(q='coff*'), ['Coffee coffee coffee', 'Coffee and a bagel'])
+        self.assertEqual(self.search(q='cafe'), ['Café lunch'])
+        self.assertEqual(self.search(q='coffee', category='Other'), ['Coffee and a bagel'])
+        self.assertEqual(self.search(q='coffee', start_date='2025-03-01'), ['Coffee and a bagel'])
+        self.assertEqual(self.search(q='"coffee" OR cinema'), [])  # Syntax is searched for, not interpreted
+
+        response = self.client.get('/api/expenses/search/', {'q': 'coffee', 'page_size': 1})
+        self.assertEqual(response.data['next'], 1)
+        response = self.client.get('/api/expenses/search/', {'q': 'coffee', 'page_size': 1, 'offset': 1})
+        self.assertEqual([row['description'] for row in response.data['results']], ['Coffee and a bagel'])
+
+        self.assertEqual(self.client.get('/api/expenses/search/', {'q': '  '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/expenses/search/', {'q': 'a', 'start_date': 'x'}).status_code, 400)
+
+    def test_every_match_can_be_paged_to(self):
+        from unittest import mock
+        Expense.objects.bulk_create(
+            Expense(user=self.user, category='Food', amount=5, date=date(2025, 1, 1) + timedelta(days=n % 300),
+                    description=f'coffee {n}')
+            for n in range(700)
+        )
+        for indexed in (True, False):
+            with self.subTest(indexed=indexed), mock.patch('tracker.search.fts_available', return_value=indexed):
+                seen, offset = set(), 0
+                while offset is not None:
+                    data = self.client.get('/api/expenses/search/', {'q': 'coffee', 'page_size': 200, 'offset': offset}).data
+                    seen.update(row['description'] for row in data['results'])
+                    offset = data['next']
+                self.assertEqual(len(seen), 700)
+
+    def test_fallback_without_fts_index(self):
+        from unittest import mock
+        self.add('Coffee beans', day='2025-01-01')
+        self.add('Iced coffee', day='2025-01-02')
+        with mock.patch('tracker.search.fts_available', return_value=False):
+            self.assertEqual(self.search(q='coffee'), ['Iced coffee', 'Coffee beans'])
+            self.assertEqual(self.search(q='coffee beans'), ['Coffee beans'])
+
+
+class VectorizedAnalyticsTests(TestCase):
+    def setUp(self):
+        from unittest import SkipTest
+        from rest_framework.test import APIClient
+        from tracker import vectorized
+        if vectorized.np is None:
+            raise SkipTest("NumPy is not installed")
+        cache.clear()
+        self.user = User.objects.create_user(username='vectoruser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add(self, day, amount, category='Food'):
+        Expense.objects.create(user=self.user, category=category, amount=Decimal(amount), date=day)
+
+    def test_year_over_year(self):
+        from tracker.rollups import rebuild_rollups
+        self.add('2023-03-10', '10.00')
+        self.add('2024-03-01', '15.00')
+        self.add('2024-03-31', '0.05')
+        self.add('2024-12-31', '7.10')
+        rebuild_rollups()
+        response = self.client.get('/api/analytics/year-over-year/', {'year': 2024})
+        self.assertEqual(response.status_code, 200)
+        march = response.data['months'][2]
+        self.assertEqual((march['total'], march['previous_total'], march['change_pct']), (Decimal('15.05'), Decimal('10.00'), 50.5))
+        self.assertEqual(response.data['months'][0]['change_pct'], None)
+        self.assertEqual(response.data['total'], Decimal('22.15'))
+        for year in (0, 1, 10000):
+            with self.subTest(year=year):
+                self.assertEqual(self.client.get('/api/analytics/year-over-year/', {'year': year}).status_code, 400)
+
+    def test_converted_totals_are_rounded_once_like_the_sql_ones(self):
+        from tracker import fx
+        from tracker.rollups import rebuild_rollups
+        from tracker.services import get_total_expenses
+        fx.load_rates(fx.read_rates(StringIO("date,currency,rate\n2024-01-01,EUR,1.40\n")))
+        for day in ('2024-03-01', '2024-03-02'):
+            Expense.objects.create(user=self.user, category="Food", amount=Decimal('0.01'), currency='EUR', date=day)
+        rebuild_rollups()
+        march = self.client.get('/api/analytics/year-over-year/', {'year': 2024}).data['months'][2]
+        # 0.014 + 0.014, not 0.01 + 0.01
+        self.assertEqual(march['total'], Decimal('0.03'))
+        self.assertEqual(march['total'], get_total_expenses(self.user.id, date(2024, 3, 1), date(2024, 4, 1), currency='USD'))
+
+    def test_rolling_averages_match_a_direct_sum(self):
+        from tracker.models import Expense as ExpenseModel
+        from tracker.rollups import rebuild_rollups
+        for offset, amount in enumerate(['1.00', '2.00', '0.00', '4.50', '10.00', '0.01', '3.33', '8.00']):
+            if amount != '0.00':
+                self.add(date(2025, 1, 1) + timedelta(days=offset), amount)
+        rebuild_rollups()
+        response = self.client.get('/api/analytics/rolling/', {
+            'window': 7, 'start_date': '2025-01-07', 'end_date': '2025-01-08',
+        })
+        days = response.data['days']
+        self.assertEqual([day['date'] for day in days], [date(2025, 1, 7), date(2025, 1, 8)])
+        for day in days:
+            window_total = sum(
+                ExpenseModel.objects.filter(date__gt=day['date'] - timedelta(days=7), date__lte=day['date'])
+                .values_list('amount', flat=True),
+                Decimal('0'),
+            )
+            self.assertEqual(day['average'], (window_total / 7).quantize(Decimal('0.01')))
+        self.assertEqual(days[1]['total'], Decimal('8.00'))
+
+        self.assertEqual(self.client.get('/api/analytics/rolling/', {'window': 14}).status_code, 400)
+        for params in ({'start_date': '0001-01-01'}, {'end_date': '0001-01-05'}, {'date': '2025-01-02'}):
+            with self.subTest(**params):
+                self.assertEqual(self.client.get('/api/analytics/rolling/', params).status_code, 400)
+
+    def test_category_percentiles(self):
+        for amount in ['1.00', '2.00', '3.00', '4.00', '10.00']:
+            self.add('2025-01-01', amount)
+        self.add('2025-01-01', '42.00', category='Bills')
+        response = self.client.get('/api/analytics/percentiles/')
+        bills, food = response.data['categories']
+        self.assertEqual((bills['count'], bills['p50'], bills['p95']), (1, Decimal('42.00'), Decimal('42.00')))
+        self.assertEqual((food['count'], food['mean'], food['p50']), (5, Decimal('4.00'), Decimal('3.00')))
+        self.assertEqual((food['p75'], food['p90']), (Decimal('4.00'), Decimal('7.60')))
+
+        response = self.client.get('/api/analytics/percentiles/', {'category': 'Bills'})
+        self.assertEqual([row['category'] for row in response.data['categories']], ['Bills'])
+
+    def test_forecast_follows_trend_and_season(self):
+        from tracker.rollups import rebuild_rollups
+        from tracker.vectorized import ExpenseArrays, forecast
+        today = date(2025, 7, 15)
+        for months_back in range(1, 7):
+            month = date(2025, 7 - months_back, 1)
+            self.add(month, f'{100 + 10 * (6 - months_back)}.00')  # 100, 110, ... 150 up to June
+        rebuild_rollups()
+        result = forecast(ExpenseArrays.load_daily(self.user.id), 2, today)
+        self.assertEqual(result['method'], 'linear')
+        self.assertEqual([row['month'] for row in result['forecast']], ['2025-07', '2025-08'])
+        self.assertEqual([row['total'] for row in result['forecast']], [Decimal('160.00'), Decimal('170.00')])
+
+        # Two years of flat spending that doubles every December
+        for months_back in range(7, 31):
+            month = date(2025 + (7 - months_back - 1) // 12, (7 - months_back - 1) % 12 + 1, 1)
+            self.add(month, '200.00' if month.month == 12 else '100.00')
+        rebuild_rollups()
+        result = forecast(ExpenseArrays.load_daily(self.user.id), 6, today)
+        self.assertEqual(result['method'], 'seasonal')
+        totals = {row['month']: row['total'] for row in result['forecast']}
+        self.assertGreater(totals['2025-12'], totals['2025-11'] * Decimal('1.5'))
+
+        response = self.client.get('/api/analytics/forecast/', {'months': 13})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExpenseSyncTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        from tracker.rollups import rebuild_rollups
+        self.user = User.objects.create_user(username='syncuser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.expense = Expense.objects.create(user=self.user, category='Food', amount=10, date='2025-01-01')
+        rebuild_rollups()
+
+    def sync(self, operations):
+        return self.client.post('/api/expenses/sync/', {'operations': operations}, format='json')
+
+    def assert_rollups_match(self):
+        from tracker.models import ExpenseRollup, MonthlyRollup
+        from tracker.rollups import reconcile
+        for model in (ExpenseRollup, MonthlyRollup):
+            self.assertEqual(reconcile(model, repair=False), [])
+
+    def test_batch_applies_in_order_and_reports_ids_and_versions(self):
+        response = self.sync([
+            {'key': 'a', 'op': 'create', 'data': {'category': 'Bills', 'amount': '40.00', 'date': '2025-01-02'}},
+            {'key': 'b', 'op': 'update', 'ref': 'a', 'data': {'amount': '45.00'}},
+            {'key': 'c', 'op': 'update', 'id': self.expense.id, 'version': 1, 'data': {'category': 'Rent'}},
+            {'key': 'd', 'op': 'delete', 'id': self.expense.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        created_id = response.data['results'][0]['id']
+        self.assertEqual(
+            [(r['key'], r['status'], r['id'], r['version']) for r in response.data['results']],
+            [('a', 'applied', created_id, 1), ('b', 'applied', created_id, 2),
+             ('c', 'applied', self.expense.id, 2), ('d', 'applied', self.expense.id, None)],
+        )
+        created = Expense.objects.get(id=created_id)
+        self.assertEqual((created.amount, created.version), (Decimal('45.00'), 2))
+        self.assertFalse(Expense.objects.filter(id=self.expense.id).exists())
+        self.assert_rollups_match()
+
+    def test_retried_batch_never_duplicates_rows(self):
+        operations = [
+            {'key': f'k{n}', 'op': 'create', 'data': {'category': 'Food', 'amount': '1.00', 'date': '2025-01-03'}}
+            for n in range(3)
+        ]
+        first = self.sync(operations)
+        # The client lost the response and resends, plus one new operation
+        second = self.sync([*operations, {'key': 'k3', 'op': 'delete', 'ref': 'k0'}])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual([r['status'] for r in second.data['results']], ['duplicate'] * 3 + ['applied'])
+        self.assertEqual([r['id'] for r in second.data['results'][:3]], [r['id'] for r in first.data['results']])
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 3)
+        self.assert_rollups_match()
+
+    def test_conflict_rolls_back_the_whole_batch(self):
+        response = self.sync([
+            {'key': 'a', 'op': 'create', 'data': {'category': 'Bills', 'amount': '40.00', 'date': '2025-01-02'}},
+            {'key': 'b', 'op': 'update', 'id': self.expense.id, 'version': 7, 'data': {'amount': '1.00'}},
+        ])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([e['key'] for e in response.data['errors']], ['b'])
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 1)
+        # Nothing was recorded, so the corrected batch can reuse the keys
+        response = self.sync([
+            {'key': 'a', 'op': 'create', 'data': {'category': 'Bills', 'amount': '40.00', 'date': '2025-01-02'}},
+        ])
+        self.assertEqual(response.data['results'][0]['status'], 'applied')
+
+    def test_invalid_batches_are_rejected(self):
+        from tracker.models import SyncOperation
+        other = User.objects.create_user(username='othersync', password='testpassword')
+        foreign = Expense.objects.create(user=other, category='Food', amount=5, date='2025-01-01')
+        cases = {
+            'no operations': ([], 400),
+            'repeated key': ([{'key': 'a', 'op': 'delete', 'id': 1}, {'key': 'a', 'op': 'delete', 'id': 2}], 400),
+            'unknown op': ([{'key': 'a', 'op': 'upsert', 'id': 1}], 400),
+            'bad data': ([{'key': 'a', 'op': 'create', 'data': {'category': 'Food', 'amount': '-1', 'date': '2025-01-01'}}], 400),
+            'unknown ref': ([{'key': 'a', 'op': 'update', 'ref': 'nope', 'data': {}}], 400),
+            "someone else's expense": ([{'key': 'a', 'op': 'update', 'id': foreign.id, 'data': {'amount': '1'}}], 409),
+        }
+        for name, (operations, expected) in cases.items():
+            with self.subTest(name):
+                self.assertEqual(self.sync(operations).status_code, expected)
+        self.assertEqual(Expense.objects.get(id=foreign.id).amount, Decimal('5.00'))
+        self.assertFalse(SyncOperation.objects.exists())
+
+    def test_put_bumps_the_version(self):
+        response = self.client.put(f'/api/expenses/{self.expense.id}/', {'amount': '12.00'}, format='json')
+        self.assertEqual(response.data['version'], 2)
+        response = self.sync([{'key': 'a', 'op': 'delete', 'id': self.expense.id, 'version': 1}])
+        self.assertEqual(response.status_code, 409)
+
+
+class ExpenseChangeFeedTests(TestCase):
+    def setUp(self):
+        from rest_framework.test import APIClient
+        self.user = User.objects.create_user(username='feeduser', password='testpassword')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add(self, amount):
+        response = self.client.post('/api/expenses/', {'category': 'Food', 'amount': amount, 'date': '2025-01-01'})
+        return response.data['id']
+
+    def changes(self, **params):
+        response = self.client.get('/api/expenses/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_only_changes_after_the_cursor_are_returned(self):
+        kept, edited, removed = self.add('1.00'), self.add('2.00'), self.add('3.00')
+        first = self.changes()
+        self.assertEqual([row['id'] for row in first['results']], [kept, edited, removed])
+        self.assertFalse(first['has_more'])
+
+        self.client.put(f'/api/expenses/{edited}/', {'amount': '5.00'}, format='json')
+        self.client.delete(f'/api/expenses/{removed}/')
+        added = self.add('4.00')
+        # Another user's writes never show up
+        other = User.objects.create_user(username='otherfeed', password='testpassword')
+        self.client.force_authenticate(user=other)
+        self.add('9.00')
+        self.client.force_authenticate(user=self.user)
+
+        later = self.changes(since=first['cursor'])
+        self.assertEqual([(row['id'], row['amount']) for row in later['results']], [(edited, '5.00'), (added, '4.00')])
+        self.assertEqual(later['deleted'], [removed])
+        self.assertEqual(self.changes(since=later['cursor'])['results'], [])
+
+    def test_pages_cover_every_change_once(self):
+        from tracker.sync import apply_batch
+        apply_batch(self.user, [
+            {'key': f'c{n}', 'op': 'create', 'data': {'category': 'Food', 'amount': '1.00', 'date': '2025-01-01'}}
+            for n in range(7)
+        ] + [{'key': f'd{n}', 'op': 'delete', 'ref': f'c{n}'} for n in range(0, 7, 2)])
+
+        written, deleted, cursor = [], [], None
+        while True:
+            page = self.changes(page_size=3, **({'since': cursor} if cursor is not None else {}))
+            self.assertLessEqual(len(page['results']) + len(page['deleted']), 3)
+            written += [row['id'] for row in page['results']]
+            deleted += page['deleted']
+            cursor = page['cursor']
+            if not page['has_more']:
+                break
+        alive = list(Expense.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+        self.assertEqual(sorted(written), alive)
+        self.assertEqual(len(deleted), 4)
+
+    def test_bad_cursor(self):
+        for since in ('abc', '-1'):
+            with self.subTest(since=since):
+                self.assertEqual(self.client.get('/api/expenses/changes/', {'since': since}).status_code, 400)
+
+
+class RecurringExpenseTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='recurringuser', password='testpassword')
+
+    def rule(self, **fields):
+        from tracker.models import RecurringExpense
+        fields = {'category': 'Bills', 'amount': Decimal('1200.00'), 'anchor_date': date(2024, 1, 31), **fields}
+        return RecurringExpense.objects.create(user=self.user, next_date=fields['anchor_date'], **fields)
+
+    def dates(self, **lookups):
+        return list(Expense.objects.filter(user=self.user, **lookups).order_by('date').values_list('date', flat=True))
+
+    def test_occurrences_keep_the_anchor_day(self):
+        from tracker.recurring import last_index, occurrence
+        monthly = self.rule()
+        self.assertEqual(
+            [occurrence(monthly, n) for n in range(4)],
+            [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)],
+        )
+        self.assertEqual(last_index(monthly, date(2024, 4, 29)), 2)
+        self.assertEqual(last_index(monthly, date(2024, 1, 30)), -1)
+        fortnightly = self.rule(interval='weekly', every=2, anchor_date=date(2024, 1, 1))
+        self.assertEqual(occurrence(fortnightly, 3), date(2024, 2, 12))
+        self.assertEqual(last_index(fortnightly, date(2024, 2, 11)), 2)
+
+    def test_catch_up_is_idempotent(self):
+        from tracker.models import ExpenseRollup, MonthlyRollup
+        from tracker.recurring import materialize
+        from tracker.rollups import reconcile
+        rent = self.rule()
+        self.rule(category='Entertainment', amount=Decimal('9.99'), interval='yearly', anchor_date=date(2023, 6, 1))
+
+        self.assertEqual(materialize(date(2024, 5, 15), batch_size=1), (2, 5))
+        self.assertEqual(self.dates(category='Bills'), [date(2024, m, d) for m, d in ((1, 31), (2, 29), (3, 31), (4, 30))])
+        self.assertEqual(self.dates(category='Entertainment'), [date(2023, 6, 1)])
+        rent.refresh_from_db()
+        self.assertEqual((rent.occurrences, rent.next_date), (4, date(2024, 5, 31)))
+
+        # Running again for the same day finds nothing due; a later day only adds what came due since
+        self.assertEqual(materialize(date(2024, 5, 15)), (0, 0))
+        self.assertEqual(materialize(date(2024, 6, 1)), (2, 2))
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 7)
+        for model in (ExpenseRollup, MonthlyRollup):
+            self.assertEqual(reconcile(model, repair=False), [])
+
+    def test_rule_stops_at_its_end_date(self):
+        from tracker.recurring import materialize
+        rule = self.rule(interval='daily', anchor_date=date(2024, 1, 1), end_date=date(2024, 1, 10))
+        materialize(date(2024, 2, 1))
+        rule.refresh_from_db()
+        self.assertEqual(len(self.dates()), 10)
+        self.assertIsNone(rule.next_date)
+
+    def test_api_and_command(self):
+        from django.core.management import call_command
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        anchor = date.today() - timedelta(days=14)
+        response = client.post('/api/recurring-expenses/', {
+            'category': 'Bills', 'amount': '15.00', 'interval': 'weekly', 'anchor_date': anchor.isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['next_date'], anchor.isoformat())
+        bad = client.post('/api/recurring-expenses/', {
+            'category': 'Bills', 'amount': '15.00', 'anchor_date': '2024-02-01', 'end_date': '2024-01-01',
+        })
+        self.assertEqual(bad.status_code, 400)
+
+        out = StringIO()
+        call_command('materialize_recurring', stdout=out)
+        self.assertIn("Created 3 expenses from 1 due rules.", out.getvalue())
+        self.assertEqual(client.delete(f"/api/recurring-expenses/{response.data['id']}/").status_code, 204)
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 3)
+
+
+class CurrencyTests(TestCase):
+    RATES = "date,currency,rate\n2025-01-01,EUR,1.10\n2025-01-03,eur,1.20\n2025-01-01,GBP,1.25\n"
+
+    def setUp(self):
+        import tempfile
+        from django.core.management import call_command
+        from rest_framework.test import APIClient
+        from tracker.models import Profile
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        self.user = User.objects.create_user(username='currencyuser', password='testpassword')
+        Profile.objects.create(user=self.user, home_currency='EUR')
+        for category, amount, currency, day in [
+            ("Food", '10.00', 'USD', "2025-01-01"),
+            ("Food", '10.00', 'EUR', "2025-01-02"),
+            ("Bills", '7.33', 'GBP', "2025-01-03"),
+            ("Food", '3.00', 'EUR', "2025-02-01"),
+        ]:
+            Expense.objects.create(user=self.user, category=category, amount=amount, currency=currency, date=day)
+        rebuild_rollups()
+
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as rates_file:
+            rates_file.write(self.RATES)
+        self.addCleanup(__import__('os').remove, rates_file.name)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('load_fx_rates', rates_file.name, stdout=out)
+        self.assertIn("Loaded 3 rates against USD.", out.getvalue())
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    @staticmethod
+    def eur(amount, rate, home_rate):
+        return Decimal(amount) * Decimal(rate) / Decimal(home_rate)
+
+    def test_totals_are_converted_at_the_rate_of_their_day(self):
+        cent = Decimal('0.01')
+        # USD is the base; the gap on Jan 2 and Feb 1 reuse the latest earlier EUR rate
+        food_january = self.eur('10.00', 1, '1.10') + Decimal('10.00')
+        bills = self.eur('7.33', '1.25', '1.20')
+        summary = self.client.get('/api/expense-summary/').data
+        self.assertEqual(
+            [(row['category'], row['total']) for row in summary['category_breakdown']],
+            [("Food", (food_january + 3).quantize(cent)), ("Bills", bills.quantize(cent))],
+        )
+        self.assertEqual(summary['total_spent'], (food_january + 3).quantize(cent) + bills.quantize(cent))
+
+        # A whole month comes from the monthly rollup, an open range from the daily rollup
+        for params, expected in [
+            ({'month': 1, 'year': 2025}, {"Food": food_january.quantize(cent), "Bills": bills.quantize(cent)}),
+            ({'start_date': '2025-01-02'}, {"Food": Decimal('13.00'), "Bills": bills.quantize(cent)}),
+        ]:
+            with self.subTest(params=params):
+                breakdown = self.client.get('/api/category-breakdown/month/', params).data['category_breakdown']
+                self.assertEqual({row['category']: row['total'] for row in breakdown}, expected)
+        trends = self.client.get('/api/spending-trends/week/', {'start_date': '2025-01-01'})
+        self.assertEqual(
+            [row['total'] for row in trends.data['trends']],
+            [self.eur('10.00', 1, '1.10').quantize(cent), Decimal('10.00'), bills.quantize(cent), Decimal('3.00')],
+        )
+
+    def test_profile_switches_the_reporting_currency(self):
+        self.assertEqual(self.client.get('/api/profile/').data, {'home_currency': 'EUR'})
+        self.assertEqual(self.client.get('/api/expense-summary/').data['total_spent'], Decimal('29.73'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put('/api/profile/', {'home_currency': 'usd'})
+        self.assertEqual(response.data, {'home_currency': 'USD'})
+        self.assertEqual(self.client.put('/api/profile/', {'home_currency': 'dollars'}).status_code, 400)
+        # 10 + 10 * 1.10 + 7.33 * 1.25 + 3 * 1.20
+        self.assertEqual(self.client.get('/api/expense-summary/').data['total_spent'], Decimal('33.76'))
+
+    def test_loading_rates_clears_the_rate_cache(self):
+        from django.core.management import CommandError, call_command
+        from tracker import fx
+        from tracker.models import FxRate, FxRateLoad
+        self.assertEqual(fx.rate('EUR', date(2025, 1, 2)), Decimal('1.10'))
+        self.assertIsNone(fx.rate('EUR', date(2024, 12, 31)))
+        self.assertEqual(fx.convert('7.33', 'GBP', 'EUR', date(2025, 1, 3)), Decimal('7.64'))
+        generation = fx.rates_generation()
+        with self.assertNumQueries(0):
+            fx.rate('EUR', date(2025, 1, 2), generation)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            fx.load_rates(fx.read_rates(StringIO("date,currency,rate\n2025-01-02,EUR,1.15\n")))
+        self.assertEqual(fx.rate('EUR', date(2025, 1, 2)), Decimal('1.15'))
+        self.assertEqual(FxRate.objects.count(), 4)
+
+        # A load in another process doesn't clear this one's cache, but moves the generation on
+        self.assertIsNone(fx.rate('EUR', date(2024, 12, 31)))
+        FxRate.objects.bulk_create([FxRate(currency='EUR', date=date(2024, 12, 31), rate=Decimal('1.05'))])
+        FxRateLoad.objects.create(count=1)
+        self.assertEqual(fx.rate('EUR', date(2024, 12, 31)), Decimal('1.05'))
+
+        for text in ("day,currency,rate\n", "date,currency,rate\n2025-01-02,EURO,1\n", "date,currency,rate\nx,EUR,1\n"):
+            with self.subTest(text=text), self.assertRaises(fx.RateFileError):
+                list(fx.read_rates(StringIO(text)))
+        with self.assertRaises(CommandError):
+            call_command('load_fx_rates', '/nonexistent/rates.csv')
+
+    def test_expenses_and_budgets_keep_their_currency(self):
+        from tracker.budgets import budgets_with_spending
+        from tracker.models import Budget
+        response = self.client.post('/api/expenses/', {
+            'category': 'Bills', 'amount': '5.00', 'date': '2025-01-05', 'currency': 'gbp',
+        })
+        self.assertEqual((response.status_code, response.data['currency']), (201, 'GBP'))
+        bad = self.client.post('/api/expenses/', {'category': 'Bills', 'amount': '5.00', 'date': '2025-01-05', 'currency': '£'})
+        self.assertEqual(bad.status_code, 400)
+
+        # Budgets count spending in the home currency only
+        Budget.objects.create(user=self.user, category='Food', limit=Decimal('100.00'))
+        budget = budgets_with_spending(self.user.id, date(2025, 1, 1)).get()
+        self.assertEqual((budget.spent, budget.uncounted), (Decimal('10.00'), 1))
+        response = self.client.get('/api/budgets/', {'month': 2, 'year': 2025})
+        self.assertEqual((response.data['budgets'][0]['spent'], response.data['budgets'][0]['uncounted']), ('3.00', 0))
+
+
+class ArchiveTests(TestCase):
+    FIELDS = ('id', 'user_id', 'category', 'amount', 'currency', 'date', 'description', 'version', 'seq')
+
+    def setUp(self):
+        from tracker.changes import stamp
+        from tracker.rollups import rebuild_rollups
+        cache.clear()
+        self.user = User.objects.create_user(username='archiveuser', password='testpassword')
+        other = User.objects.create_user(username='otherarchive', password='testpassword')
+        expenses = [
+            Expense(user=self.user, category="Food", amount=Decimal('12.30'), date=date(2022, 1, 1), description="Brunch, \"big\" one"),
+            Expense(user=self.user, category="Food", amount=Decimal('0.01'), date=date(2022, 12, 31), description=""),
+            Expense(user=self.user, category="Bills", amount=Decimal('99999999.99'), date=date(2022, 6, 15),
+                    currency='EUR', description="Café ☕\nsecond line", version=4),
+            Expense(user=self.user, category="Bills", amount=Decimal('40.00'), date=date(2023, 3, 3)),
+            Expense(user=self.user, category="Food", amount=Decimal('5.00'), date=date(2025, 1, 2)),
+            Expense(user=other, category="Food", amount=Decimal('7.00'), date=date(2022, 2, 2)),
+        ]
+        Expense.objects.bulk_create(stamp(self.user.id, expenses[:-1]) + expenses[-1:])
+        rebuild_rollups()
+
+    def snapshot(self):
+        return list(Expense.objects.filter(user=self.user).order_by('id').values_list(*self.FIELDS))
+
+    def totals(self):
+        from tracker.services import get_expenses_by_bucket, get_expenses_by_category, get_total_expenses, merge_rows
+        return (
+            get_total_expenses(self.user.id),
+            [(row['category'], row['total'], row['count']) for row in merge_rows(get_expenses_by_category(self.user.id), 'category')],
+            [(row['bucket'], row['total']) for row in merge_rows(get_expenses_by_bucket(self.user.id, 'year'), 'bucket')],
+        )
+
+    def test_round_trip_is_lossless(self):
+        from tracker import archive
+        from tracker.models import ArchivedTotal, ArchivedYear, ExpenseRollup, MonthlyRollup
+        from tracker.rollups import reconcile
+        before, totals = self.snapshot(), self.totals()
+
+        for codec in [archive.GZIP] + ([archive.ZSTD] if archive.zstandard else []):
+            with self.subTest(codec=codec):
+                self.assertEqual(archive.archive_before(date(2024, 7, 1), self.user, codec), (2, 4))
+                self.assertEqual(
+                    list(Expense.objects.filter(user=self.user).values_list('date', flat=True)), [date(2025, 1, 2)],
+                )
+                self.assertFalse(ExpenseRollup.objects.filter(user=self.user, day__year__lt=2024).exists())
+                self.assertFalse(MonthlyRollup.objects.filter(user=self.user, month__year__lt=2024).exists())
+                self.assertEqual(ArchivedYear.objects.get(user=self.user, year=2022).codec, codec)
+                food = ArchivedTotal.objects.filter(user=self.user, year=date(2022, 1, 1), category="Food")
+                self.assertEqual(sorted(food.values_list('day', 'total')), [
+                    (date(2022, 1, 1), Decimal('12.30')), (date(2022, 12, 31), Decimal('0.01')),
+                ])
+                # All-time and yearly aggregates still see the archived years
+                self.assertEqual(self.totals(), totals)
+
+                self.assertEqual(archive.restore_year(self.user.id, 2022), 3)
+                self.assertEqual(archive.restore_year(self.user.id, 2023), 1)
+                self.assertEqual(self.snapshot(), before)
+                self.assertFalse(ArchivedTotal.objects.exists())
+                self.assertEqual(self.totals(), totals)
+                for model in (ExpenseRollup, MonthlyRollup):
+                    self.assertEqual(reconcile(model, repair=False), [])
+
+    def test_converted_totals_use_each_days_rate(self):
+        from tracker import archive, fx
+        from tracker.services import get_expenses_by_bucket, get_expenses_by_category, get_total_expenses, merge_rows
+        fx.load_rates(fx.read_rates(StringIO("date,currency,rate\n2022-01-01,EUR,1.10\n2022-06-01,EUR,1.30\n")))
+
+        def totals():
+            categories = get_expenses_by_category(self.user.id, date(2022, 1, 1), date(2023, 1, 1), currency='EUR')
+            buckets = get_expenses_by_bucket(self.user.id, 'year', currency='EUR')
+            return (
+                get_total_expenses(self.user.id, currency='EUR'),
+                sorted((row['category'], row['total']) for row in merge_rows(categories, 'category')),
+                sorted((row['bucket'], row['total']) for row in merge_rows(buckets, 'bucket')),
+            )
+
+        before = totals()
+        # The USD expenses convert at 1.10 in January and 1.30 in December
+        self.assertEqual(before[1], [('Bills', Decimal('99999999.99')), ('Food', Decimal('11.19'))])
+        archive.archive_year(self.user.id, 2022)
+        self.assertEqual(totals(), before)
+
+    def test_ranges_inside_an_archived_year(self):
+        from rest_framework.test import APIClient
+        from tracker import archive, reports
+        from tracker.models import Budget
+        from tracker.services import get_expenses_by_bucket, merge_rows
+        Budget.objects.create(user=self.user, category="Bills", limit=Decimal('100.00'))
+        Budget.objects.create(user=self.user, category="Food", limit=Decimal('100.00'))
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        paths = [
+            '/api/spending-trends/month/?month=1&year=2022',
+            '/api/category-breakdown/week/?start_date=2022-06-13',
+            '/api/dashboard/?month=12&year=2022',
+            '/api/analytics/year-over-year/?year=2022',
+            '/api/analytics/rolling/?start_date=2022-12-01&end_date=2023-01-31',
+            '/api/analytics/percentiles/?start_date=2022-01-01&end_date=2023-12-31',
+            '/api/budgets/?month=1&year=2022',
+            '/api/budgets/?month=6&year=2022',
+        ]
+
+        def results():
+            cache.clear()
+            statement = StringIO()
+            reports.annual_statement(self.user.id, {'start_year': 2022, 'end_year': 2022}, statement)
+            days = get_expenses_by_bucket(self.user.id, 'day', date(2022, 6, 1), date(2022, 7, 1))
+            responses = {path: client.get(path).json() for path in paths}
+            # Archived expenses leave the recent list, as they leave the expense list
+            del responses['/api/dashboard/?month=12&year=2022']['recent_expenses']
+            return (
+                responses,
+                [(row['bucket'], row['total'], row['count']) for row in merge_rows(days, 'bucket')],
+                json.loads(statement.getvalue()),
+            )
+
+        before = results()
+        self.assertEqual(before[1], [(date(2022, 6, 15), Decimal('99999999.99'), 1)])
+        budgets = before[0]['/api/budgets/?month=1&year=2022']['budgets']
+        self.assertEqual([(b['category'], b['spent'], b['uncounted']) for b in budgets],
+                         [("Bills", '0.00', 0), ("Food", '12.30', 0)])
+        self.assertEqual(before[0]['/api/budgets/?month=6&year=2022']['budgets'][0]['uncounted'], 1)
+        archive.archive_year(self.user.id, 2022)
+        self.assertEqual(results(), before)
+
+    def test_archiving_reads_the_year_under_the_write_lock(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from tracker import archive
+        with CaptureQueriesContext(connection) as queries:
+            archive.archive_year(self.user.id, 2022)
+        statements = [q['sql'] for q in queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertTrue(statements[0].startswith('UPDATE') and statements[0].endswith('WHERE 0'))
+        self.assertIn('FROM "tracker_expense"', statements[1])
+
+    def test_late_expense_joins_its_archived_year(self):
+        from tracker import archive
+        archive.archive_year(self.user.id, 2022)
+        late = Expense.objects.create(user=self.user, category="Food", amount=Decimal('1.00'), date=date(2022, 5, 5))
+        self.assertEqual(archive.archive_year(self.user.id, 2022), 1)
+        archive.restore_year(self.user.id, 2022)
+        self.assertEqual(Expense.objects.filter(user=self.user, date__year=2022).count(), 4)
+        self.assertTrue(Expense.objects.filter(id=late.id, amount=Decimal('1.00')).exists())
+
+    def test_summary_endpoint_merges_archived_years(self):
+        from django.core.management import CommandError, call_command
+        from rest_framework.test import APIClient
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        before = client.get('/api/expense-summary/').data
+        dashboard = client.get('/api/dashboard/').data['category_breakdown']
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_expenses', '--before', '2025-01-01', stdout=out)
+        self.assertIn("Archived 5 expenses from 3 user-years.", out.getvalue())
+        self.assertEqual(client.get('/api/expense-summary/').data, before)
+        self.assertEqual(client.get('/api/dashboard/').data['category_breakdown'], dashboard)
+
+        out = StringIO()
+        call_command('restore_expenses', 'archiveuser', '2022', stdout=out)
+        self.assertIn("Restored 3 expenses from 2022.", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('restore_expenses', 'archiveuser', '2022')
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        import tempfile
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from tracker.changes import stamp
+        from tracker.rollups import rebuild_rollups
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.report_dir = directory.name
+        settings = override_settings(TRACKER_REPORT_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username='reportuser', password='testpassword')
+        Expense.objects.bulk_create(stamp(self.user.id, [
+            Expense(user=self.user, category="Food", amount=Decimal('10.50'), date=date(2023, 3, 1)),
+            Expense(user=self.user, category="Bills", amount=Decimal('80.00'), date=date(2023, 3, 9)),
+            Expense(user=self.user, category="Food", amount=Decimal('4.25'), date=date(2024, 7, 4), description="Ice, cream"),
+        ]))
+        rebuild_rollups()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def request(self, kind, **params):
+        return self.client.post('/api/reports/', {'kind': kind, 'params': params}, format='json')
+
+    def work(self):
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('run_report_worker', '--workers', '0', '--once', stdout=out)
+        return out.getvalue()
+
+    def test_statement_is_queued_built_and_deduplicated(self):
+        response = self.request('annual_statement', start_year=2023, end_year=2024)
+        self.assertEqual((response.status_code, response.data['status']), (202, 'queued'))
+        again = self.request('annual_statement', start_year='2023', end_year=2024)
+        self.assertEqual((again.status_code, again.data['id']), (200, response.data['id']))
+
+        self.assertIn("Finished 1 reports.", self.work())
+        job = self.client.get(f"/api/reports/{response.data['id']}/").data
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['currency'], 'USD')
+        self.assertEqual(
+            [(year['year'], year['total'], year['months']) for year in job['result']['years']],
+            [(2023, '90.50', [{'month': '2023-03', 'total': '90.50'}]), (2024, '4.25', [{'month': '2024-07', 'total': '4.25'}])],
+        )
+        download = self.client.get(job['result_url'])
+        self.assertEqual(json.loads(b''.join(download.streaming_content)), job['result'])
+
+        # New spending makes it a different report
+        self.client.post('/api/expenses/', {'category': 'Food', 'amount': '1.00', 'date': '2024-01-01'})
+        self.assertEqual(self.request('annual_statement', start_year=2023, end_year=2024).status_code, 202)
+
+    def test_history_includes_archived_years(self):
+        import csv
+        from tracker.archive import archive_year
+        archive_year(self.user.id, 2023)
+        job_id = self.request('expense_history').data['id']
+        self.work()
+        self.assertIsNone(self.client.get(f'/api/reports/{job_id}/').data['result'])
+        body = b''.join(self.client.get(f'/api/reports/{job_id}/result/').streaming_content).decode()
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0], ['id', 'category', 'amount', 'date', 'description', 'currency'])
+        self.assertEqual(
+            [row[1:] for row in rows[1:]],
+            [['Food', '10.50', '2023-03-01', '', 'USD'], ['Bills', '80.00', '2023-03-09', '', 'USD'],
+             ['Food', '4.25', '2024-07-04', 'Ice, cream', 'USD']],
+        )
+
+    def test_new_rates_or_a_lost_file_rebuild_the_report(self):
+        import os
+        from tracker import fx
+        from tracker.models import ReportJob
+        first = self.request('annual_statement', start_year=2023).data['id']
+        self.work()
+        with self.captureOnCommitCallbacks(execute=True):
+            fx.load_rates(fx.read_rates(StringIO("date,currency,rate\n2023-01-02,EUR,1.10\n")))
+        response = self.request('annual_statement', start_year=2023)
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data['id'], first)
+        self.work()
+
+        job = ReportJob.objects.get(id=response.data['id'])
+        os.remove(os.path.join(self.report_dir, job.result_file))
+        response = self.client.get(f'/api/reports/{job.id}/result/')
+        self.assertEqual(response.status_code, 410)
+        job = self.client.get(f'/api/reports/{job.id}/').data
+        self.assertEqual((job['status'], job['result']), ('failed', None))
+        self.assertEqual(self.request('annual_statement', start_year=2023).status_code, 202)
+
+    def test_failures_and_invalid_requests(self):
+        from unittest import mock
+        from tracker import reports
+        for kind, params in [('tax_return', {}), ('annual_statement', {}), ('annual_statement', {'start_year': 1800}),
+                             ('annual_statement', {'start_year': 2024, 'end_year': 2023}), ('expense_history', {'x': 1})]:
+            with self.subTest(kind=kind, params=params):
+                self.assertEqual(self.request(kind, **params).status_code, 400)
+
+        job_id = self.request('expense_history').data['id']
+        self.assertEqual(self.client.get(f'/api/reports/{job_id}/result/').status_code, 409)
+        other = User.objects.create_user(username='otherreport', password='testpassword')
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(f'/api/reports/{job_id}/').status_code, 404)
+        self.client.force_authenticate(user=self.user)
+
+        def broken(user_id, params, stream):
+            raise RuntimeError("disk on fire")
+        with mock.patch.dict(reports.KINDS, {'expense_history': (reports.history_params, broken, 'csv')}):
+            self.work()
+        job = self.client.get(f'/api/reports/{job_id}/').data
+        self.assertEqual((job['status'], job['error']), ('failed', "RuntimeError: disk on fire"))
+        # A failed report can be asked for again
+        self.assertEqual(self.request('expense_history').status_code, 202)
+
+
+class AuthLoadTests(TestCase):
+    def setUp(self):
+        from tracker.hashing import POOL
+        from tracker.throttles import BUCKETS
+        BUCKETS.clear()
+        self.addCleanup(BUCKETS.clear)
+        POOL.shutdown()
+        self.addCleanup(POOL.shutdown)
+        self.user = User.objects.create_user(username='loginuser', password='testpassword')
+
+    def test_register_relies_on_unique_constraint(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from rest_framework.test import APIClient
+        client = APIClient()
+        self.assertEqual(client.post('/api/register/', {'username': 'newuser', 'password': 'pw12345!'}).status_code, 201)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/register/', {'username': 'newuser', 'password': 'other'})
+        self.assertEqual((response.status_code, response.data), (400, {"error": "Username already taken"}))
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('SELECT')])
+        self.assertTrue(User.objects.get(username='newuser').check_password('pw12345!'))
+
+    def test_token_buckets_per_username_and_ip(self):
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        client = APIClient()
+        with override_settings(TRACKER_AUTH_RATES={'username': (2, 60)}):
+            statuses = [client.post('/api/token/', {'username': 'LoginUser', 'password': 'wrong'}).status_code
+                        for _ in range(2)]
+            self.assertEqual(statuses, [401, 401])
+            response = client.post('/api/token/', {'username': 'loginuser', 'password': 'testpassword'})
+            self.assertEqual(response.status_code, 429)
+            # 30, less whatever the two slow hashes before it refilled
+            self.assertIn(int(response['Retry-After']), range(25, 31))
+            # Another username has its own bucket
+            self.assertEqual(client.post('/api/token/', {'username': 'someone', 'password': 'x'}).status_code, 401)
+        with override_settings(TRACKER_AUTH_RATES={'ip': (1, 60)}):
+            self.assertEqual(client.post('/api/register/', {'username': 'a1', 'password': 'pw'}).status_code, 201)
+            self.assertEqual(client.post('/api/register/', {'username': 'a2', 'password': 'pw'}).status_code, 429)
+            self.assertEqual(client.post('/api/token/', {'username': 'a1', 'password': 'pw'}).status_code, 429)
+
+    def test_saturated_hashing_pool_returns_429(self):
+        import threading
+        from django.test import override_settings
+        from rest_framework.test import APIClient
+        from tracker.hashing import POOL
+        client = APIClient()
+        started, release = threading.Event(), threading.Event()
+
+        def occupy():
+            started.set()
+            release.wait(10)
+
+        with override_settings(TRACKER_HASH_WORKERS=1, TRACKER_HASH_QUEUE_DEPTH=0):
+            blocker = threading.Thread(target=POOL.run, args=(occupy,))
+            blocker.start()
+            started.wait(10)
+            try:
+                for path, data in [('/api/token/', {'username': 'loginuser', 'password': 'testpassword'}),
+                                   ('/api/register/', {'username': 'busy', 'password': 'pw'}),
+                                   ('/admin/login/', {'username': 'loginuser', 'password': 'testpassword'})]:
+                    with self.subTest(path=path):
+                        response = client.post(path, data)
+                        self.assertEqual(response.status_code, 429)
+                        self.assertEqual(response['Retry-After'], '1')
+            finally:
+                release.set()
+                blocker.join()
+            self.assertFalse(User.objects.filter(username='busy').exists())
+            response = client.post('/api/token/', {'username': 'loginuser', 'password': 'testpassword'})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.data)
@@ -0,0 +1,91 @@
+"""In-memory token-bucket throttles for the endpoints that hash passwords.
+
+Buckets live in each process, so with N workers a client gets up to N times
+the configured rate; they keep one client from filling the hashing pool
+(tracker/hashing.py) rather than enforce an exact quota.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+# scope -> (burst, seconds to refill a whole burst)
+DEFAULT_RATES = {'ip': (30, 60), 'username': (10, 60)}
+
+
+class TokenBuckets:
+    """Bounded LRU of token buckets, one per key.
+
+    A bucket starts with ``burst`` tokens and refills continuously at
+    ``rate`` tokens a second; every request takes one. Evicting a bucket
+    forgets its debt, so TRACKER_RATE_LIMIT_KEYS should comfortably exceed
+    the keys seen within a refill period.
+    """
+
+    def __init__(self):
+        self.buckets = OrderedDict()  # key -> (tokens, last updated)
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst, now):
+        """Take a token for ``key``. Returns 0, or the seconds until a token is available."""
+        maxsize = getattr(settings, 'TRACKER_RATE_LIMIT_KEYS', 100000)
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > maxsize:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+BUCKETS = TokenBuckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle on ``get_key(request)`` at the TRACKER_AUTH_RATES entry for ``scope``.
+
+    A scope missing from the setting isn't throttled.
+    """
+
+    scope = None
+
+    def get_key(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_time = 0
+        rate = getattr(settings, 'TRACKER_AUTH_RATES', DEFAULT_RATES).get(self.scope)
+        key = self.get_key(request) if rate else None
+        if key is None:
+            return True
+        burst, period = rate
+        self.wait_time = BUCKETS.take(f'{self.scope}:{key}', burst / period, burst, time.monotonic())
+        return not self.wait_time
+
+    def wait(self):
+        # Rounded up, since Retry-After is whole seconds and retrying early would be refused
+        return math.ceil(self.wait_time)
+
+
+class IPThrottle(TokenBucketThrottle):
+    scope = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class UsernameThrottle(TokenBucketThrottle):
+    scope = 'username'
+
+    def get_key(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        return username.lower() if isinstance(username, str) else None
@@ -1,14 +1,43 @@
 from django.urls import path
-from .views import ExpenseList, register_user, ExpenseDetail
+from .views import ExpenseList, register_user, ExpenseDetail, ExpenseBulkImport, ExpenseSync
 from .views import MyTokenObtainPairView, MyTokenRefreshView, expense_summary, spending_trends, category_breakdown
+from .views import export_expenses, dashboard, metrics, BudgetList, BudgetDetail, search_expenses_view, expense_changes
+from .views import year_over_year, rolling_averages, category_percentiles, spending_forecast
+from .views import RecurringExpenseList, RecurringExpenseDetail, ProfileView, ReportList, report_detail, report_result
+from . import async_views
 
 urlpatterns = [
 path('register/', register_user, name='register'),
 path('expenses/', ExpenseList.as_view(), name='expense-list'),
+path('expenses/bulk/', ExpenseBulkImport.as_view(), name='expense-bulk-import'),
+path('expenses/export/', export_expenses, name='expense-export'),
+path('expenses/search/', search_expenses_view, name='expense-search'),
+path('expenses/sync/', ExpenseSync.as_view(), name='expense-sync'),
+path('expenses/changes/', expense_changes, name='expense-changes'),
 path('token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
 path('token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
 path('expenses/<int:expense_id>/', ExpenseDetail.as_view(), name='expense-detail'),
 path('expense-summary/', expense_summary, name='expense_summary'),
 path('spending-trends/<str:period>/', spending_trends, name='spending-trends'),
 path('category-breakdown/<str:period>/', category_breakdown, name='category-breakdown'),
+path('dashboard/', dashboard, name='dashboard'),
+path('analytics/year-over-year/', year_over_year, name='analytics-year-over-year'),
+path('analytics/rolling/', rolling_averages, name='analytics-rolling'),
+path('analytics/percentiles/', category_percentiles, name='analytics-percentiles'),
+path('analytics/forecast/', spending_forecast, name='analytics-forecast'),
+path('budgets/', BudgetList.as_view(), name='budget-list'),
+path('budgets/<int:budget_id>/', BudgetDetail.as_view(), name='budget-detail'),
+path('recurring-expenses/', RecurringExpenseList.as_view(), name='recurring-expense-list'),
+path('recurring-expenses/<int:rule_id>/', RecurringExpenseDetail.as_view(), name='recurring-expense-detail'),
+path('profile/', ProfileView.as_view(), name='profile'),
+path('reports/', ReportList.as_view(), name='report-list'),
+path('reports/<int:report_id>/', report_detail, name='report-detail'),
+path('reports/<int:report_id>/result/', report_result, name='report-result'),
+path('_metrics/', metrics, name='metrics'),
+# Async variants of the read endpoints, for ASGI deployments
+path('async/expenses/', async_views.expense_list, name='async-expense-list'),
+path('async/expense-summary/', async_views.expense_summary, name='async-expense-summary'),
+path('async/spending-trends/<str:period>/', async_views.spending_trends, name='async-spending-trends'),
+path('async/category-breakdown/<str:period>/', async_views.category_breakdown, name='async-category-breakdown'),
+path('async/dashboard/', async_views.dashboard, name='async-dashboard'),
 ]
@@ -0,0 +1,281 @@
+"""Multi-year analytics computed with NumPy over one pull of a user's expenses.
+
+Each endpoint loads ``(date, category, amount)`` for the range it needs in a
+single query, then derives every bucket with ``bincount``/``cumsum`` over
+day or month indices instead of issuing one aggregate query per bucket.
+Statistics built from sums read the daily rollup rather than every expense.
+Archived years are folded in: their daily totals from ArchivedTotal, their
+expenses from the archives themselves. Amounts are held as cents: whole
+ones as stored, so sums stay exact to the cent. Given a ``currency``,
+rows in other currencies are converted on load with the cached rates in
+``tracker.fx`` and left unrounded, so each bucket is rounded once, by
+``money``, as the SQL aggregates round each total once.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import CharField, FloatField
+from django.db.models.functions import Cast
+
+from .archive import archived_expenses
+from .fx import factor, rates_generation
+from .models import ArchivedTotal, Expense, ExpenseRollup
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROLLING_WINDOWS = (7, 30)
+DEFAULT_ROLLING_DAYS = 90
+MAX_ROLLING_DAYS = 3 * 366
+PERCENTILES = (50, 75, 90, 95)
+FORECAST_HISTORY_MONTHS = 36
+MAX_FORECAST_MONTHS = 12
+# Enough history to estimate a seasonal index from at least two of each month
+SEASONAL_MIN_MONTHS = 24
+
+
+def money(cents):
+    """Cents (int or float) as a Decimal with two places."""
+    return Decimal(int(round(float(cents)))).scaleb(-2)
+
+
+def month_label(month_index):
+    """'YYYY-MM' for a month counted from January 1970, NumPy's datetime64[M] epoch."""
+    return str(np.datetime64(int(month_index), 'M'))
+
+
+def converted_rows(rows, currency):
+    """``(day, category, amount, row currency)`` rows as ``(day, category, amount, multiplier)``.
+
+    ``multiplier`` converts the amount into ``currency``. Rows without a
+    rate to convert with are dropped, as converted SQL totals leave them out.
+    """
+    converted, generation = [], rates_generation()
+    for day, category, amount, row_currency in rows:
+        multiplier = 1.0
+        if row_currency != currency:
+            multiplier = factor(row_currency, currency, date.fromisoformat(day), generation)
+            if multiplier is None:
+                continue
+        converted.append((day, category, amount, float(multiplier)))
+    return converted
+
+
+def query_rows(queryset, date_field, amount_field, start, end, currency=None):
+    """``(day, category, amount[, currency])`` rows of ``queryset`` dated ``start`` to ``end`` inclusive."""
+    if start is not None:
+        queryset = queryset.filter(**{f'{date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{date_field}__lte': end})
+    # ISO date strings and floats skip a date and a Decimal object per row: NumPy parses
+    # the dates in bulk, and rounding to whole cents below makes the amounts exact again
+    columns = [Cast(date_field, CharField()), 'category', Cast(amount_field, FloatField())]
+    return queryset.values_list(*columns, *(['currency'] if currency else [])).order_by()
+
+
+class ExpenseArrays:
+    """A user's expenses as parallel NumPy arrays.
+
+    ``days`` is datetime64[D], ``cents`` float64 and ``codes`` an index into
+    ``categories``.
+    """
+
+    def __init__(self, days, cents, codes, categories):
+        self.days = days
+        self.cents = cents
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def load(cls, user_id, start=None, end=None, currency=None, **lookups):
+        """Pull one user's expenses in ``[start, end]`` with a single query, in ``currency`` if given.
+
+        Expenses in archived years the range reaches are read back from their archives.
+        """
+        expenses = Expense.objects.filter(user_id=user_id, **lookups)
+        rows = list(query_rows(expenses, 'date', 'amount', start, end, currency))
+        rows += [
+            (expense.date.isoformat(), expense.category, float(expense.amount), *([expense.currency] if currency else []))
+            for expense in archived_expenses(user_id, start, end, **lookups)
+        ]
+        return cls.from_rows(rows, currency)
+
+    @classmethod
+    def load_daily(cls, user_id, start=None, end=None, currency=None, **lookups):
+        """Like ``load`` but one entry per day, category and currency, read from the daily rollup.
+
+        Enough for anything built from sums, and far fewer rows than expenses.
+        Archived days come from ArchivedTotal in the same query.
+        """
+        rollups = query_rows(ExpenseRollup.objects.filter(user_id=user_id, **lookups), 'day', 'total', start, end, currency)
+        archived = query_rows(ArchivedTotal.objects.filter(user_id=user_id, **lookups), 'day', 'total', start, end, currency)
+        return cls.from_rows(rollups.union(archived, all=True), currency)
+
+    @classmethod
+    def from_rows(cls, rows, currency=None):
+        """Build the arrays from ``query_rows`` rows."""
+        rows = converted_rows(rows, currency) if currency else [(*row, 1.0) for row in rows]
+        dates, categories, amounts, multipliers = zip(*rows) if rows else ((), (), (), ())
+        names, codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        # Whole cents as stored, then converted without rounding
+        cents = np.rint(np.array(amounts, dtype=np.float64) * 100) * np.array(multipliers, dtype=np.float64)
+        return cls(
+            np.array(dates, dtype='datetime64[D]'),
+            cents,
+            codes.astype(np.intp),
+            [str(name) for name in names],
+        )
+
+    def __len__(self):
+        return len(self.cents)
+
+    def daily_totals(self, start, end):
+        """Cents spent on each day from ``start`` to ``end`` inclusive."""
+        first = np.datetime64(start, 'D')
+        span = (np.datetime64(end, 'D') - first).astype(int) + 1
+        index = (self.days - first).astype(int)
+        inside = (index >= 0) & (index < span)
+        return np.bincount(index[inside], weights=self.cents[inside], minlength=span)
+
+    def monthly_totals(self, first_month, months):
+        """Cents spent in each of ``months`` months from ``first_month`` (a datetime64[M])."""
+        index = (self.days.astype('datetime64[M]') - first_month).astype(int)
+        inside = (index >= 0) & (index < months)
+        return np.bincount(index[inside], weights=self.cents[inside], minlength=months)
+
+
+def year_over_year(arrays, year, today=None):
+    """Monthly totals for ``year`` against the year before.
+
+    For the current year only the months so far are compared, and the
+    year totals are year-to-date on both sides.
+    """
+    today = today or date.today()
+    months = today.month if year == today.year else 12
+    previous = arrays.monthly_totals(np.datetime64(f'{year - 1}-01', 'M'), 12)[:months]
+    current = arrays.monthly_totals(np.datetime64(f'{year}-01', 'M'), 12)[:months]
+    return {
+        'year': year,
+        'previous_year': year - 1,
+        'months': [
+            {
+                'month': month + 1,
+                'total': money(current[month]),
+                'previous_total': money(previous[month]),
+                'change_pct': change_pct(previous[month], current[month]),
+            }
+            for month in range(months)
+        ],
+        'total': money(current.sum()),
+        'previous_total': money(previous.sum()),
+        'change_pct': change_pct(previous.sum(), current.sum()),
+    }
+
+
+def change_pct(before, after):
+    if not before:
+        return None
+    return round(float((after - before) / before * 100), 1)
+
+
+def rolling_averages(arrays, start, end, window):
+    """Daily totals from ``start`` to ``end`` with the trailing ``window``-day mean.
+
+    ``arrays`` must cover ``window - 1`` days before ``start``. Days without
+    expenses count as zero, so the mean is spend per calendar day.
+    """
+    lead = timedelta(days=window - 1)
+    daily = arrays.daily_totals(start - lead, end)
+    sums = np.cumsum(daily)
+    sums[window:] = sums[window:] - sums[:-window]
+    means = sums[window - 1:] / window
+    daily = daily[window - 1:]
+    first = np.datetime64(start, 'D')
+    return [
+        {'date': (first + offset).item(), 'total': money(daily[offset]), 'average': money(means[offset])}
+        for offset in range(len(daily))
+    ]
+
+
+def category_percentiles(arrays, percentiles=PERCENTILES):
+    """Per-category count, mean and expense amount percentiles (linear interpolation).
+
+    Amounts are sorted once by (category, amount); each category is then a
+    contiguous run, and every percentile of every category is read off it
+    with one vectorized interpolation.
+    """
+    if not len(arrays):
+        return []
+    order = np.lexsort((arrays.cents, arrays.codes))
+    cents = arrays.cents[order].astype(np.float64)
+    counts = np.bincount(arrays.codes, minlength=len(arrays.categories))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sums = np.bincount(arrays.codes, weights=arrays.cents, minlength=len(arrays.categories))
+
+    # positions[i, j]: fractional index of percentile j within category i
+    fractions = np.array(percentiles, dtype=np.float64) / 100
+    positions = starts[:, None] + fractions[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, (starts + np.maximum(counts - 1, 0))[:, None])
+    weight = positions - lower
+    values = cents[lower] * (1 - weight) + cents[upper] * weight
+
+    return [
+        {
+            'category': category,
+            'count': int(counts[code]),
+            'mean': money(sums[code] / counts[code]),
+            **{f'p{p}': money(values[code, j]) for j, p in enumerate(percentiles)},
+        }
+        for code, category in enumerate(arrays.categories)
+        if counts[code]
+    ]
+
+
+def forecast(arrays, months, today=None):
+    """Project monthly totals ``months`` ahead from complete past months.
+
+    A least-squares line through the history gives the trend. With at least
+    SEASONAL_MIN_MONTHS of history each calendar month also gets a seasonal
+    index, its average ratio of actual to trend, which scales the projection.
+    """
+    today = today or date.today()
+    this_month = np.datetime64(today, 'M')
+    first = this_month - FORECAST_HISTORY_MONTHS
+    totals = arrays.monthly_totals(first, FORECAST_HISTORY_MONTHS)
+
+    # History starts at the first month with spending
+    spent = np.flatnonzero(totals)
+    if len(spent) == 0 or FORECAST_HISTORY_MONTHS - spent[0] < 2:
+        return {'method': None, 'history': [], 'forecast': []}
+    offset = int(spent[0])
+    totals = totals[offset:]
+    first = first + offset
+    x = np.arange(len(totals), dtype=np.float64)
+    slope, intercept = np.polyfit(x, totals, 1)
+    future = np.arange(len(totals), len(totals) + months, dtype=np.float64)
+    projected = slope * future + intercept
+
+    method = 'linear'
+    if len(totals) >= SEASONAL_MIN_MONTHS:
+        trend = slope * x + intercept
+        calendar = (first.astype(int) + np.arange(len(totals))) % 12
+        usable = trend > 0
+        ratios = np.bincount(calendar[usable], weights=totals[usable] / trend[usable], minlength=12)
+        seen = np.bincount(calendar[usable], minlength=12)
+        index = np.divide(ratios, seen, out=np.ones(12), where=seen > 0)
+        projected = projected * index[(this_month.astype(int) + np.arange(months)) % 12]
+        method = 'seasonal'
+
+    return {
+        'method': method,
+        'history': [
+            {'month': month_label(first.astype(int) + i), 'total': money(total)} for i, total in enumerate(totals)
+        ],
+        'forecast': [
+            {'month': month_label(this_month.astype(int) + i), 'total': money(max(total, 0))}
+            for i, total in enumerate(projected)
+        ],
+    }
@@ -1,199 +1,330 @@
+import logging
+
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import F
+from django.http import FileResponse, HttpResponse
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from django.contrib.auth.hashers import make_password
-from .models import Expense
-from .serializers import ExpenseSerializer
+from .models import Budget, Expense, Profile, RecurringExpense, ReportJob
+from .serializers import (
+    BudgetSerializer, ExpenseRowSerializer, ExpenseSerializer, ProfileSerializer, RecurringExpenseSerializer,
+    ReportJobSerializer, TokenObtainPairSerializer,
+)
+from .rollups import record_changes
+from .changes import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, allocate, changes_since, parse_cursor, record_deletions
+from .db import is_locked_error, retry_if_locked, select_for_write
+from .pagination import KeysetPaginator
+from .streaming import streaming_json_response, streaming_rows_response
+from .renderers import CSVRenderer, FastJSONRenderer, JSONLinesRenderer
+from .cache import cached_analytics, invalidate_user
+from .importers import get_row_reader, import_expenses
+from .filters import FilterError, PeriodFilter, expense_lookups, requested_month
+from .budgets import budgets_with_spending
+from .fx import home_currency, home_currency_code
+from .search import parse_query, search_expenses
+from .sync import SyncError, apply_batch
+from .reports import ReportError, check_result, enqueue, expire, result_path
+from .hashing import make_password
+from .throttles import IPThrottle, UsernameThrottle
+from . import vectorized
+from .dashboard import DEFAULT_RECENT, MAX_RECENT, build_dashboard
+from .metrics import render_prometheus, timed
+from .analytics import (
+    INVALID_PERIOD, TREND_PERIODS, category_totals_data, category_totals_query, summary_data, summary_query,
+    trends_data, trends_query,
+)
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDay
-from datetime import timedelta
-from datetime import datetime
+from datetime import date, timedelta
+from copy import copy
+
+logger = logging.getLogger(__name__)
+
+# Read-only fast path mirroring ExpenseSerializer for list responses
+EXPENSE_ROWS = ExpenseRowSerializer()
+
+EXPORT_FIELDS = ('id', 'category', 'amount', 'date', 'description', 'currency')
 
 
 # User Registration View
 @api_view(['POST'])
+@throttle_classes([IPThrottle, UsernameThrottle])
 def register_user(request):
     """Endpoint for user registration"""
     data = request.data
+    username = data['username']
 
-    # Check if username already exists
-    if User.objects.filter(username=data['username']).exists():
-        return Response({"error": "Username already taken"}, status=status.HTTP_400_BAD_REQUEST)
+    # Hashed on the bounded pool, which answers 429 when it's full
+    password = make_password(data['password'])
 
-    # Create new user
-    user = User.objects.create(
-        username=data['username'],
-        email=data.get('email', ''),  # Email is optional
-        password=make_password(data['password'])  # Hash password before storing
-    )
+    # Create new user; the unique username constraint rejects a taken name, even one taken concurrently
+    try:
+        with transaction.atomic():
+            user = User.objects.create(
+                username=username,
+                email=data.get('email', ''),  # Email is optional
+                password=password,
+            )
+    except IntegrityError:
+        return Response({"error": "Username already taken"}, status=status.HTTP_400_BAD_REQUEST)
 
     return Response({"message": "User created successfully"}, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
 def spending_trends(request, period):
-    if period not in ['month', 'week']:
-        return Response({"error": "Invalid period. Choose 'month' or 'week'."}, status=400)
-    
-    # Get filter parameters - support both start_date and month/year filtering
-    start_date = request.GET.get('start_date')
-    month = request.GET.get('month')
-    year = request.GET.get('year')
-    
-    # Base queryset
-    queryset = Expense.objects.all()
-    
-    # Apply filters
-    if start_date:
-        # Parse start_date if provided
-        try:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            queryset = queryset.filter(date__gte=start_date_obj)
-        except ValueError:
-            return Response({"error": "Invalid start_date format. Use YYYY-MM-DD."}, status=400)
-    elif month and year:
-        # Filter by specific month and year
-        try:
-            month_int = int(month)
-            year_int = int(year)
-            
-            # Create date range for the selected month
-            start_date_obj = datetime(year=year_int, month=month_int, day=1).date()
-            if month_int == 12:
-                end_date_obj = datetime(year=year_int+1, month=1, day=1).date()
-            else:
-                end_date_obj = datetime(year=year_int, month=month_int+1, day=1).date()
-                
-            queryset = queryset.filter(date__gte=start_date_obj, date__lt=end_date_obj)
-            
-            print(f"Filtering expenses for {month_int}/{year_int}: {start_date_obj} to {end_date_obj}")
-            
-        except ValueError:
-            return Response({"error": "Invalid month or year format."}, status=400)
-    else:
-        # Default to current month if no filter provided
-        today = datetime.now().date()
-        start_date_obj = today.replace(day=1)
-        queryset = queryset.filter(date__gte=start_date_obj)
-        
-        # If no data in current month, don't default to previous
-        # as that would be confusing with the month selector
-        if not queryset.exists():
-            return Response({'trends': []})
-            
-    # Perform aggregation based on period
-    if period == 'month':
-        # Break down spending into weeks within the month
-        trends = queryset.annotate(week=TruncWeek('date')) \
-            .values('week') \
-            .annotate(total=Sum('amount')) \
-            .order_by('week')
-    elif period == 'week':
-        # Group by day within the selected week
-        trends = queryset.annotate(day=TruncDay('date')) \
-            .values('day') \
-            .annotate(total=Sum('amount')) \
-            .order_by('day')
-
-    data = [
-        {
-            'period': item['week'] if period == 'month' else item['day'],
-            'total': item['total']
-        }
-        for item in trends
-    ]
-    
-    return Response({'trends': data})
-    
-# Also update category_breakdown endpoint with similar logic
+    if period not in TREND_PERIODS:
+        return Response({"error": INVALID_PERIOD}, status=400)
+
+    # Support both start_date and month/year filtering, defaulting to the current month
+    try:
+        period_filter = PeriodFilter.from_request(request)
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Daily rollup buckets for this user rather than raw expenses, in their home currency
+    rows = trends_query(request.user.id, period_filter, period, home_currency(request.user.id))
+    return Response({'trends': trends_data(rows)})
+
 @api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
 def category_breakdown(request, period):
-    if period not in ['month', 'week']:
-        return Response({"error": "Invalid period. Choose 'month' or 'week'."}, status=400)
-    
-    # Get filter parameters - support both start_date and month/year filtering
-    start_date = request.GET.get('start_date')
-    month = request.GET.get('month')
-    year = request.GET.get('year')
-    
-    # Base queryset
-    queryset = Expense.objects.all()
-    
-    # Apply filters - same logic as spending_trends
-    if start_date:
-        try:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            queryset = queryset.filter(date__gte=start_date_obj)
-        except ValueError:
-            return Response({"error": "Invalid start_date format. Use YYYY-MM-DD."}, status=400)
-    elif month and year:
-        try:
-            month_int = int(month)
-            year_int = int(year)
-            
-            # Create date range for the selected month
-            start_date_obj = datetime(year=year_int, month=month_int, day=1).date()
-            if month_int == 12:
-                end_date_obj = datetime(year=year_int+1, month=1, day=1).date()
-            else:
-                end_date_obj = datetime(year=year_int, month=month_int+1, day=1).date()
-                
-            queryset = queryset.filter(date__gte=start_date_obj, date__lt=end_date_obj)
-            
-        except ValueError:
-            return Response({"error": "Invalid month or year format."}, status=400)
-    else:
-        # Default to current month
-        today = datetime.now().date()
-        start_date_obj = today.replace(day=1)
-        queryset = queryset.filter(date__gte=start_date_obj)
-        
-        # If no data in current month, don't default to previous
-        if not queryset.exists():
-            return Response({'category_breakdown': []})
+    if period not in TREND_PERIODS:
+        return Response({"error": INVALID_PERIOD}, status=400)
+
+    # Same filters as spending_trends
+    try:
+        period_filter = PeriodFilter.from_request(request)
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
 
     # Aggregate category totals
-    categories = queryset.values('category').annotate(total=Sum('amount'))
+    data = category_totals_data(category_totals_query(request.user.id, period_filter, home_currency(request.user.id)))
+
+    # No data in the default month: keep returning the bare empty breakdown
+    if not data and period_filter.is_default:
+        return Response({'category_breakdown': []})
 
-    # Prepare the response data
-    data = [{'category': item['category'], 'total': item['total']} for item in categories]
-    
     return Response({
         'category_breakdown': data, 
-        'period_info': {
-            'month': month if month else start_date_obj.month,
-            'year': year if year else start_date_obj.year
-        }
+        'period_info': period_filter.period_info()
     })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cached_analytics
 def expense_summary(request):
-    user = request.user
-
-    # Total amount spent
-    total_spent = Expense.objects.filter(user=user).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    # Expense breakdown by category
-    category_breakdown = (
-        Expense.objects
-        .filter(user=user)
-        .values('category')
-        .annotate(total=Sum('amount'))
-        .order_by('-total')
+    # Expense breakdown by category, plus its total, in the user's home currency
+    return Response(summary_data(summary_query(request.user.id, home_currency(request.user.id))))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
+def dashboard(request):
+    """Summary, category breakdown, trends and recent expenses in one response"""
+    period = request.query_params.get('period', 'month')
+    if period not in TREND_PERIODS:
+        return Response({"error": INVALID_PERIOD}, status=400)
+
+    try:
+        period_filter = PeriodFilter.from_request(request)
+        recent = min(int(request.query_params.get('recent', DEFAULT_RECENT)), MAX_RECENT)
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+    except ValueError:
+        return Response({"error": "recent must be an integer."}, status=400)
+
+    data = build_dashboard(
+        request.user.id, period_filter, period, max(recent, 0),
+        serialize=serialize_expenses, currency=home_currency(request.user.id),
+    )
+    return Response(data)
+
+def numpy_missing():
+    return Response(
+        {"error": "This analytics endpoint needs NumPy installed."}, status=status.HTTP_501_NOT_IMPLEMENTED,
     )
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
+def year_over_year(request):
+    """Monthly totals for ?year= (default this year) against the previous year"""
+    if vectorized.np is None:
+        return numpy_missing()
+    try:
+        year = int(request.query_params.get('year', date.today().year))
+    except ValueError:
+        return Response({"error": "Invalid year format."}, status=400)
+    if not 2 <= year <= 9999:
+        return Response({"error": "year must be between 2 and 9999."}, status=400)
+
+    arrays = vectorized.ExpenseArrays.load_daily(
+        request.user.id, date(year - 1, 1, 1), date(year, 12, 31), home_currency_code(request.user.id),
+    )
+    return Response(vectorized.year_over_year(arrays, year))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
+def rolling_averages(request):
+    """Daily totals with a trailing ?window=7|30 day average, over start_date..end_date (default last 90 days)"""
+    if vectorized.np is None:
+        return numpy_missing()
+    try:
+        window = int(request.query_params.get('window', vectorized.ROLLING_WINDOWS[0]))
+        lookups = expense_lookups(request.query_params)
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+    except ValueError:
+        return Response({"error": "window must be an integer."}, status=400)
+    if window not in vectorized.ROLLING_WINDOWS:
+        return Response({"error": "Invalid window. Choose 7 or 30."}, status=400)
+    if 'date' in lookups:
+        return Response({"error": "Use start_date and end_date to pick the range."}, status=400)
+
+    end = lookups.get('date__lte', date.today())
+    try:
+        start = lookups.get('date__gte') or end - timedelta(days=vectorized.DEFAULT_ROLLING_DAYS - 1)
+        # The first window needs the days before start
+        first = start - timedelta(days=window - 1)
+    except OverflowError:
+        return Response({"error": "start_date is too early for the window."}, status=400)
+    if start > end or (end - start).days >= vectorized.MAX_ROLLING_DAYS:
+        return Response({"error": "start_date must be before end_date and at most 3 years apart."}, status=400)
+
+    category = {'category': lookups['category']} if 'category' in lookups else {}
+    arrays = vectorized.ExpenseArrays.load_daily(
+        request.user.id, first, end, home_currency_code(request.user.id), **category,
+    )
+    return Response({'window': window, 'days': vectorized.rolling_averages(arrays, start, end, window)})
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
+def category_percentiles(request):
+    """Per-category expense amount percentiles, with the expense list's category and date filters"""
+    if vectorized.np is None:
+        return numpy_missing()
+    try:
+        lookups = expense_lookups(request.query_params)
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+
+    category = {'category': lookups['category']} if 'category' in lookups else {}
+    arrays = vectorized.ExpenseArrays.load(
+        request.user.id, lookups.get('date__gte'), lookups.get('date__lte'), home_currency_code(request.user.id),
+        **category,
+    )
     return Response({
-        "total_spent": total_spent,
-        "category_breakdown": list(category_breakdown)
+        'percentiles': list(vectorized.PERCENTILES),
+        'categories': vectorized.category_percentiles(arrays),
     })
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@cached_analytics
+def spending_forecast(request):
+    """Projected monthly totals for the next ?months= months (default 3, at most 12)"""
+    if vectorized.np is None:
+        return numpy_missing()
+    try:
+        months = int(request.query_params.get('months', 3))
+    except ValueError:
+        return Response({"error": "months must be an integer."}, status=400)
+    if not 1 <= months <= vectorized.MAX_FORECAST_MONTHS:
+        return Response({"error": "months must be between 1 and 12."}, status=400)
+
+    today = date.today()
+    history_start = date(today.year - vectorized.FORECAST_HISTORY_MONTHS // 12, today.month, 1)
+    arrays = vectorized.ExpenseArrays.load_daily(request.user.id, history_start, today, home_currency_code(request.user.id))
+    return Response(vectorized.forecast(arrays, months, today))
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, JSONLinesRenderer])
+def export_expenses(request):
+    """Stream every matching expense as CSV (default) or JSON Lines (?format=jsonl)"""
+    # Same filters as the expense list, plus an inclusive date range
+    try:
+        expenses = Expense.objects.filter(user_id=request.user.id, **expense_lookups(request.query_params))
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # values_list skips model instances and the serializer; iterator() keeps memory flat
+    rows = expenses.order_by('date', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=2000)
+    return streaming_rows_response(request, request.accepted_renderer, EXPORT_FIELDS, rows, 'expenses')
+
+SEARCH_PAGE_SIZE = 50
+MAX_SEARCH_PAGE_SIZE = 200
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+def search_expenses_view(request):
+    """Full-text search over descriptions (?q=, word* for prefixes), best matches first"""
+    terms = parse_query(request.query_params.get('q'))
+    if not terms:
+        return Response({"error": "Provide search terms with ?q=."}, status=400)
+
+    try:
+        lookups = expense_lookups(request.query_params)
+        page_size = min(int(request.query_params.get('page_size', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+        offset = int(request.query_params.get('offset', 0))
+    except FilterError as e:
+        return Response({"error": str(e)}, status=400)
+    except ValueError:
+        return Response({"error": "page_size and offset must be integers."}, status=400)
+    if page_size < 1 or offset < 0:
+        return Response({"error": "page_size must be positive and offset not negative."}, status=400)
+
+    rows = search_expenses(request.user.id, terms, lookups, page_size, offset, EXPENSE_ROWS)
+    return Response({"results": rows, "next": offset + page_size if len(rows) == page_size else None})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+def expense_changes(request):
+    """Expenses written or deleted since a cursor (?since=, omit for everything), oldest change first"""
+    try:
+        since = parse_cursor(request.query_params.get('since'))
+        page_size = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        return Response({"error": "since must be a cursor from this endpoint and page_size an integer."}, status=400)
+    if page_size < 1:
+        return Response({"error": "page_size must be positive."}, status=400)
+
+    expenses, deleted, cursor, has_more = changes_since(request.user.id, since, page_size)
+    return Response({
+        "results": EXPENSE_ROWS.serialize(expenses),
+        "deleted": deleted,
+        "cursor": cursor,
+        "has_more": has_more,
+    })
+
+def serialize_expenses(expenses):
+    """Serialize a queryset of expenses through the fast read path, timing it for Server-Timing"""
+    with timed('serialize'):
+        return EXPENSE_ROWS.serialize(expenses)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """Per-URL request histograms in Prometheus text format"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Expense Views
 class ExpenseList(APIView):
     """Handles listing and creating expenses"""
@@ -206,19 +337,41 @@ class ExpenseList(APIView):
     
     # Enable sorting by date or amount
     ordering_fields = ['date', 'amount']
+
+    # Read responses are plain rows from ExpenseRowSerializer, which orjson can encode
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
     
     def get(self, request):
-        expenses = Expense.objects.filter(user=request.user)  # Get only the logged-in user's expenses
+        expenses = Expense.objects.filter(user_id=request.user.id)  # Get only the logged-in user's expenses
 
         # Get ordering query parameter
         ordering = request.query_params.get('ordering', '')
 
+        # Keyset pagination is opt-in so existing clients still get a plain list
+        if 'cursor' in request.query_params or 'page_size' in request.query_params:
+            return self.get_page(request, expenses, ordering)
+
         # Apply sorting if 'ordering' is provided
         if ordering:
             expenses = expenses.order_by(ordering)
+
+        # Stream rows in chunks instead of building the whole list in memory
+        if request.query_params.get('stream') in ('1', 'true'):
+            return streaming_json_response(EXPENSE_ROWS.values(expenses), EXPENSE_ROWS.to_dicts)
         
-        serializer = ExpenseSerializer(expenses, many=True)
-        return Response(serializer.data)
+        return Response(serialize_expenses(expenses))
+
+    def get_page(self, request, expenses, ordering):
+        """Return one page of expenses plus the cursor for the next page"""
+        try:
+            paginator = KeysetPaginator(ordering, request.query_params.get('page_size'))
+            rows, next_cursor = paginator.paginate(
+                EXPENSE_ROWS.values(expenses), request.query_params.get('cursor'), transform=EXPENSE_ROWS.to_dicts,
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"results": rows, "next": next_cursor})
 
     def post(self, request):
         data = request.data.copy()
@@ -226,52 +379,285 @@ class ExpenseList(APIView):
 
         serializer = ExpenseSerializer(data=data)
         if serializer.is_valid():
-            serializer.save()
+            # Concurrent writers can find SQLite locked; retry the whole transaction
+            try:
+                retry_if_locked(self.create_expense, serializer)
+            except OperationalError as e:
+                if not is_locked_error(e):
+                    raise
+                return Response(
+                    {"error": "The database is busy, please try again."},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'},
+                )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def create_expense(self, serializer):
+        serializer.instance = None  # Left set by an attempt that was rolled back
+        with transaction.atomic():
+            expense = serializer.save(seq=allocate(serializer.validated_data['user'].id))
+            record_changes(added=[expense])
+        return expense
+
+
+class ExpenseBulkImport(APIView):
+    """Imports many expenses from a CSV or JSON Lines request body"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        read_rows = get_row_reader(request.content_type)
+        if read_rows is None:
+            return Response(
+                {"error": "Send the rows as text/csv or application/x-ndjson."},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+
+        # Parse straight off the request stream rather than buffering the upload
+        stream = request.stream
+        if stream is None:
+            return Response({"error": "No rows to import."}, status=status.HTTP_400_BAD_REQUEST)
+
+        created, failed, errors = import_expenses(request.user, read_rows(stream))
+        return Response(
+            {"created": created, "failed": failed, "errors": errors},
+            status=status.HTTP_201_CREATED if created or not failed else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class ExpenseSync(APIView):
+    """Applies an offline client's ordered batch of create, update and delete operations"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        try:
+            results = retry_if_locked(apply_batch, request.user, operations)
+        except SyncError as e:
+            return Response({"errors": e.errors}, status=e.status)
+        except OperationalError as e:
+            if not is_locked_error(e):
+                raise
+            return Response(
+                {"error": "The database is busy, please try again."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'},
+            )
+        return Response({"results": results})
 
 class ExpenseDetail(APIView):
     """Handles retrieving, updating, and deleting a single expense"""
     permission_classes = [IsAuthenticated]
 
     def get_object(self, expense_id, user):
-        """Helper method to get an expense object, ensuring it belongs to the logged-in user"""
-        try:
-            return Expense.objects.get(id=expense_id, user=user)  # Use 'id' here
-        except Expense.DoesNotExist:
-            return None
+        """Helper method to get an expense object, ensuring it belongs to the logged-in user.
+
+        Locks the row, so call it inside the transaction that writes it.
+        """
+        return select_for_write(Expense.objects.filter(id=expense_id, user_id=user.id)).first()
 
     def put(self, request, expense_id):
         """Update an expense"""
-        expense = self.get_object(expense_id, request.user)
-        print(f"Received PUT request for expense {expense_id}: {request.data}")
-        if not expense:
-            return Response({"error": "Expense not found"}, status=status.HTTP_404_NOT_FOUND)
+        logger.debug("Received PUT request for expense %s: %s", expense_id, request.data)
+        return self.write(self.update_expense, request, expense_id)
+
+    def delete(self, request, expense_id):
+        """Delete an expense"""
+        logger.debug("Deleting expense with ID %s", expense_id)
+        return self.write(self.delete_expense, request, expense_id)
+
+    def write(self, func, request, expense_id):
+        # Concurrent writers can find SQLite locked; retry the whole transaction
+        try:
+            return retry_if_locked(func, request, expense_id)
+        except OperationalError as e:
+            if not is_locked_error(e):
+                raise
+            return Response(
+                {"error": "The database is busy, please try again."},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'},
+            )
+
+    def update_expense(self, request, expense_id):
+        # The rollup deltas come from the locked row, so concurrent updates can't both subtract the same version
+        with transaction.atomic():
+            expense = self.get_object(expense_id, request.user)
+            if not expense:
+                return Response({"error": "Expense not found"}, status=status.HTTP_404_NOT_FOUND)
+
+            serializer = ExpenseSerializer(expense, data=request.data, partial=True)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            previous = copy(expense)  # Snapshot before save() mutates the instance
+            expense = serializer.save(version=F('version') + 1, seq=allocate(request.user.id))
+            expense.refresh_from_db(fields=['version'])
+            record_changes(added=[expense], removed=[previous])
+        return Response(serializer.data)
+
+    def delete_expense(self, request, expense_id):
+        with transaction.atomic():
+            expense = self.get_object(expense_id, request.user)
+            deleted = Expense.objects.filter(id=expense.id).delete()[0] if expense else 0
+            if not deleted:
+                logger.debug("Expense with ID %s not found.", expense_id)
+                return Response({"error": "Expense not found"}, status=status.HTTP_404_NOT_FOUND)
+            record_changes(removed=[expense])
+            record_deletions(request.user.id, [expense.id])
+        logger.debug("Expense %s deleted successfully", expense_id)
 
-        serializer = ExpenseSerializer(expense, data=request.data, partial=True)
+        return Response({"message": "Expense deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
+
+class BudgetList(APIView):
+    """Lists budgets with month-to-date spending (?month=&year=, default this month) and creates them"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            month = requested_month(request)
+        except FilterError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        budgets = budgets_with_spending(request.user.id, month)
+        return Response({"month": f"{month:%Y-%m}", "budgets": BudgetSerializer(budgets, many=True).data})
+
+    def post(self, request):
+        data = request.data.copy()
+        data['user'] = request.user.id  # Assign logged-in user
+
+        serializer = BudgetSerializer(data=data)
+        if serializer.is_valid():
+            budget = serializer.save()
+            budget = budgets_with_spending(request.user.id, date.today().replace(day=1)).get(id=budget.id)
+            return Response(BudgetSerializer(budget).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BudgetDetail(APIView):
+    """Updates and deletes one of the logged-in user's budgets"""
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, budget_id):
+        try:
+            budget = Budget.objects.get(id=budget_id, user_id=request.user.id)
+        except Budget.DoesNotExist:
+            return Response({"error": "Budget not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        data = request.data.copy()
+        data['user'] = request.user.id  # Budgets can't be handed to another user
+        serializer = BudgetSerializer(budget, data=data, partial=True)
         if serializer.is_valid():
             serializer.save()
+            budget = budgets_with_spending(request.user.id, date.today().replace(day=1)).get(id=budget.id)
+            return Response(BudgetSerializer(budget).data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request, budget_id):
+        deleted, _ = Budget.objects.filter(id=budget_id, user_id=request.user.id).delete()
+        if not deleted:
+            return Response({"error": "Budget not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class RecurringExpenseList(APIView):
+    """Lists and creates the logged-in user's recurring expenses; materialize_recurring turns them into expenses"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        rules = RecurringExpense.objects.filter(user_id=request.user.id).order_by('id')
+        return Response(RecurringExpenseSerializer(rules, many=True).data)
+
+    def post(self, request):
+        data = request.data.copy()
+        data['user'] = request.user.id  # Assign logged-in user
+
+        serializer = RecurringExpenseSerializer(data=data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class RecurringExpenseDetail(APIView):
+    """Stops one of the logged-in user's recurring expenses; expenses it already created stay"""
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, rule_id):
+        deleted, _ = RecurringExpense.objects.filter(id=rule_id, user_id=request.user.id).delete()
+        if not deleted:
+            return Response({"error": "Recurring expense not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfileView(APIView):
+    """Reads and updates the logged-in user's home currency, which analytics report totals in"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        profile = Profile.objects.filter(user_id=request.user.id).first() or Profile(user_id=request.user.id)
+        return Response(ProfileSerializer(profile).data)
+
+    def put(self, request):
+        profile, _ = Profile.objects.get_or_create(user_id=request.user.id)
+        serializer = ProfileSerializer(profile, data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            # Every cached total was in the old currency
+            transaction.on_commit(lambda: invalidate_user(request.user.id))
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def delete(self, request, expense_id):
-        """Delete an expense"""
-        expense = self.get_object(expense_id, request.user)
-        
-        if not expense:
-            print(f"Expense with ID {expense_id} not found.")
-            return Response({"error": "Expense not found"}, status=status.HTTP_404_NOT_FOUND)
+class ReportList(APIView):
+    """Queues a report for run_report_worker; asking for an identical one returns the existing job"""
+    permission_classes = [IsAuthenticated]
 
-        print(f"Deleting expense with ID {expense_id}")
-        expense.delete()
-        print(f"Expense {expense_id} deleted successfully")
+    def post(self, request):
+        try:
+            job, created = enqueue(request.user.id, request.data.get('kind'), request.data.get('params', {}))
+        except ReportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            ReportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK,
+        )
+
+
+def get_report(user, report_id):
+    try:
+        return ReportJob.objects.get(id=report_id, user_id=user.id)
+    except ReportJob.DoesNotExist:
+        return None
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_detail(request, report_id):
+    """A report job's status, and its result once built"""
+    job = get_report(request.user, report_id)
+    if job is None:
+        return Response({"error": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+    check_result(job)
+    return Response(ReportJobSerializer(job).data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def report_result(request, report_id):
+    """Download a built report's result file"""
+    job = get_report(request.user, report_id)
+    if job is None:
+        return Response({"error": "Report not found"}, status=status.HTTP_404_NOT_FOUND)
+    if job.status != ReportJob.DONE:
+        return Response({"error": f"Report is {job.status}."}, status=status.HTTP_409_CONFLICT)
+    try:
+        stream = open(result_path(job), 'rb')
+    except FileNotFoundError:
+        expire(job)
+        return Response({"error": job.error}, status=status.HTTP_410_GONE)
+    extension = job.result_file.rsplit('.', 1)[-1]
+    return FileResponse(stream, as_attachment=True, filename=f'{job.kind}-{job.id}.{extension}')
 
-        return Response({"message": "Expense deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 # Token Views
 class MyTokenObtainPairView(TokenObtainPairView):
-    pass  # You can customize if needed
+    # The password check itself runs on the hashing pool (PooledModelBackend)
+    serializer_class = TokenObtainPairSerializer
+    throttle_classes = [IPThrottle, UsernameThrottle]
 
 class MyTokenRefreshView(TokenRefreshView):
     pass